@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compare per-item overhead of the subprocess and in-process yt-dlp engines.
+
+Serves a handful of tiny media files from a local HTTP server and downloads
+each of them through both engines, so the numbers reflect engine overhead
+(interpreter start-up, extractor import, connection setup) rather than
+network speed. Requires yt-dlp to be installed as a module and executable.
+
+    python benchmarks/bench_engines.py --items 20
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from harness import REPO_DIR, make_media, serve
+
+sys.path.insert(0, REPO_DIR)
+
+from downloadall.engine import SubprocessEngine, YoutubeDLEngine
+
+def run_engine(engine, base_url, items, output_dir):
+    """Download every clip through the engine; returns seconds per item"""
+    options = ["--quiet", "--no-progress", "-f", "b", "--output", os.path.join(output_dir, "%(id)s.%(ext)s")]
+    start = time.perf_counter()
+    for i in range(items):
+        # Flat "url" entries point the engine at the local clip instead of a watch URL
+        info = {"_type": "url", "url": f"{base_url}/clip{i}.mp4"}
+        returncode, _ = engine.download(options, f"clip{i}", info)
+        if returncode != 0:
+            raise RuntimeError(f"{engine.name} engine failed on clip{i}")
+    elapsed = time.perf_counter() - start
+    engine.close()
+    return elapsed / items
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=10, help="number of clips to download per engine")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="size of each clip in bytes")
+    args = parser.parse_args()
+
+    yt_dlp_path = os.environ.get("YT_DLP_PATH") or shutil.which("yt-dlp")
+    if not yt_dlp_path:
+        print("Error: yt-dlp not found. Install it using: pip install yt-dlp")
+        return 1
+
+    with tempfile.TemporaryDirectory() as media_dir:
+        make_media(media_dir, args.items, args.size)
+        server, base_url = serve(media_dir)
+        try:
+            results = {}
+            for engine in (SubprocessEngine(yt_dlp_path), YoutubeDLEngine()):
+                with tempfile.TemporaryDirectory() as output_dir:
+                    results[engine.name] = run_engine(engine, base_url, args.items, output_dir)
+        finally:
+            server.shutdown()
+
+    print(f"{'engine':<12} {'per item':>12}")
+    for name, per_item in results.items():
+        print(f"{name:<12} {per_item * 1000:>9.1f} ms")
+    print(f"in-process speed-up: {results['subprocess'] / results['inprocess']:.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
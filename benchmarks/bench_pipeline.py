@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Measure throughput of the download pipelines against a stub yt-dlp.
+
+Runs download_videos(), download_audio() and the GUI DownloadWorker over
+playlists of growing size. yt-dlp and ffmpeg are replaced by the stubs in
+benchmarks/stubs and media comes from a local HTTP server, so the numbers
+show the pipelines' own overhead. Each run happens in a fresh interpreter
+with its own home directory and reports items/sec, time per item, peak RSS,
+process launches, the cost of a history lookup and the time spent per
+stage. --extract-seconds, --transfer-seconds and --encode-seconds make the
+stubs take that long to resolve a video, download it and encode it, to see
+how well the stages overlap. Results are saved as JSON; pass an earlier
+file to --compare to see what changed.
+
+    python benchmarks/bench_pipeline.py --sizes 1,10,100,1000,10000 --jobs 4
+    python benchmarks/bench_pipeline.py --paths audio --sizes 20 --extract-seconds 0.5 --encode-seconds 0.5
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/pipeline-20250101-120000.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from harness import GUI_DIR, REPO_DIR, RESULTS_DIR, git_revision, install_stubs, serve_synthetic
+
+PATHS = ("video", "audio", "gui")
+DEFAULT_SIZES = "1,10,100,1000"
+DEFAULT_MEDIA_SIZE = 16 * 1024
+
+# Stages of downloadall/metrics.py, in pipeline order
+STAGES = ("listing", "wait", "extract", "transfer", "merge", "verify", "postprocess")
+
+# The benchmark measures the pipelines, not the polite delays between downloads
+RATE_CONFIG = {"127.0.0.1": {"start_delay": 0}}
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def run_backend(path, url, jobs):
+    """Run a backend pipeline in this process; returns its measurements"""
+    sys.path.insert(0, REPO_DIR)
+    start = time.perf_counter()
+    if path == "video":
+        from downloadall import video as backend
+    else:
+        from downloadall import audio_only as backend
+    imported = time.perf_counter()
+
+    if path == "video":
+        backend.download_videos(url, jobs)
+    else:
+        backend.download_audio(url, jobs)
+    finished = time.perf_counter()
+
+    # Every item is in the history now, so this is the cost of a full re-check
+    history = backend.get_history()
+    ids = history.ids()
+    lookup_start = time.perf_counter()
+    history.filter_new(ids)
+    lookup = time.perf_counter() - lookup_start
+
+    return {
+        "import_seconds": imported - start,
+        "seconds": finished - imported,
+        "downloaded": len(ids),
+        "history_lookup_us_per_item": lookup / max(1, len(ids)) * 1e6,
+    }
+
+def run_gui(url, download_type):
+    """Drive a GUI DownloadWorker to completion in this process; returns its measurements"""
+    from PySide6.QtCore import QCoreApplication, QObject
+
+    sys.path[:0] = [REPO_DIR, GUI_DIR]
+    from download_worker import DownloadWorker
+
+    class Receiver(QObject):
+        updates = 0
+        success = False
+
+        def on_progress(self, state):
+            self.updates += 1
+
+        def on_finished(self, success, message):
+            self.success = success
+            app.quit()
+
+    app = QCoreApplication([])
+    receiver = Receiver()
+    worker = DownloadWorker(url, download_type)
+    worker.progress_signal.connect(receiver.on_progress)
+    worker.finished_signal.connect(receiver.on_finished)
+
+    start = time.perf_counter()
+    worker.start()
+    app.exec()
+    worker.wait()
+    return {
+        "seconds": time.perf_counter() - start,
+        "success": receiver.success,
+        "progress_updates": receiver.updates,
+    }
+
+def child_main(args):
+    """Entry point of the per-run interpreter; writes its measurements to --result-file"""
+    if args.child == "gui":
+        result = run_gui(args.url, "video")
+    else:
+        result = run_backend(args.child, args.url, args.jobs)
+    from downloadall import metrics
+    result["stages"] = metrics.snapshot()["stages"]
+    result["peak_rss_mb"] = peak_rss_mb()
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    return 0
+
+def run_case(path, size, jobs, base_url, bin_dir, work_dir, verbose=False, delays=None):
+    """Run one pipeline over a playlist of `size` items in a fresh interpreter"""
+    home = tempfile.mkdtemp(prefix=f"{path}-{size}-", dir=work_dir)
+    config_dir = os.path.join(home, ".youtube_downloader")
+    os.makedirs(config_dir)
+    with open(os.path.join(config_dir, "rate_limits.json"), 'w', encoding='utf-8') as f:
+        json.dump(RATE_CONFIG, f)
+
+    launch_log = os.path.join(home, "launches.log")
+    result_file = os.path.join(home, "result.json")
+    env = dict(
+        os.environ,
+        HOME=home,
+        USERPROFILE=home,
+        YT_DLP_PATH=os.path.join(bin_dir, "yt-dlp"),
+        PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""),
+        STUB_LAUNCH_LOG=launch_log,
+        **{name: str(seconds) for name, seconds in (delays or {}).items()}
+    )
+    command = [sys.executable, os.path.abspath(__file__), "--child", path,
+               "--url", f"{base_url}/playlist/{size}", "--jobs", str(jobs), "--result-file", result_file]
+
+    start = time.perf_counter()
+    process = subprocess.run(command, env=env, stdout=None if verbose else subprocess.DEVNULL,
+                             stderr=None if verbose else subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+    if process.returncode != 0 or not os.path.exists(result_file):
+        raise RuntimeError(f"{path} run with {size} items failed: {(process.stderr or '').strip()[-500:]}")
+
+    with open(result_file, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    launches = Counter()
+    if os.path.exists(launch_log):
+        with open(launch_log, 'r') as f:
+            launches.update(line.strip() for line in f if line.strip())
+
+    seconds = result["seconds"]
+    result.update({
+        "path": path,
+        "items": size,
+        "jobs": jobs,
+        "wall_seconds": wall,
+        "items_per_second": size / seconds if seconds else None,
+        "per_item_ms": seconds / size * 1000,
+        "process_launches": dict(launches),
+    })
+    return result
+
+def print_results(results):
+    print(f"{'path':<6} {'items':>6} {'items/s':>9} {'ms/item':>9} {'rss MB':>8} {'launches':>9} {'lookup us':>10}")
+    for r in results:
+        lookup = r.get("history_lookup_us_per_item")
+        print(f"{r['path']:<6} {r['items']:>6} {r['items_per_second'] or 0:>9.1f} {r['per_item_ms']:>9.1f} "
+              f"{r['peak_rss_mb'] or 0:>8.1f} {sum(r['process_launches'].values()):>9} "
+              f"{'-' if lookup is None else f'{lookup:.2f}':>10}")
+
+def print_stages(results):
+    """Print where each run's time went, in ms per item for every stage"""
+    print(f"\n{'path':<6} {'items':>6} " + " ".join(f"{stage:>11}" for stage in STAGES))
+    for r in results:
+        stages = r.get("stages") or {}
+        cells = [stages.get(stage, {}).get("seconds", 0.0) / r["items"] * 1000 for stage in STAGES]
+        print(f"{r['path']:<6} {r['items']:>6} " + " ".join(f"{cell:>11.1f}" for cell in cells))
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {(r["path"], r["items"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('revision')}):")
+    print(f"{'path':<6} {'items':>6} {'items/s':>18} {'rss MB':>16}")
+    for r in results:
+        before = old.get((r["path"], r["items"]))
+        if before is None:
+            continue
+        speed = (r["items_per_second"] or 0) / (before["items_per_second"] or 1)
+        print(f"{r['path']:<6} {r['items']:>6} {before['items_per_second']:>8.1f} -> {speed:>5.2f}x "
+              f"{before['peak_rss_mb'] or 0:>7.1f} -> {r['peak_rss_mb'] or 0:>6.1f}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paths", default=",".join(PATHS),
+                        help=f"comma-separated pipelines to run (default: {','.join(PATHS)})")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma-separated playlist sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="concurrent downloads for the backend pipelines")
+    parser.add_argument("--media-size", type=int, default=DEFAULT_MEDIA_SIZE, help="bytes served per item")
+    parser.add_argument("--extract-seconds", type=float, default=0, help="time the stub yt-dlp takes to resolve a video")
+    parser.add_argument("--transfer-seconds", type=float, default=0, help="time the stub yt-dlp takes to download a video")
+    parser.add_argument("--encode-seconds", type=float, default=0, help="time the stub ffmpeg takes per run")
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show the pipelines' own output")
+    parser.add_argument("--child", choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.child:
+        return child_main(args)
+
+    paths = [path for path in args.paths.split(",") if path]
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    if "gui" in paths:
+        try:
+            import PySide6  # noqa: F401
+        except ImportError:
+            print("PySide6 not installed, skipping the gui path")
+            paths.remove("gui")
+
+    delays = {"STUB_EXTRACT_SECONDS": args.extract_seconds, "STUB_TRANSFER_SECONDS": args.transfer_seconds,
+              "STUB_ENCODE_SECONDS": args.encode_seconds}
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as work_dir:
+        bin_dir = install_stubs(os.path.join(work_dir, "bin"))
+        server, base_url = serve_synthetic(args.media_size)
+        try:
+            for path in paths:
+                for size in sizes:
+                    result = run_case(path, size, args.jobs, base_url, bin_dir, work_dir, args.verbose, delays)
+                    results.append(result)
+                    print(f"{path} x{size}: {result['per_item_ms']:.1f} ms/item", flush=True)
+        finally:
+            server.shutdown()
+
+    print()
+    print_results(results)
+    print_stages(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("pipeline-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "media_size": args.media_size,
+        "extract_seconds": args.extract_seconds,
+        "transfer_seconds": args.transfer_seconds,
+        "encode_seconds": args.encode_seconds,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
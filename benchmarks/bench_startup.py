@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Measure start-up cost: importing the backend modules and showing the GUI window.
+
+Every target runs several times in a fresh interpreter with an empty home
+directory. The report gives the median time over a bare interpreter start,
+the modules that take longest to import (from python -X importtime) and
+any files the target created, since importing a backend module should not
+touch the disk. Results are saved as JSON; pass an earlier file to
+--compare to see what changed.
+
+    python benchmarks/bench_startup.py --repeat 10
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import REPO_DIR, RESULTS_DIR, git_revision
+
+# Target name -> (working directory, Python statements timed in a fresh interpreter)
+TARGETS = {
+    "import video": (REPO_DIR, "import downloadall.video"),
+    "import audio_only": (REPO_DIR, "import downloadall.audio_only"),
+    "import batch": (REPO_DIR, "import downloadall.batch"),
+    "video --help": (REPO_DIR, "import sys, runpy; sys.argv = ['video.py', '--help']\n"
+                               "try:\n    runpy.run_module('downloadall.video', run_name='__main__')\n"
+                               "except SystemExit:\n    pass"),
+    # Until the main window has been shown and painted once; the GUI modules import as run_gui.py sets them up
+    "gui window": (REPO_DIR, "import sys; sys.path.insert(0, 'gui')\nimport app\n"
+                             "from PySide6.QtWidgets import QApplication\n"
+                             "qt = QApplication(sys.argv); qt.setApplicationName('YouTube Downloader')\n"
+                             "from main_window import MainWindow\n"
+                             "window = MainWindow(); window.show(); qt.processEvents()"),
+}
+
+DEFAULT_REPEAT = 5
+TOP_IMPORTS = 5
+
+def parse_importtime(stderr):
+    """Return {module: microseconds spent in the module itself} from -X importtime output"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = int(own)
+    return imports
+
+def files_under(directory):
+    found = set()
+    for root, dirs, files in os.walk(directory):
+        for name in dirs + files:
+            found.add(os.path.relpath(os.path.join(root, name), directory))
+    return found
+
+def run_once(cwd, code, home):
+    """Run code in a fresh interpreter; returns (seconds, import time of each module)"""
+    env = dict(os.environ, HOME=home, USERPROFILE=home, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip()[-500:])
+    return seconds, parse_importtime(process.stderr)
+
+def measure(name, repeat, baseline):
+    """Time a target `repeat` times; returns its result record"""
+    cwd, code = TARGETS[name]
+    times = []
+    imports = {}
+    created = set()
+    for _ in range(repeat):
+        home = tempfile.mkdtemp(prefix="bench-startup-")
+        try:
+            seconds, imports = run_once(cwd, code, home)
+            created |= files_under(home)
+        finally:
+            shutil.rmtree(home, ignore_errors=True)
+        times.append(seconds)
+
+    heaviest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:TOP_IMPORTS]
+    median = statistics.median(times)
+    return {
+        "target": name,
+        "median_ms": median * 1000,
+        "over_interpreter_ms": (median - baseline) * 1000,
+        "min_ms": min(times) * 1000,
+        "heaviest_imports_ms": {module: us / 1000 for module, us in heaviest},
+        "files_created": sorted(created),
+    }
+
+def print_results(results):
+    print(f"{'target':<20} {'median ms':>10} {'over python':>12}  heaviest imports")
+    for r in results:
+        heaviest = ", ".join(f"{module} {ms:.0f}" for module, ms in r["heaviest_imports_ms"].items())
+        print(f"{r['target']:<20} {r['median_ms']:>10.1f} {r['over_interpreter_ms']:>12.1f}  {heaviest}")
+        if r["files_created"]:
+            print(f"{'':<20} created: {', '.join(r['files_created'])}")
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {r["target"]: r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('revision')}):")
+    for r in results:
+        before = old.get(r["target"])
+        if before is not None:
+            print(f"{r['target']:<20} {before['over_interpreter_ms']:>8.1f} -> {r['over_interpreter_ms']:>8.1f} ms")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help=f"comma-separated targets to measure (default: all of {', '.join(TARGETS)})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"runs per target; the median is reported (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/results/startup-<time>.json)")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results to compare against")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    targets = [name for name in args.targets.split(",") if name]
+    if "gui window" in targets:
+        try:
+            import PySide6  # noqa: F401
+        except ImportError:
+            print("PySide6 not installed, skipping the gui window target")
+            targets.remove("gui window")
+
+    baseline = statistics.median(run_once(REPO_DIR, "pass", tempfile.gettempdir())[0]
+                                 for _ in range(args.repeat))
+    results = [measure(name, args.repeat, baseline) for name in targets]
+    print_results(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("startup-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "interpreter_ms": baseline * 1000,
+        "repeat": args.repeat,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
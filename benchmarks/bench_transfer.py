@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Measure single-video throughput over one and several parallel connections.
+
+Serves one large video from a local range-capable HTTP server that caps
+every connection at --rate, the way media hosts throttle each connection.
+The video is offered both as an HLS stream of fragments, which yt-dlp
+fetches --concurrent-fragments at a time, and as a plain MP4, which is
+only split into byte ranges when aria2c is installed. Each download goes
+through the subprocess engine with the options a profile's `connections`
+setting produces. Requires the yt-dlp executable.
+
+    python benchmarks/bench_transfer.py --size 64 --connections 1,2,4,8
+    python benchmarks/bench_transfer.py --limit-rate 4M   # check the budget holds over N connections
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from harness import REPO_DIR, RESULTS_DIR, git_revision, serve_ranged
+
+sys.path.insert(0, REPO_DIR)
+
+from downloadall.engine import SubprocessEngine
+from downloadall.formats import connection_options
+from downloadall.ratelimit import RateLimiter
+
+MODES = ("hls", "http")
+DEFAULT_CONNECTIONS = "1,2,4,8"
+
+def make_video(directory, size, fragments):
+    """Write the same random payload as an HLS stream of fragments and as one MP4"""
+    payload = os.urandom(size)
+    fragment_size = -(-size // fragments)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(fragments):
+        with open(os.path.join(directory, f"frag{i}.ts"), 'wb') as f:
+            f.write(payload[i * fragment_size:(i + 1) * fragment_size])
+        lines += ["#EXTINF:2.0,", f"frag{i}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    with open(os.path.join(directory, "stream.m3u8"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    with open(os.path.join(directory, "video.mp4"), 'wb') as f:
+        f.write(payload)
+
+def run_case(engine, url, connections, aria2c, limiter, output_dir, size):
+    """Download the video once; returns its measurements"""
+    profile = {"connections": connections, "split_size": "1M"}
+    target = os.path.join(output_dir, f"{connections}.%(ext)s")
+    options = ["--quiet", "--no-warnings", "--no-progress", "-f", "b", "--output", target]
+    options += connection_options(profile, aria2c)
+
+    with limiter.job() as share:
+        options += engine.rate_limit_options(limiter, share, connections)
+        start = time.perf_counter()
+        returncode, result = engine.download(options, f"x{connections}", {"_type": "url", "url": url})
+        seconds = time.perf_counter() - start
+    if returncode != 0 or not result:
+        raise RuntimeError(f"download over {connections} connection(s) failed")
+    downloaded = os.path.getsize(result["filepath"])
+    os.remove(result["filepath"])
+    if downloaded != size:
+        raise RuntimeError(f"download over {connections} connection(s) has {downloaded} bytes, expected {size}")
+    return {"connections": connections, "seconds": seconds, "mb_per_second": size / seconds / (1024 * 1024)}
+
+def print_results(results):
+    print(f"{'mode':<5} {'conns':>6} {'seconds':>9} {'MB/s':>8} {'speed-up':>9}")
+    baseline = {}
+    for r in results:
+        baseline.setdefault(r["mode"], r["mb_per_second"])
+        print(f"{r['mode']:<5} {r['connections']:>6} {r['seconds']:>9.2f} {r['mb_per_second']:>8.2f} "
+              f"{r['mb_per_second'] / baseline[r['mode']]:>8.2f}x")
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {(r["mode"], r["connections"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('revision')}):")
+    for r in results:
+        before = old.get((r["mode"], r["connections"]))
+        if before is not None:
+            print(f"{r['mode']:<5} {r['connections']:>6} {before['mb_per_second']:>8.2f} -> "
+                  f"{r['mb_per_second'] / before['mb_per_second']:>5.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=32, help="size of the video in MB (default: 32)")
+    parser.add_argument("--rate", type=float, default=2, help="MB/s each server connection is capped at (default: 2)")
+    parser.add_argument("--fragments", type=int, default=64, help="fragments in the HLS stream (default: 64)")
+    parser.add_argument("--connections", default=DEFAULT_CONNECTIONS,
+                        help=f"comma-separated connection counts (default: {DEFAULT_CONNECTIONS})")
+    parser.add_argument("--limit-rate", metavar="RATE", help="bandwidth budget to download under, e.g. 4M")
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/results/transfer-<time>.json)")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results to compare against")
+    args = parser.parse_args()
+
+    yt_dlp_path = os.environ.get("YT_DLP_PATH") or shutil.which("yt-dlp")
+    if not yt_dlp_path:
+        print("Error: yt-dlp not found. Install it using: pip install yt-dlp")
+        return 1
+    aria2c = shutil.which("aria2c")
+    modes = list(MODES)
+    if not aria2c:
+        print("aria2c not installed, skipping plain HTTP downloads (they keep a single connection without it)")
+        modes.remove("http")
+
+    size = args.size * 1024 * 1024
+    counts = [int(count) for count in args.connections.split(",") if count]
+    engine = SubprocessEngine(yt_dlp_path)
+    limiter = RateLimiter(args.limit_rate, start_delay=0)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-transfer-") as work_dir:
+        media_dir = os.path.join(work_dir, "media")
+        os.makedirs(media_dir)
+        make_video(media_dir, size, args.fragments)
+        server, base_url = serve_ranged(media_dir, int(args.rate * 1024 * 1024))
+        try:
+            for mode in modes:
+                url = f"{base_url}/stream.m3u8" if mode == "hls" else f"{base_url}/video.mp4"
+                for connections in counts:
+                    result = run_case(engine, url, connections, aria2c, limiter, work_dir, size)
+                    result["mode"] = mode
+                    results.append(result)
+                    print(f"{mode} x{connections}: {result['mb_per_second']:.2f} MB/s", flush=True)
+        finally:
+            server.shutdown()
+
+    print()
+    print_results(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("transfer-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "size_mb": args.size,
+        "rate_mb": args.rate,
+        "fragments": args.fragments,
+        "limit_rate": args.limit_rate,
+        "aria2c": bool(aria2c),
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
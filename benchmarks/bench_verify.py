@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Measure how long verify.py takes to check a large library.
+
+Builds an output folder of --files small files spread over ID-prefix
+subfolders (the `id` layout) with a matching history database, then
+times a cold and a warm scan for each check. The warm scan reuses the
+cached probe and hash results of files that did not change, so it
+should only cost a folder walk.
+
+    python benchmarks/bench_verify.py --files 50000 --checks size,hash
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from harness import REPO_DIR, RESULTS_DIR, git_revision
+
+sys.path.insert(0, REPO_DIR)
+
+from downloadall.history import HistoryStore
+from downloadall.verify import CHECKS, DEFAULT_SCAN_JOBS, verify_library
+
+DEFAULT_CHECKS = "size,hash"
+
+def make_library(folder, count, file_size):
+    """Write count files of file_size bytes and record them in a history database; returns the store"""
+    history = HistoryStore(os.path.join(folder, ".download_history.db"))
+    records = []
+    for i in range(count):
+        video_id = f"v{i:010d}"
+        subfolder = os.path.join(folder, video_id[-2:])
+        os.makedirs(subfolder, exist_ok=True)
+        path = os.path.join(subfolder, f"{video_id}.mp4")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(file_size))
+        records.append((video_id, "mp4", file_size, path))
+    history.add_many(records)
+    return history
+
+def run_case(history, folder, check, jobs):
+    """Scan the library twice; returns the measurements"""
+    result = {"check": check}
+    for run in ("cold", "warm"):
+        start = time.perf_counter()
+        report = verify_library(history, folder, check, jobs)
+        result[f"{run}_seconds"] = time.perf_counter() - start
+        if report["problems"]:
+            raise RuntimeError(f"{check} scan found problems in an intact library: {report['problems'][:3]}")
+    result["files"] = report["recorded"]
+    return result
+
+def print_results(results):
+    print(f"{'check':<6} {'files':>8} {'cold s':>9} {'warm s':>9} {'files/s warm':>13}")
+    for r in results:
+        print(f"{r['check']:<6} {r['files']:>8} {r['cold_seconds']:>9.2f} {r['warm_seconds']:>9.2f} "
+              f"{r['files'] / r['warm_seconds']:>13.0f}")
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {r["check"]: r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('revision')}):")
+    for r in results:
+        before = old.get(r["check"])
+        if before is not None:
+            print(f"{r['check']:<6} cold {before['cold_seconds'] / r['cold_seconds']:>5.2f}x faster, "
+                  f"warm {before['warm_seconds'] / r['warm_seconds']:>5.2f}x faster")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=10000, help="files in the library (default: 10000)")
+    parser.add_argument("--file-size", type=int, default=4096, help="size of each file in bytes (default: 4096)")
+    parser.add_argument("--checks", default=DEFAULT_CHECKS,
+                        help=f"comma-separated checks from {', '.join(CHECKS)} (default: {DEFAULT_CHECKS})")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_SCAN_JOBS,
+                        help=f"folders listed and files checked at once (default: {DEFAULT_SCAN_JOBS})")
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/results/verify-<time>.json)")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results to compare against")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-verify-") as folder:
+        start = time.perf_counter()
+        history = make_library(folder, args.files, args.file_size)
+        print(f"Created {args.files} files in {time.perf_counter() - start:.1f}s", flush=True)
+        for check in [check for check in args.checks.split(",") if check]:
+            result = run_case(history, folder, check, args.jobs)
+            results.append(result)
+            print(f"{check}: cold {result['cold_seconds']:.2f}s, warm {result['warm_seconds']:.2f}s", flush=True)
+
+    print()
+    print_results(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("verify-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": args.files,
+        "file_size": args.file_size,
+        "jobs": args.jobs,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
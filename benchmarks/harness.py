@@ -0,0 +1,160 @@
+"""
+Shared helpers for the benchmarks: local HTTP media servers and stub tools.
+"""
+
+import functools
+import os
+import re
+import stat
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+GUI_DIR = os.path.join(REPO_DIR, "gui")
+STUBS_DIR = os.path.join(BENCH_DIR, "stubs")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# Stub scripts installed as executables: executable name -> script
+STUBS = {
+    "yt-dlp": "yt_dlp_stub.py",
+    "ffmpeg": "ffmpeg_stub.py",
+}
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class SyntheticMediaHandler(BaseHTTPRequestHandler):
+    """Answers every GET with the server's synthetic media payload"""
+
+    def do_GET(self):
+        payload = self.server.payload
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class RangeMediaHandler(BaseHTTPRequestHandler):
+    """Serves the files in server.directory with byte-range support.
+
+    Every connection is capped at server.rate bytes/s (if set), the way
+    media hosts throttle each connection, so parallel connections show up
+    as higher throughput.
+    """
+
+    CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t", ".mp4": "video/mp4"}
+
+    def do_HEAD(self):
+        self._send(body=False)
+
+    def do_GET(self):
+        self._send(body=True)
+
+    def _send(self, body):
+        path = os.path.join(self.server.directory, os.path.basename(self.path.split("?")[0]))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", self.CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream"))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if body:
+            self._copy(path, start, end - start + 1)
+
+    def _copy(self, path, start, length):
+        rate = self.server.rate
+        chunk_size = max(4096, rate // 50) if rate else 256 * 1024
+        began = time.monotonic()
+        sent = 0
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                while sent < length:
+                    data = f.read(min(chunk_size, length - sent))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    sent += len(data)
+                    if rate:
+                        ahead = sent / rate - (time.monotonic() - began)
+                        if ahead > 0:
+                            time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def serve(directory):
+    """Start a local HTTP server for directory; returns (server, base URL)"""
+    handler = functools.partial(QuietHandler, directory=directory)
+    return _start(ThreadingHTTPServer(("127.0.0.1", 0), handler))
+
+def serve_synthetic(size):
+    """Start a local HTTP server that returns `size` random bytes for any path; returns (server, base URL)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SyntheticMediaHandler)
+    server.payload = os.urandom(size)
+    return _start(server)
+
+def serve_ranged(directory, rate=None):
+    """Start a range-capable HTTP server for directory, capping each connection at rate bytes/s; returns (server, base URL)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeMediaHandler)
+    server.directory = directory
+    server.rate = rate
+    return _start(server)
+
+def make_media(directory, items, size):
+    for i in range(items):
+        with open(os.path.join(directory, f"clip{i}.mp4"), 'wb') as f:
+            f.write(os.urandom(size))
+
+def install_stubs(bin_dir):
+    """Install the stub tools as executables in bin_dir, run by this interpreter"""
+    os.makedirs(bin_dir, exist_ok=True)
+    for name, script in STUBS.items():
+        with open(os.path.join(STUBS_DIR, script), 'r', encoding='utf-8') as f:
+            source = f.read()
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"#!{sys.executable}\n{source}")
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+def git_revision():
+    """Short hash of the checked-out commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
@@ -0,0 +1,28 @@
+"""
+Stand-in for ffmpeg used by the benchmarks: copies the first input to the output file.
+
+Every launch is appended to $STUB_LAUNCH_LOG so process launches can be counted,
+and every run takes at least $STUB_ENCODE_SECONDS to stand in for encoding time.
+"""
+
+import os
+import shutil
+import sys
+import time
+
+def main():
+    log_path = os.environ.get("STUB_LAUNCH_LOG")
+    if log_path:
+        with open(log_path, 'a') as f:
+            f.write("ffmpeg\n")
+
+    seconds = float(os.environ.get("STUB_ENCODE_SECONDS") or 0)
+    if seconds > 0:
+        time.sleep(seconds)
+
+    args = sys.argv[1:]
+    shutil.copyfile(args[args.index("-i") + 1], args[-1])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Stand-in for the yt-dlp executable used by the benchmarks.
+
+Understands just enough of the command line the downloaders build:
+
+    -J [--flat-playlist] [--playlist-items A:B] <base>/playlist/<N>
+        prints a playlist of N flat entries pointing at <base>/media/<id>.mp4;
+        like YouTube's, flat entries have no upload date or channel
+    -J <media URL>
+        prints the full info dict of one video
+    [options] <media URL>
+        downloads the URL over HTTP to --output, honouring --print-to-file (the
+        finished file, or the info dict for "video:" templates),
+        --progress-template, --write-thumbnail, --write-info-json,
+        --skip-download and --load-info-json
+
+Every launch is appended to $STUB_LAUNCH_LOG so process launches can be counted.
+Resolving a video page (anything but --load-info-json) sleeps for
+$STUB_EXTRACT_SECONDS and every media download for $STUB_TRANSFER_SECONDS,
+so overlapping stages show up in the timings.
+"""
+
+import json
+import os
+import sys
+import time
+import urllib.request
+
+def option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+def count_launch():
+    log_path = os.environ.get("STUB_LAUNCH_LOG")
+    if log_path:
+        with open(log_path, 'a') as f:
+            f.write("yt-dlp\n")
+
+def list_playlist(args):
+    url = args[-1]
+    base, _, count = url.rpartition("/playlist/")
+    ids = [f"vid{i:06d}" for i in range(int(count))]
+
+    items = option(args, "--playlist-items")
+    if items:
+        start, _, end = items.partition(":")
+        ids = ids[int(start or 1) - 1:int(end) if end else None]
+
+    entries = [{"_type": "url", "id": video_id, "title": f"Clip {video_id}", "url": f"{base}/media/{video_id}.mp4"}
+               for video_id in ids]
+    print(json.dumps({"_type": "playlist", "id": "bench", "playlist_count": int(count), "entries": entries}))
+
+def sleep_for(variable):
+    seconds = float(os.environ.get(variable) or 0)
+    if seconds > 0:
+        time.sleep(seconds)
+
+def info_dict(video_id, url):
+    return {"id": video_id, "title": f"Clip {video_id}", "url": url, "ext": "mp4",
+            "upload_date": "20240115", "channel": "Stub Channel", "webpage_url": url,
+            "formats": [{"format_id": "stub", "url": url, "ext": "mp4"}]}
+
+def write_thumbnail(path):
+    with open(os.path.splitext(path)[0] + ".jpg", 'wb') as f:
+        f.write(b"\xff\xd8\xff\xd9")
+
+def download(args):
+    url = args[-1]
+    if "--load-info-json" in args:
+        with open(option(args, "--load-info-json"), 'r', encoding='utf-8') as f:
+            url = json.load(f)["url"]
+    else:
+        sleep_for("STUB_EXTRACT_SECONDS")
+    video_id = os.path.splitext(os.path.basename(url))[0]
+
+    template = option(args, "--output", "%(title)s.%(ext)s")
+    path = template.replace("%(title)s", video_id).replace("%(id)s", video_id).replace("%(ext)s", "mp4")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    if "--write-info-json" in args:
+        with open(os.path.splitext(path)[0] + ".info.json", 'w', encoding='utf-8') as f:
+            json.dump(info_dict(video_id, url), f)
+    if "--skip-download" in args:
+        if "--write-thumbnail" in args:
+            write_thumbnail(path)
+        return
+
+    sleep_for("STUB_TRANSFER_SECONDS")
+
+    print(f"[download] Destination: {path}", flush=True)
+    with urllib.request.urlopen(url) as response, open(path, 'wb') as f:
+        data = response.read()
+        f.write(data)
+
+    progress_template = option(args, "--progress-template")
+    if progress_template:
+        status = {"status": "finished", "downloaded_bytes": len(data), "total_bytes": len(data)}
+        line = progress_template.split(":", 1)[1].replace("%(progress)j", json.dumps(status))
+        print(line, flush=True)
+    else:
+        print(f"[download] 100% of {len(data)} bytes", flush=True)
+
+    if "--write-thumbnail" in args:
+        write_thumbnail(path)
+
+    for index, arg in enumerate(args):
+        if arg != "--print-to-file":
+            continue
+        if args[index + 1].startswith("video:"):
+            record = info_dict(video_id, url)
+        else:
+            record = {"filepath": path, "format_id": "stub"}
+        with open(args[index + 2], 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+
+def main():
+    count_launch()
+    args = sys.argv[1:]
+    if "-J" in args and "/playlist/" in args[-1]:
+        list_playlist(args)
+    elif "-J" in args:
+        sleep_for("STUB_EXTRACT_SECONDS")
+        url = args[-1]
+        print(json.dumps(info_dict(os.path.splitext(os.path.basename(url))[0], url)))
+    else:
+        download(args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
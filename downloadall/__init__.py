@@ -0,0 +1,6 @@
+"""YouTube video and audio downloaders built on yt-dlp.
+
+The modules are libraries and import nothing heavy up front; run the
+command-line tools as `python -m downloadall.video`, `audio_only`,
+`batch` or `verify`.
+"""
@@ -0,0 +1,76 @@
+from collections import namedtuple
+
+from . import progress
+from .scheduler import JobControl, controlled
+
+DOWNLOAD_TYPES = ("video", "audio")
+
+# Outcome of a DownloadJob:
+#   listed     False if the URL could not be listed at all
+#   files      {video ID: path of the finished file} for the items downloaded now
+#   failed     IDs of the new items that were not downloaded
+#   cancelled  whether cancel() stopped the job
+JobResult = namedtuple("JobResult", ["listed", "files", "failed", "cancelled"])
+
+class DownloadJob:
+    """Downloads the videos or audio tracks of one URL in this process.
+
+    run() blocks until the job is over, so callers run it on a worker
+    thread; several jobs can run at once. Output lines go to
+    on_output(line) and progress.ProgressEvent tuples to on_event(event),
+    both called on the backend's threads. cancel() may be called from any
+    thread: it ends the running yt-dlp processes and skips the items that
+    have not started. Interrupted items stay unfinished in the history and
+    resume on the next run.
+
+    Extra keyword arguments are passed to download_videos() or
+    download_audio(), e.g. jobs=4 or sync=True.
+    """
+
+    def __init__(self, url, download_type="video", on_output=None, on_event=None, **options):
+        if download_type not in DOWNLOAD_TYPES:
+            raise ValueError(f"Unknown download type: {download_type}")
+        self.url = url
+        self.download_type = download_type
+        self.options = options
+        self.on_output = on_output
+        self.on_event = on_event
+        self.control = JobControl(self._on_line, self._on_event)
+
+    def _on_line(self, prefix, message, fields):
+        # Progress from yt-dlp processes arrives as event lines in their output
+        event = progress.parse_message(prefix, message) if prefix else None
+        if event is not None:
+            self._on_event(event)
+        elif self.on_output is not None:
+            self.on_output(f"[{prefix}] {message}" if prefix else message)
+
+    def _on_event(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def run(self):
+        """Download everything new at the URL; returns a JobResult.
+
+        Raises config.ToolNotFound if yt-dlp is needed but missing.
+        """
+        # The backends are imported here, so importing this module stays cheap
+        if self.download_type == "video":
+            from .video import download_videos as download
+        else:
+            from .audio_only import download_audio as download
+
+        with controlled(self.control):
+            results = download(self.url, **self.options)
+
+        listed = results is not None
+        results = results or {}
+        return JobResult(
+            listed=listed,
+            files={video_id: result["filepath"] for video_id, result in results.items() if result},
+            failed=[video_id for video_id, result in results.items() if not result],
+            cancelled=self.control.cancelled.is_set(),
+        )
+
+    def cancel(self):
+        self.control.cancel()
@@ -1,131 +1,420 @@
 import os
-import subprocess
-import shutil
-import platform
-
-# Determine user's desktop path based on the operating system
-def get_desktop_path():
-    if platform.system() == "Windows":
-        return os.path.join(os.path.expanduser("~"), "Desktop")
-    elif platform.system() == "Darwin":  # macOS
-        return os.path.join(os.path.expanduser("~"), "Desktop")
-    else:  # Linux and other Unix-like systems
-        return os.path.join(os.path.expanduser("~"), "Desktop")
+import sys
+import json
+import argparse
+import threading
+
+from . import metrics
+from . import progress
+from .config import ToolNotFound, get_desktop_path, lazy
+from .engine import DEFAULT_ENGINE, ENGINES, SubprocessEngine, make_engine
+from .history import HistoryStore
+from .layout import LAYOUTS, needs_info, reserve_output, set_layout, stem_path
+from .leases import claim_item, run_claimed
+from .media_store import MediaStore, derivation_source, reuse_stored
+from .metadata_cache import cached_info, remember_info
+from .ratelimit import DEFAULT_RATE_CONFIG, make_limiter
+from .scheduler import DEFAULT_JOBS, echo, log
+from .pipeline import Finished, run_pipeline
+from .postprocess import DEFAULT_WORKERS, encode_audio
+from .sync import list_source, queue_new
+from .transfer import FAILED, MERGING, VERIFIED, download_item, verify_download
 
 # Setup paths
 DESKTOP_PATH = get_desktop_path()
 OUTPUT_FOLDER = os.path.join(DESKTOP_PATH, "YouTube Audio")
 DOWNLOAD_HISTORY_FILE = os.path.join(OUTPUT_FOLDER, ".audio_download_history.txt")
+HISTORY_DB_FILE = os.path.join(OUTPUT_FOLDER, ".audio_download_history.db")
+# Raw audio streams and thumbnails wait here until they are encoded
+STAGING_FOLDER = os.path.join(OUTPUT_FOLDER, ".staging")
 
-# Detect yt-dlp path
-YT_DLP_PATH = shutil.which("yt-dlp")
-if not YT_DLP_PATH:
-    possible_paths = [
-        r"C:\Users\bhara\Desktop\yt-dlp.exe",
-        os.path.join(os.path.expanduser("~"), "yt-dlp"),
-        os.path.join(os.path.expanduser("~"), "yt-dlp.exe"),
-        "./yt-dlp",
-        "./yt-dlp.exe"
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            YT_DLP_PATH = path
-            break
-    
-    if not YT_DLP_PATH:
-        print("Error: yt-dlp not found. Install it using: pip install yt-dlp")
-        exit(1)
+def open_history():
+    """Create the output folders and open the download history, importing the legacy text file if present"""
+    os.makedirs(STAGING_FOLDER, exist_ok=True)
+    history = HistoryStore(HISTORY_DB_FILE, legacy_path=DOWNLOAD_HISTORY_FILE)
+    history.index_files(OUTPUT_FOLDER)
+    return history
 
-# Ensure output directory exists
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+def open_store():
+    """Open the media store both downloaders reuse files from, adding this history's files"""
+    store = MediaStore()
+    store.add_many(get_history().records())
+    return store
 
-# Create download history file if it doesn't exist
-if not os.path.exists(DOWNLOAD_HISTORY_FILE):
-    with open(DOWNLOAD_HISTORY_FILE, 'w') as f:
-        pass
+# Opened on first use, so importing this module touches no files
+get_history = lazy(open_history)
+get_store = lazy(open_store)
 
 def get_downloaded_audio_ids():
-    """Read the history file to get previously downloaded audio IDs"""
-    if not os.path.exists(DOWNLOAD_HISTORY_FILE):
-        return set()
-    
-    with open(DOWNLOAD_HISTORY_FILE, 'r') as f:
-        return set(line.strip() for line in f if line.strip())
+    """Return the set of previously downloaded audio IDs"""
+    return get_history().ids()
 
-def add_audio_to_history(video_id):
+def add_audio_to_history(video_id, path=None):
     """Add a video ID to the download history after audio extraction"""
-    with open(DOWNLOAD_HISTORY_FILE, 'a') as f:
-        f.write(f"{video_id}\n")
+    size = os.path.getsize(path) if path and os.path.exists(path) else None
+    get_history().add(video_id, format="mp3", size=size, path=path)
 
-def download_audio(url):
-    """Download audio from URL with embedded thumbnail"""
-    # Get video IDs without downloading
-    print("Checking for audio to download...")
-    info_command = [
-        YT_DLP_PATH,
-        "--flat-playlist",
-        "--get-id",
-        url
+def track_done(video_id, result):
+    """Record a finished track in the media store, release it and report it"""
+    get_history().release(video_id)
+    get_store().add(video_id, "mp3", result["filepath"])
+    log(video_id, f"Audio from video {video_id} downloaded with thumbnail")
+    progress.emit(video_id, "done")
+    metrics.item_finished(video_id, True)
+    return result
+
+def track_failed(video_id, message):
+    get_history().release(video_id)
+    log(video_id, message)
+    progress.emit(video_id, "error")
+    metrics.item_finished(video_id, False)
+    return None
+
+def track_files(video_id, download):
+    """Mark a downloaded track as being encoded; returns (audio stream, thumbnail or None, MP3 path)"""
+    source = download["filepath"]
+    thumbnail = os.path.splitext(source)[0] + ".jpg"
+    # The track was reserved its path before it was downloaded
+    target = stem_path(OUTPUT_FOLDER, reserve_output(get_history(), video_id), "mp3")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    get_history().set_state(video_id, MERGING)
+    return source, thumbnail if os.path.exists(thumbnail) else None, target
+
+def commit_track(video_id, download, files, problem):
+    """Verify and commit an encoded track, removing the staged files; returns the result or None"""
+    source, thumbnail, target = files
+    history = get_history()
+    result = {"filepath": target, "duration": download.get("duration")}
+    if problem is None:
+        problem = verify_download(result)
+    if problem is not None:
+        history.set_state(video_id, FAILED, error=problem)
+        return track_failed(video_id, f"Error converting audio for {video_id}: {problem}")
+
+    history.set_state(video_id, VERIFIED)
+    history.commit(video_id, format="mp3", size=os.path.getsize(target), path=target)
+    for path in (source, thumbnail):
+        if path and os.path.exists(path):
+            os.remove(path)
+    return track_done(video_id, result)
+
+def finish_track(video_id, download):
+    """Encode a downloaded audio stream to MP3 with its cover and commit it"""
+    try:
+        files = track_files(video_id, download)
+        source, thumbnail, target = files
+        with metrics.timed(video_id, "postprocess"):
+            problem = encode_audio(source, target, thumbnail)
+        return commit_track(video_id, download, files, problem)
+    finally:
+        get_history().release(video_id)
+
+def track_options(thumbnail=True):
+    """yt-dlp options that fetch only the raw audio stream (and its thumbnail) into the staging folder"""
+    options = ["-f", "bestaudio"]
+    if thumbnail:
+        options += ["--write-thumbnail", "--convert-thumbnails", "jpg"]
+    # Staged by ID; the MP3 gets the output path reserved for the track
+    return options + ["--output", os.path.join(STAGING_FOLDER, "%(id)s.%(ext)s")]
+
+def cover_options():
+    """yt-dlp options that only write a track's thumbnail to the staging folder"""
+    return [
+        "--skip-download",
+        "--write-thumbnail",
+        "--convert-thumbnails", "jpg",
+        "--output", os.path.join(STAGING_FOLDER, "%(id)s.%(ext)s"),
     ]
-    
-    result = subprocess.run(info_command, capture_output=True, text=True)
-    video_ids = result.stdout.strip().split('\n')
-    video_ids = [vid for vid in video_ids if vid.strip()]  # Filter out empty lines
-    
-    # Get already downloaded audios
-    downloaded_ids = get_downloaded_audio_ids()
+
+def prefetch_options():
+    """yt-dlp options that only write a track's full metadata and its thumbnail to the staging folder"""
+    return [
+        "--skip-download",
+        "--write-info-json",
+        "--write-thumbnail",
+        "--convert-thumbnails", "jpg",
+        "--output", os.path.join(STAGING_FOLDER, "%(id)s.%(ext)s"),
+    ]
+
+def stage_cover(video_id, info, engine):
+    """Return the track's staged thumbnail, fetching only it if the track can be extracted from a stored video"""
+    cover = os.path.join(STAGING_FOLDER, f"{video_id}.jpg")
+    if not os.path.exists(cover) and engine is not None:
+        store = get_store()
+        if store.find(video_id, "mp3") is None and derivation_source(store, video_id, "mp3") is not None:
+            engine.download(cover_options(), video_id, info)
+    return cover if os.path.exists(cover) else None
+
+def start_track(video_id, info, engine=None):
+    """Report a track as started and reserve its output path; returns the result if a stored copy was reused"""
+    log(video_id, f"Downloading audio from video ID: {video_id}")
+    progress.emit(video_id, "start")
+    metrics.item_started(video_id)
+
+    # Reuse a copy already in the media store before downloading; an MP3
+    # extracted from a stored video gets the thumbnail as its cover
+    history = get_history()
+    stem = reserve_output(history, video_id, info)
+    cover = stage_cover(video_id, info, engine)
+    result = reuse_stored(get_store(), history, video_id, "mp3", OUTPUT_FOLDER, stem, (info or {}).get("duration"),
+                          cover)
+    if result is None:
+        return None
+    if cover is not None:
+        os.remove(cover)
+    return track_done(video_id, result)
+
+def prefetch_track(video_id, info, engine):
+    """Fetch a track's full metadata and thumbnail ahead of its download.
+
+    Returns (info, whether the thumbnail is staged). The download then
+    loads the metadata instead of resolving the video again. If the
+    formats are known already (from a fully extracted listing or the
+    metadata cache), or the prefetch fails, info is returned as it is and
+    the download fetches the thumbnail itself.
+    """
+    if info and "formats" in info:
+        # Fully extracted by the listing already; the download fetches the thumbnail
+        return info, False
+    info_file = os.path.join(STAGING_FOLDER, f"{video_id}.info.json")
+    with metrics.timed(video_id, "extract"):
+        returncode, _ = engine.download(prefetch_options(), video_id, info)
+    if returncode != 0 or not os.path.exists(info_file):
+        log(video_id, "Could not prefetch metadata, resolving it during the download")
+        return info, False
+    with open(info_file, 'r', encoding='utf-8') as f:
+        prefetched = json.load(f)
+    os.remove(info_file)
+    remember_info(video_id, prefetched)
+    return prefetched, os.path.exists(os.path.join(STAGING_FOLDER, f"{video_id}.jpg"))
+
+def fetch_track(video_id, info, engine, limiter, thumbnail=True):
+    """Download a track's raw audio stream, and its thumbnail unless that is staged already.
+
+    Only the streams are fetched here; the CPU-bound MP3 encoding and cover
+    embedding happen in one ffmpeg pass afterwards. Returns the download
+    result, or None after reporting the failure.
+    """
+    download = download_item(engine, track_options(thumbnail), video_id, info, get_history(), "mp3", limiter,
+                             commit=False)
+    if download is None:
+        return track_failed(video_id, f"Error downloading audio for {video_id}")
+    return download
+
+def download_track(video_id, info=None, engine=None, limiter=None, postprocessor=None):
+    """Download the audio of a single video by ID with embedded thumbnail.
+
+    Returns the result or None, or leases.CLAIMED while another run is
+    downloading the same track. With a postprocessor the MP3 encoding is
+    queued on it and a Future of the result is returned instead, so the
+    caller can start the next download right away.
+    """
+    history = get_history()
+    claimed = claim_item(history, video_id)
+    if claimed is not None:
+        return claimed
+    try:
+        engine = engine or SubprocessEngine()
+        # Reuse metadata from the listing pass or the metadata cache when it has fresh formats
+        info = cached_info(video_id, info)
+        thumbnail = False
+        if needs_info(history, video_id, info):
+            # The output path depends on metadata the listing does not have
+            info, thumbnail = prefetch_track(video_id, info, engine)
+        result = start_track(video_id, info, engine)
+        if result is not None:
+            return result
+
+        download = fetch_track(video_id, info, engine, limiter, thumbnail=not thumbnail)
+        if download is None:
+            return None
+    except BaseException:
+        # The lease is otherwise released once the track is committed or has failed
+        history.release(video_id)
+        raise
+    if postprocessor is not None:
+        return postprocessor.submit(finish_track, video_id, download)
+    return finish_track(video_id, download)
+
+class TrackStages:
+    """The prefetch and download stages of download_tracks() for the tracks of one listing.
+
+    A prefetch costs a yt-dlp run of its own, so it is only done for
+    tracks that would otherwise wait for one of the `jobs` download
+    workers; a track a free worker starts right away is resolved during
+    its download. The orchestrator runs the same stages.
+    """
+
+    def __init__(self, entries, engine, limiter, jobs=DEFAULT_JOBS):
+        self.entries = entries
+        self.engine = engine
+        self.limiter = limiter
+        self.jobs = jobs
+        self.lock = threading.Lock()
+        # Tracks handed to the download stage that have not finished downloading
+        self.waiting = 0
+
+    def prefetch(self, video_id):
+        """Claim a track and reserve its path, prefetching it if it would wait; returns (info, thumbnail staged)"""
+        claimed = claim_item(get_history(), video_id)
+        if claimed is not None:
+            return Finished(claimed)
+        info = cached_info(video_id, self.entries[video_id])
+        prefetched = None
+        if needs_info(get_history(), video_id, info):
+            # The output path depends on metadata the listing does not have
+            prefetched = prefetch_track(video_id, info, self.engine)
+            info = prefetched[0]
+        result = start_track(video_id, info, self.engine)
+        if result is not None:
+            return Finished(result)
+        with self.lock:
+            direct = self.waiting < self.jobs or prefetched is not None
+            self.waiting += 1
+        if direct:
+            return prefetched or (info, False)
+        try:
+            return prefetch_track(video_id, info, self.engine)
+        except BaseException:
+            with self.lock:
+                self.waiting -= 1
+            raise
+
+    def fetch(self, video_id, prefetched):
+        """Download a prefetched track's audio stream; returns the download result"""
+        try:
+            info, thumbnail = prefetched
+            download = fetch_track(video_id, info, self.engine, self.limiter, thumbnail=not thumbnail)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+        return download if download is not None else Finished(None)
+
+def download_tracks(video_ids, entries, engine, limiter, jobs=DEFAULT_JOBS, encoders=DEFAULT_WORKERS):
+    """Download and encode several tracks as a pipeline of three stages.
+
+    While up to `jobs` tracks download, the next ones already have their
+    metadata and thumbnail prefetched and up to `encoders` finished ones
+    are converted to MP3, so the network, the disk and the CPU are busy at
+    the same time. Each stage holds at most one waiting track per worker,
+    so a slow stage holds back the stages before it. Returns the results
+    in the order of video_ids, leases.CLAIMED for tracks another run is
+    downloading.
+    """
+    stages = TrackStages(entries, engine, limiter, jobs)
+    try:
+        results = run_pipeline(video_ids, [(stages.prefetch, jobs), (stages.fetch, jobs), (finish_track, encoders)])
+    finally:
+        # Tracks a cancelled run never got to the end of the pipeline, and when a stage
+        # raised, run_pipeline() raises again without results; either way they still hold leases
+        for video_id in video_ids:
+            get_history().release(video_id)
+    for video_id, result in zip(video_ids, results):
+        if result is None:
+            metrics.item_finished(video_id, False)
+    return results
+
+def download_audio(url, jobs=DEFAULT_JOBS, single_pass=False, engine=DEFAULT_ENGINE,
+                    limit_rate=None, rate_config=DEFAULT_RATE_CONFIG, sync=False, encoders=DEFAULT_WORKERS,
+                    layout=None):
+    """Download audio from URL with embedded thumbnail.
+
+    layout, if given, switches the output folder to that layout.py layout
+    for this and later runs.
+
+    Returns {video ID: result or None} for the tracks that were not
+    downloaded before, or None if the URL could not be listed.
+    """
+    # Get video IDs without downloading
+    echo("Checking for audio to download...")
+    engine = make_engine(engine)
+    limiter = make_limiter(url, limit_rate, rate_config, jobs)
+    history = get_history()
+    if layout:
+        set_layout(history, layout)
+    with metrics.timed(url, "listing"):
+        entries = list_source(engine, history, url, full=single_pass, sync=sync)
+    if entries is None:
+        echo(f"No videos found for {url}")
+        engine.close()
+        return None
     
     # Filter out videos that have already been downloaded
-    new_videos = [vid for vid in video_ids if vid not in downloaded_ids]
+    new_videos = queue_new(history, entries)
     
     if not new_videos:
-        print("already audio download, so dont download!")
-        return
+        echo("already audio download, so dont download!")
+        engine.close()
+        return {}
     
-    print(f"Found {len(new_videos)} new audio track(s) to download")
+    echo(f"Found {len(new_videos)} new audio track(s) to download")
     
-    # Download new audio
-    for video_id in new_videos:
-        video_url = f"https://www.youtube.com/watch?v={video_id}"
-        print(f"Downloading audio from video ID: {video_id}")
-        
-        # Use yt-dlp's built-in thumbnail embedding
-        command = [
-            YT_DLP_PATH,
-            "-f", "bestaudio",
-            "--extract-audio",
-            "--audio-format", "mp3",
-            "--audio-quality", "0",
-            "--embed-thumbnail",  # This is the key flag to embed thumbnails
-            "--convert-thumbnails", "jpg",
-            "--output", os.path.join(OUTPUT_FOLDER, "%(title)s.%(ext)s"),
-            "--sleep-interval", "2",
-            video_url
-        ]
-        
-        result = subprocess.run(command)
-        
-        if result.returncode == 0:
-            # Add to download history
-            add_audio_to_history(video_id)
-            print(f"Audio from video {video_id} downloaded with thumbnail")
-        else:
-            print(f"Error downloading audio for {video_id}")
+    # Prefetch, download and encode new audio as a pipeline, up to `jobs`
+    # downloads and `encoders` conversions at a time; tracks another run on
+    # the same folder is downloading are left to it and checked on at the end
+    progress.emit("queue", "queue", items=new_videos)
+    try:
+        results = run_claimed(history, new_videos,
+                              lambda video_ids: download_tracks(video_ids, entries, engine, limiter, jobs, encoders))
+    finally:
+        engine.close()
+    return dict(zip(new_videos, results))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="YouTube Audio Downloader with Thumbnails")
+    parser.add_argument("url", nargs="?", help="YouTube URL (video or playlist); prompted for if omitted")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS,
+                        help=f"number of tracks to download at once (default: {DEFAULT_JOBS})")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="extract all metadata in one yt-dlp call and reuse it for each download")
+    parser.add_argument("--engine", choices=ENGINES, default=DEFAULT_ENGINE,
+                        help="run yt-dlp as a subprocess per video or in-process with one reused instance")
+    parser.add_argument("--encoders", type=int, default=DEFAULT_WORKERS,
+                        help=f"number of tracks to convert to MP3 at once (default: {DEFAULT_WORKERS}, the CPU count)")
+    parser.add_argument("--layout", choices=LAYOUTS,
+                        help="arrange the folder flat, by channel, by year/month or in ID-prefix subfolders; "
+                             "remembered for later runs (default: flat)")
+    parser.add_argument("--sync", action="store_true",
+                        help="remember the listing of the URL and on later runs only fetch new uploads")
+    parser.add_argument("--limit-rate", metavar="RATE",
+                        help="total bandwidth budget shared by all jobs, e.g. 2M (default: no limit)")
+    parser.add_argument("--rate-config", metavar="FILE", default=DEFAULT_RATE_CONFIG,
+                        help=f"per-domain/per-channel rate limit settings (default: {DEFAULT_RATE_CONFIG})")
+    parser.add_argument("--progress-json", action="store_true",
+                        help="print machine-readable progress event lines for a front end reading the output")
+    parser.add_argument("--metrics-log", metavar="FILE",
+                        help="append per-item stage timings, bytes and retries to FILE as JSON lines")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics at http://127.0.0.1:PORT/metrics while downloading")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.progress_json:
+        progress.enable()
+    try:
+        metrics.start(args.metrics_log, args.metrics_port)
+    except OSError as e:
+        print(f"Error starting metrics: {e}")
+        sys.exit(1)
+    
     print("YouTube Audio Downloader with Thumbnails")
     print("=" * 50)
     print(f"Audio files will be saved to: {OUTPUT_FOLDER}")
     
-    url = input("Enter YouTube URL (video or playlist): ")
+    url = args.url or input("Enter YouTube URL (video or playlist): ")
     
     if not url.strip():
         print("No URL provided. Exiting.")
         return
     
     print("\nStarting audio download process...")
-    download_audio(url)
+    try:
+        download_audio(url, args.jobs, args.single_pass, args.engine, args.limit_rate, args.rate_config, args.sync,
+                       args.encoders, args.layout)
+    except ToolNotFound as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     print("\nAudio download process completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+import sys
+import json
+import signal
+import argparse
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .config import ToolNotFound
+from .engine import DEFAULT_ENGINE, ENGINES, make_engine
+from .formats import DEFAULT_PROFILE, load_profiles
+from .layout import LAYOUTS, set_layout
+from .leases import CLAIMED, wait_released
+from .postprocess import DEFAULT_WORKERS, PostProcessor, resolve
+from .ratelimit import DEFAULT_RATE_CONFIG, load_rate_config, make_limiter, settings_for_url
+from .scheduler import DEFAULT_JOBS, LOG_FORMATS, log, set_log_format
+from .sync import sync_source
+
+# Exit status, so cron/systemd can tell what happened
+EXIT_OK = 0            # every item was downloaded (or already in the history)
+EXIT_FAILED = 1        # at least one item failed all its attempts
+EXIT_USAGE = 2         # bad arguments or no URLs given
+EXIT_SOURCE_ERROR = 3  # at least one URL could not be listed
+EXIT_INTERRUPTED = 130 # stopped by Ctrl+C or SIGTERM
+
+MODES = ("video", "audio")
+DEFAULT_MODE = "video"
+
+def load_backend(mode):
+    """Import the downloader module for a mode; returns (history, download function)"""
+    if mode == "audio":
+        from . import audio_only
+        return audio_only.get_history(), audio_only.download_track
+    from . import video
+    return video.get_history(), video.download_video
+
+def parse_source(line, default_mode=DEFAULT_MODE):
+    """Parse one input line into (mode, url), or None for blank lines and comments.
+
+    A line is a URL, optionally preceded by "video" or "audio".
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+
+    parts = line.split(None, 1)
+    if len(parts) == 2 and parts[0].lower() in MODES:
+        return parts[0].lower(), parts[1].strip()
+    return default_mode, line
+
+def iter_sources(streams, default_mode=DEFAULT_MODE):
+    """Yield each distinct (mode, url) from the input streams as soon as it is read"""
+    seen = set()
+    for stream in streams:
+        for line in stream:
+            source = parse_source(line, default_mode)
+            if source is not None and source not in seen:
+                seen.add(source)
+                yield source
+
+def open_inputs(paths):
+    """Open the URL files to read; "-" (or no file at all) means stdin"""
+    for path in paths or ["-"]:
+        if path == "-":
+            yield sys.stdin
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield f
+
+class BatchRun:
+    """Lists every source and feeds its new items into one shared worker pool.
+
+    Sources are listed as they are read, so downloads of the first playlist
+    start while later lines of a stream are still arriving. An item that
+    appears in several sources is only downloaded once, and sources with the
+    same rate limit settings share one bandwidth budget and delay. Items
+    another run is downloading are waited for once everything else is done.
+    """
+
+    def __init__(self, engine_name, jobs, single_pass=False, limit_rate=None, rate_config=DEFAULT_RATE_CONFIG,
+                 sync=False, encoders=DEFAULT_WORKERS, profile=DEFAULT_PROFILE, probe=False, layout=None):
+        self.engine_name = engine_name
+        self.engine = None
+        self.jobs = max(1, jobs)
+        self.single_pass = single_pass
+        self.sync = sync
+        self.encoders = encoders
+        self.profile = profile
+        self.probe = probe
+        self.layout = layout
+        self.postprocessor = None
+        self.limit_rate = limit_rate
+        self.rate_config = rate_config
+        self.rate_settings = load_rate_config(rate_config)
+        self.limiters = {}
+        self.queued = set()
+        self.sources = 0
+        self.items = []                 # (future, history, video ID, retry)
+        self.source_errors = 0
+
+    def limiter_for(self, url):
+        """Return the rate limiter for a URL; URLs with the same settings share one"""
+        key = json.dumps(settings_for_url(url, self.rate_settings), sort_keys=True)
+        if key not in self.limiters:
+            self.limiters[key] = make_limiter(url, self.limit_rate, self.rate_config, self.jobs)
+        return self.limiters[key]
+
+    def add_source(self, executor, mode, url):
+        history, download = load_backend(mode)
+        if self.layout:
+            set_layout(history, self.layout)
+        if self.engine is None:
+            self.engine = make_engine(self.engine_name)
+
+        log("batch", f"Listing {mode} source {url}", event="list", mode=mode, url=url)
+        with metrics.timed(url, "listing"):
+            if self.sync:
+                entries = sync_source(self.engine, history, url)
+                failed = entries is None
+            else:
+                entries = self.engine.fetch_playlist(url, full=self.single_pass)
+                failed = not entries
+        if failed:
+            self.source_errors += 1
+            log("batch", f"No videos found for {url}", event="source_error", mode=mode, url=url)
+            return
+
+        new_items = [video_id for video_id in history.filter_new(entries)
+                     if (mode, video_id) not in self.queued]
+        history.mark_pending(new_items)
+        self.queued.update((mode, video_id) for video_id in new_items)
+        log("batch", f"Found {len(new_items)} new of {len(entries)} item(s) in {url}",
+            event="source", mode=mode, url=url, total=len(entries), new=len(new_items))
+
+        limiter = self.limiter_for(url)
+        # Audio tracks go to the shared post-processing pool; videos pick a format by profile
+        if mode == "audio":
+            extra = {"postprocessor": self.postprocessor}
+        else:
+            extra = {"profile": self.profile, "probe": self.probe}
+        for video_id in new_items:
+            retry = partial(download, video_id, entries[video_id], self.engine, limiter, **extra)
+            self.items.append((executor.submit(retry), history, video_id, retry))
+
+    def collect(self):
+        """Return the result of every queued item, downloading the ones other runs held once they are released"""
+        results = []
+        for future, history, video_id, retry in self.items:
+            try:
+                result = future.result()
+                while result == CLAIMED and wait_released(history, video_id):
+                    result = retry()
+                result = resolve(result) if result != CLAIMED else None
+            except Exception as e:
+                log("batch", f"Download crashed: {e}", event="crash")
+                result = None
+            results.append(result)
+        return results
+
+    def run(self, sources):
+        """Download everything from the sources; returns (downloaded, failed)"""
+        executor = ThreadPoolExecutor(max_workers=self.jobs)
+        self.postprocessor = PostProcessor(self.encoders)
+        try:
+            for mode, url in sources:
+                self.sources += 1
+                self.add_source(executor, mode, url)
+            executor.shutdown(wait=True)
+            results = self.collect()
+        except KeyboardInterrupt:
+            # Items already downloading finish (or stay resumable); the rest are dropped
+            log("batch", "Interrupted, waiting for running downloads to stop", event="interrupted")
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            self.postprocessor.close()
+            if self.engine is not None:
+                self.engine.close()
+
+        downloaded = sum(1 for result in results if result)
+        return downloaded, len(results) - downloaded
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Download many YouTube URLs without prompting",
+        epilog="Each input line is a video, playlist or channel URL, optionally prefixed "
+               "with \"video\" or \"audio\". Blank lines and lines starting with # are ignored. "
+               f"Exit status: {EXIT_OK} all done, {EXIT_FAILED} some items failed, "
+               f"{EXIT_USAGE} usage error, {EXIT_SOURCE_ERROR} some URLs could not be listed, "
+               f"{EXIT_INTERRUPTED} interrupted."
+    )
+    parser.add_argument("inputs", nargs="*", metavar="FILE",
+                        help="files with one URL per line; - or no file reads stdin")
+    parser.add_argument("--mode", choices=MODES, default=DEFAULT_MODE,
+                        help=f"what to download for lines without a prefix (default: {DEFAULT_MODE})")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS,
+                        help=f"number of items to download at once across all URLs (default: {DEFAULT_JOBS})")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="extract all metadata in one yt-dlp call per URL and reuse it for each download")
+    parser.add_argument("--engine", choices=ENGINES, default=DEFAULT_ENGINE,
+                        help="run yt-dlp as a subprocess per video or in-process with one reused instance")
+    parser.add_argument("--profile", choices=sorted(load_profiles()), default=DEFAULT_PROFILE,
+                        help=f"quality profile for video downloads (default: {DEFAULT_PROFILE})")
+    parser.add_argument("--probe-formats", action="store_true",
+                        help="probe each video's formats before downloading it when they are not cached yet")
+    parser.add_argument("--layout", choices=LAYOUTS,
+                        help="arrange the output folders flat, by channel, by year/month or in ID-prefix subfolders; "
+                             "remembered for later runs (default: flat)")
+    parser.add_argument("--encoders", type=int, default=DEFAULT_WORKERS,
+                        help=f"number of audio tracks to convert at once (default: {DEFAULT_WORKERS}, the CPU count)")
+    parser.add_argument("--sync", action="store_true",
+                        help="remember each URL's listing and on later runs only fetch new uploads")
+    parser.add_argument("--limit-rate", metavar="RATE",
+                        help="total bandwidth budget shared by all jobs, e.g. 2M (default: no limit)")
+    parser.add_argument("--rate-config", metavar="FILE", default=DEFAULT_RATE_CONFIG,
+                        help=f"per-domain/per-channel rate limit settings (default: {DEFAULT_RATE_CONFIG})")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default="text",
+                        help="print plain \"[job] message\" lines or one JSON object per line")
+    parser.add_argument("--metrics-log", metavar="FILE",
+                        help="append per-item stage timings, bytes and retries to FILE as JSON lines")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics at http://127.0.0.1:PORT/metrics while downloading")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    set_log_format(args.log_format)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        metrics.start(args.metrics_log, args.metrics_port)
+    except OSError as e:
+        log("batch", f"Error starting metrics: {e}", event="usage_error")
+        return EXIT_USAGE
+
+    batch = BatchRun(args.engine, args.jobs, args.single_pass, args.limit_rate, args.rate_config, args.sync, args.encoders,
+                     args.profile, args.probe_formats, args.layout)
+    try:
+        sources = iter_sources(open_inputs(args.inputs), args.mode)
+        downloaded, failed = batch.run(sources)
+    except OSError as e:
+        log("batch", f"Error reading URLs: {e}", event="usage_error")
+        return EXIT_USAGE
+    except ToolNotFound as e:
+        log("batch", f"Error: {e}", event="tool_missing")
+        return EXIT_FAILED
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+
+    if not batch.sources:
+        log("batch", "No URLs given", event="usage_error")
+        return EXIT_USAGE
+    log("batch", f"Finished: {downloaded} downloaded, {failed} failed, {batch.source_errors} source error(s)",
+        event="finished", downloaded=downloaded, failed=failed, source_errors=batch.source_errors)
+
+    if failed:
+        return EXIT_FAILED
+    if batch.source_errors:
+        return EXIT_SOURCE_ERROR
+    return EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
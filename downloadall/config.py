@@ -0,0 +1,65 @@
+import os
+import shutil
+import platform
+import threading
+
+# Places yt-dlp is looked for when YT_DLP_PATH is not set and it is not on the PATH
+YT_DLP_FALLBACK_PATHS = [
+    r"C:\Users\bhara\Desktop\yt-dlp.exe",
+    os.path.join(os.path.expanduser("~"), "yt-dlp"),
+    os.path.join(os.path.expanduser("~"), "yt-dlp.exe"),
+    "./yt-dlp",
+    "./yt-dlp.exe"
+]
+
+class ToolNotFound(Exception):
+    """A required external program could not be found"""
+
+# Determine user's desktop path based on the operating system
+def get_desktop_path():
+    if platform.system() == "Windows":
+        return os.path.join(os.path.expanduser("~"), "Desktop")
+    elif platform.system() == "Darwin":  # macOS
+        return os.path.join(os.path.expanduser("~"), "Desktop")
+    else:  # Linux and other Unix-like systems
+        return os.path.join(os.path.expanduser("~"), "Desktop")
+
+def lazy(factory):
+    """Return a function that calls factory on first use and then keeps returning its result.
+
+    Module-level resources (history databases, the media store, yt-dlp's
+    location) are created through this, so importing a module has no side
+    effects and only the resources a run actually uses are set up.
+    """
+    lock = threading.Lock()
+    value = []
+
+    def get():
+        if not value:
+            with lock:
+                if not value:
+                    value.append(factory())
+        return value[0]
+    return get
+
+def _find_yt_dlp():
+    path = os.environ.get("YT_DLP_PATH") or shutil.which("yt-dlp")
+    if path:
+        return path
+    for path in YT_DLP_FALLBACK_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+# Location of the yt-dlp executable, or None; looked up once
+find_yt_dlp = lazy(_find_yt_dlp)
+
+# Location of aria2c, which splits plain HTTP downloads over several connections; looked up once
+find_aria2c = lazy(lambda: shutil.which("aria2c"))
+
+def require_yt_dlp():
+    """Return the location of the yt-dlp executable, raising ToolNotFound if there is none"""
+    path = find_yt_dlp()
+    if not path:
+        raise ToolNotFound("yt-dlp not found. Install it using: pip install yt-dlp")
+    return path
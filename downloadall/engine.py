@@ -0,0 +1,259 @@
+import threading
+
+from . import progress
+from .config import require_yt_dlp
+from .formats import downloader_args
+from .listing import entries_by_id, fetch_info, video_source
+from .scheduler import current_control, echo, log, run_download
+
+ENGINES = ("subprocess", "inprocess")
+DEFAULT_ENGINE = "subprocess"
+
+class SubprocessEngine:
+    """Runs a fresh yt-dlp process for every listing and download"""
+
+    name = "subprocess"
+
+    def __init__(self, yt_dlp_path=None):
+        # Without an explicit path yt-dlp is looked up now, when it is first needed
+        self.yt_dlp_path = yt_dlp_path or require_yt_dlp()
+
+    def rate_limit_options(self, limiter, share, connections=1, options=()):
+        """Options that cap one download at its share of the limiter's bandwidth budget.
+
+        yt-dlp applies --limit-rate to every connection of the fragment
+        downloads it runs itself, so a download over several connections
+        splits its share between them. aria2c (see connection_options())
+        gets the limit as --max-overall-download-limit instead, which
+        covers all its connections, so it is given the whole share.
+        """
+        if not share:
+            return []
+        limits = ["--limit-rate", str(max(1, share // connections))]
+        aria2c = downloader_args(options, "aria2c")
+        if aria2c is not None and connections > 1:
+            # Replaces the earlier aria2c arguments; aria2c uses the last value of an option
+            limits += ["--downloader-args", f"aria2c:{aria2c} --max-overall-download-limit={share}"]
+        return limits
+
+    def fetch_info(self, url, full=False, items=None):
+        return fetch_info(self.yt_dlp_path, url, full=full, items=items)
+
+    def fetch_playlist(self, url, full=False):
+        return entries_by_id(self.fetch_info(url, full=full))
+
+    def download(self, options, video_id, info=None, on_line=None, on_info=None):
+        """Download one video with the given yt-dlp options; returns (return code, result).
+
+        If the video has to be resolved (info has no formats), on_info is
+        called with the metadata yt-dlp extracted.
+        """
+        if info and "formats" in info:
+            on_info = None
+        with video_source(video_id, info) as source:
+            command = [self.yt_dlp_path] + options + progress.template_args() + source
+            return run_download(command, video_id, on_line, on_info)
+
+    def close(self):
+        pass
+
+class _JobLogger:
+    """yt-dlp logger that tags every message with the current job and notes errors.
+
+    It also carries the running download's bandwidth bucket, JobControl and
+    on_info callback, since yt-dlp calls the progress hooks from its
+    fragment threads too.
+    """
+
+    def __init__(self, prefix=None):
+        self.prefix = prefix
+        self.failed = False
+        self.on_line = None
+        self.on_info = None
+        self.bucket = None
+        self.control = None
+        self.metered = (None, 0)
+        self.lock = threading.Lock()
+
+    def debug(self, message):
+        # yt-dlp sends regular output through debug(); verbose output carries a "[debug] " prefix
+        if not message.startswith("[debug] "):
+            self.info(message)
+
+    def info(self, message):
+        log(self.prefix, message)
+        if self.on_line is not None:
+            self.on_line(message)
+
+    def warning(self, message):
+        self.info(f"WARNING: {message}")
+
+    def error(self, message):
+        self.failed = True
+        self.info(message)
+
+def _split_option(options, flags):
+    """Split the value of one yt-dlp option off the others; returns (other options, value or None)"""
+    options = list(options)
+    for flag in flags:
+        if flag in options:
+            index = options.index(flag)
+            return options[:index] + options[index + 2:], options[index + 1]
+    return options, None
+
+class YoutubeDLEngine:
+    """Drives yt_dlp.YoutubeDL in this process.
+
+    Each worker thread keeps one YoutubeDL instance per set of options (the
+    format and output path aside) and reuses it for every video, so the interpreter start-up, extractor imports,
+    HTTP connection pool and cookie jar are paid for once per run instead of
+    once per video.
+    """
+
+    name = "inprocess"
+
+    def __init__(self):
+        import yt_dlp
+        self._yt_dlp = yt_dlp
+        self._local = threading.local()
+        self._instances = []
+        self._lock = threading.Lock()
+
+    def rate_limit_options(self, limiter, share, connections=1, options=()):
+        # Downloads on this thread are metered through the limiter's token
+        # bucket instead, over all their connections, which also keeps the
+        # options (and so the reused YoutubeDL instance) unchanged
+        self._local.bucket = limiter.bucket
+        return []
+
+    def _instance(self, options, prefix):
+        instances = getattr(self._local, "instances", None)
+        if instances is None:
+            instances = self._local.instances = {}
+
+        key = tuple(options)
+        if key not in instances:
+            ydl_opts = self._yt_dlp.parse_options(list(options)).ydl_opts
+            logger = ydl_opts["logger"] = _JobLogger(prefix)
+            if progress.is_enabled():
+                # Progress hooks replace the human-readable progress bar
+                ydl_opts["noprogress"] = True
+            ydl = self._yt_dlp.YoutubeDL(ydl_opts)
+            ydl.add_post_hook(self._record_path)
+            ydl.add_postprocessor_hook(self._record_info)
+            ydl.add_progress_hook(lambda status: self._capture_info(ydl, logger, status))
+            ydl.add_progress_hook(lambda status: self._meter(logger, status))
+            ydl.add_progress_hook(lambda status: self._check_cancelled(logger, status))
+            ydl.add_progress_hook(lambda status: progress.emit_progress(logger.prefix, status))
+            instances[key] = (ydl, logger)
+            with self._lock:
+                self._instances.append(ydl)
+        return instances[key]
+
+    def _record_path(self, filename):
+        self._local.result["filepath"] = filename
+
+    def _record_info(self, status):
+        # Read from the info dict the finished file is moved with, as the subprocess engine's after_move:
+        # template is; the progress hooks of a merged download only see its parts, the audio last
+        if status.get("status") == "finished" and status.get("postprocessor") == "MoveFiles":
+            info = status.get("info_dict") or {}
+            for key in ("duration", "filesize", "filesize_approx", "format_id"):
+                if info.get(key) is not None:
+                    self._local.result[key] = info[key]
+
+    def _capture_info(self, ydl, logger, status):
+        """Hand the metadata of the video being downloaded to the download's on_info, once"""
+        with logger.lock:
+            on_info, logger.on_info = logger.on_info, None
+        if on_info is not None and status.get("info_dict"):
+            on_info(ydl.sanitize_info(status["info_dict"]))
+
+    def _meter(self, logger, status):
+        """Draw newly downloaded bytes from the shared bucket, blocking while it is empty"""
+        bucket = logger.bucket
+        if bucket is None or status.get("status") != "downloading":
+            return
+        downloaded = status.get("downloaded_bytes") or 0
+        key = status.get("filename")
+        with logger.lock:
+            # Fragment threads may report out of order; only growth is drawn
+            last_key, last = logger.metered
+            delta = downloaded - last if key == last_key else downloaded
+            if delta > 0 or key != last_key:
+                logger.metered = (key, downloaded)
+        if delta > 0:
+            bucket.consume(delta)
+
+    def _check_cancelled(self, logger, status):
+        # Raising from a progress hook is how yt-dlp lets a download be aborted
+        if logger.control is not None and logger.control.cancelled.is_set():
+            raise self._yt_dlp.utils.DownloadCancelled()
+
+    def fetch_info(self, url, full=False, items=None):
+        params = {"quiet": True, "ignoreerrors": "only_download"}
+        if not full:
+            params["extract_flat"] = "in_playlist"
+        if items:
+            params["playlist_items"] = items
+
+        try:
+            with self._yt_dlp.YoutubeDL(params) as ydl:
+                return ydl.sanitize_info(ydl.extract_info(url, download=False))
+        except self._yt_dlp.utils.DownloadError as e:
+            log("list", f"Error fetching video list: {e}")
+            return None
+
+    def fetch_playlist(self, url, full=False):
+        return entries_by_id(self.fetch_info(url, full=full))
+
+    def download(self, options, video_id, info=None, on_line=None, on_info=None):
+        """Download one video with the given yt-dlp options; returns (return code, result)"""
+        # The format and output path differ per video, so they are applied to
+        # the shared instance instead of becoming part of the instance key
+        options, format_spec = _split_option(options, ("-f", "--format"))
+        options, output = _split_option(options, ("-o", "--output"))
+        if output is not None and output.split(":", 1)[0] in self._yt_dlp.utils.OUTTMPL_TYPES:
+            # A template for another kind of file (thumbnail:..., infojson:...) stays with the options
+            options, output = options + ["--output", output], None
+        ydl, logger = self._instance(options, video_id)
+        if format_spec is not None and ydl.params.get("format") != format_spec:
+            ydl.params["format"] = format_spec
+            ydl.format_selector = ydl.build_format_selector(format_spec)
+        if output is not None:
+            ydl.params["outtmpl"]["default"] = output
+        logger.prefix = video_id
+        logger.failed = False
+        logger.on_line = on_line
+        logger.bucket = getattr(self._local, "bucket", None)
+        logger.control = current_control()
+        logger.metered = (None, 0)
+        logger.on_info = None if info and "formats" in info else on_info
+        self._local.result = {}
+
+        try:
+            with video_source(video_id, info) as source:
+                if source[0] == "--load-info-json":
+                    ydl.download_with_info_file(source[1])
+                else:
+                    ydl.download(source)
+        except (self._yt_dlp.utils.DownloadError, self._yt_dlp.utils.DownloadCancelled):
+            logger.failed = True
+
+        result = self._local.result if "filepath" in self._local.result else None
+        return (1 if logger.failed else 0), result
+
+    def close(self):
+        with self._lock:
+            for ydl in self._instances:
+                ydl.close()
+            self._instances = []
+
+def make_engine(name, yt_dlp_path=None):
+    """Create the named download engine, falling back to the subprocess engine"""
+    if name == "inprocess":
+        try:
+            return YoutubeDLEngine()
+        except ImportError:
+            echo("yt_dlp module not found, falling back to the subprocess engine")
+    return SubprocessEngine(yt_dlp_path)
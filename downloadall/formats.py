@@ -0,0 +1,159 @@
+import os
+import json
+
+# Where users can add or override quality profiles
+DEFAULT_PROFILES_FILE = os.path.join(os.path.expanduser("~"), ".youtube_downloader", "profiles.json")
+
+# Named quality profiles:
+#   max_height         tallest video to pick (None for no limit)
+#   progressive_floor  use a single progressive (video+audio) stream when one is
+#                      at least this tall, skipping the separate downloads and merge
+#   mp4_only           stick to MP4 video / M4A audio streams
+#   connections        parallel connections per download (see connection_options())
+#   split_size         smallest byte range aria2c fetches over its own connection
+DEFAULT_PROFILE = "default"
+PROFILES = {
+    # The original selector: best MP4 video plus M4A audio, merged
+    "default": {"max_height": None, "progressive_floor": None, "mp4_only": True, "connections": 1},
+    # Any progressive stream of 360p or more, otherwise merge up to 720p
+    "720p-fast": {"max_height": 720, "progressive_floor": 360, "mp4_only": True, "connections": 1},
+    "1080p": {"max_height": 1080, "progressive_floor": 1080, "mp4_only": True, "connections": 1},
+    # Highest quality in any codec (VP9/AV1/Opus included), merged into MP4;
+    # these are the largest files, so they are fetched over several connections
+    "archival": {"max_height": None, "progressive_floor": None, "mp4_only": False, "connections": 4},
+}
+
+# Default split_size: files under twice this size keep a single connection
+DEFAULT_SPLIT_SIZE = "10M"
+
+# Cached format lists older than this are probed again when probing is on
+FORMAT_CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Format fields kept in the cache; stream URLs expire, so they are not stored
+_FORMAT_FIELDS = ("format_id", "ext", "height", "vcodec", "acodec", "tbr")
+
+def load_profiles(path=DEFAULT_PROFILES_FILE):
+    """Return the built-in profiles updated with the ones in the profiles file.
+
+    The file maps profile names to settings, for example:
+
+        {"480p-mobile": {"max_height": 480, "progressive_floor": 360},
+         "lectures": {"max_height": 1080, "connections": 8, "split_size": "20M"}}
+    """
+    profiles = {name: dict(settings) for name, settings in PROFILES.items()}
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for name, settings in json.load(f).items():
+                profiles[name] = dict(PROFILES[DEFAULT_PROFILE], **settings)
+    return profiles
+
+def profile_selector(profile):
+    """Build the yt-dlp format selector that implements a profile"""
+    height = f"[height<={profile['max_height']}]" if profile.get("max_height") else ""
+    video_ext = "[ext=mp4]" if profile.get("mp4_only", True) else ""
+    audio_ext = "[ext=m4a]" if profile.get("mp4_only", True) else ""
+
+    choices = []
+    if profile.get("progressive_floor"):
+        choices.append(f"best{video_ext}[height>={profile['progressive_floor']}]{height}")
+    choices.append(f"bestvideo{video_ext}{height}+bestaudio{audio_ext}")
+    choices.append(f"best{video_ext}{height}")
+    if choices[-1] != "best":
+        choices.append("best")
+    return "/".join(choices)
+
+def connection_options(profile, aria2c=None):
+    """yt-dlp options that fetch a download over the profile's number of parallel connections.
+
+    DASH and HLS fragments are downloaded that many at a time by yt-dlp
+    itself. Plain HTTP downloads are split into byte ranges by aria2c when
+    its path is given and keep a single connection otherwise.
+    """
+    connections = profile.get("connections") or 1
+    if connections <= 1:
+        return []
+    options = ["--concurrent-fragments", str(connections)]
+    if aria2c:
+        split_size = profile.get("split_size") or DEFAULT_SPLIT_SIZE
+        options += [
+            "--downloader", aria2c,
+            "--downloader", "dash,m3u8:native",
+            "--downloader-args", f"aria2c:-x {connections} -s {connections} -k {split_size}",
+        ]
+    return options
+
+def downloader_args(options, name):
+    """The arguments a list of yt-dlp options gives an external downloader, or None; the last ones count"""
+    found = None
+    for flag, value in zip(options, options[1:]):
+        if flag == "--downloader-args" and value.startswith(name + ":"):
+            found = value[len(name) + 1:]
+    return found
+
+def slim_formats(formats):
+    """Keep the fields of a yt-dlp format list needed to choose a format"""
+    return [{key: f.get(key) for key in _FORMAT_FIELDS} for f in formats or [] if f.get("format_id")]
+
+def _rank(f):
+    return (f.get("height") or 0, f.get("tbr") or 0)
+
+def _has_video(f):
+    return f.get("vcodec") not in (None, "none")
+
+def _has_audio(f):
+    return f.get("acodec") not in (None, "none")
+
+def choose_format(formats, profile):
+    """Pick format IDs for a profile from a format list; returns e.g. "137+140", "18" or None"""
+    max_height = profile.get("max_height")
+    mp4_only = profile.get("mp4_only", True)
+
+    def usable(f, ext):
+        if mp4_only and f.get("ext") != ext:
+            return False
+        return not max_height or (f.get("height") or 0) <= max_height
+
+    progressive = [f for f in formats if _has_video(f) and _has_audio(f) and usable(f, "mp4")]
+    video_only = [f for f in formats if _has_video(f) and not _has_audio(f) and usable(f, "mp4")]
+    audio_only = [f for f in formats if _has_audio(f) and not _has_video(f) and (not mp4_only or f.get("ext") == "m4a")]
+
+    best_progressive = max(progressive, key=_rank, default=None)
+    floor = profile.get("progressive_floor")
+    if best_progressive and floor and (best_progressive.get("height") or 0) >= floor:
+        return best_progressive["format_id"]
+
+    if video_only and audio_only:
+        video = max(video_only, key=_rank)
+        audio = max(audio_only, key=lambda f: f.get("tbr") or 0)
+        return f"{video['format_id']}+{audio['format_id']}"
+    return best_progressive["format_id"] if best_progressive else None
+
+def needs_probe(video_id, info, history, profile_name):
+    """Whether a video's formats must be probed before a format can be chosen"""
+    if info and "formats" in info:
+        return False
+    if history.get_format_choice(video_id, profile_name):
+        return False
+    return history.get_formats(video_id, FORMAT_CACHE_MAX_AGE) is None
+
+def select_format(video_id, info, history, profile_name, profiles=PROFILES):
+    """Return the -f value for a video under a quality profile.
+
+    A format recorded by an earlier download with the same profile wins, so
+    re-downloads are deterministic. Otherwise the format is chosen from the
+    entry's formats (which are cached) or from an earlier cached list. The
+    profile's own selector is always appended as the fallback.
+    """
+    profile = profiles[profile_name]
+    fallback = profile_selector(profile)
+
+    chosen = history.get_format_choice(video_id, profile_name)
+    if chosen is None:
+        if info and info.get("formats"):
+            formats = slim_formats(info["formats"])
+            history.save_formats(video_id, formats)
+        else:
+            formats = history.get_formats(video_id)
+        chosen = choose_format(formats, profile) if formats else None
+
+    return f"{chosen}/{fallback}" if chosen else fallback
@@ -0,0 +1,532 @@
+import os
+import json
+import uuid
+import socket
+import sqlite3
+import threading
+import time
+
+# How long a writer waits for another process holding the database lock
+BUSY_TIMEOUT_SECONDS = 30
+
+# SQLite caps the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+# A lease on an item lapses this long after its holder last renewed it, so
+# items a crashed run held on another machine are picked up again
+LEASE_TTL_SECONDS = 120
+LEASE_RENEW_SECONDS = 30
+
+HOSTNAME = socket.gethostname()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    video_id TEXT PRIMARY KEY,
+    format TEXT,
+    size INTEGER,
+    path TEXT,
+    downloaded_at REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    video_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    url TEXT PRIMARY KEY,
+    newest_id TEXT,
+    newest_date TEXT,
+    item_count INTEGER,
+    entries TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS format_lists (
+    video_id TEXT PRIMARY KEY,
+    formats TEXT NOT NULL,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS format_choices (
+    video_id TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    format_id TEXT NOT NULL,
+    chosen_at REAL,
+    PRIMARY KEY (video_id, profile)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    video_id TEXT PRIMARY KEY,
+    stem TEXT NOT NULL,
+    stem_key TEXT NOT NULL UNIQUE,
+    title TEXT,
+    reserved_at REAL
+);
+CREATE TABLE IF NOT EXISTS scans (
+    path TEXT PRIMARY KEY,
+    inode INTEGER,
+    mtime_ns INTEGER,
+    size INTEGER,
+    duration REAL,
+    sha256 TEXT,
+    problem TEXT,
+    checked_at REAL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    video_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    host TEXT,
+    pid INTEGER,
+    expires_at REAL NOT NULL
+);
+"""
+
+def _process_alive(pid):
+    """Whether a process of this machine is still running; assumed so where that cannot be checked"""
+    if os.name == "nt":
+        # os.kill() would terminate it
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+class HistoryStore:
+    """Download history kept in an SQLite database.
+
+    Membership checks hit the primary key index instead of re-reading a text
+    file, inserts are transactional, and several processes can share the same
+    database safely. A legacy one-ID-per-line history file is imported
+    automatically whenever it changes.
+
+    Each store is also a lease owner: an item it claims is not claimed by
+    other processes (or other runs of this one) until it is released, and
+    its leases are renewed in the background while it holds them.
+    """
+
+    def __init__(self, db_path, legacy_path=None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self.owner = f"{HOSTNAME}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._held = set()
+        self._renewer = None
+
+        if legacy_path:
+            self.import_legacy(legacy_path)
+
+    def __contains__(self, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM downloads WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def ids(self):
+        """Return every recorded video ID as a set"""
+        with self._lock:
+            return set(row[0] for row in self._conn.execute("SELECT video_id FROM downloads"))
+
+    def filter_new(self, video_ids):
+        """Return the given IDs that are not in the history, keeping their order"""
+        video_ids = list(video_ids)
+        known = set()
+        with self._lock:
+            for start in range(0, len(video_ids), _QUERY_CHUNK):
+                chunk = video_ids[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                known.update(row[0] for row in self._conn.execute(
+                    f"SELECT video_id FROM downloads WHERE video_id IN ({placeholders})", chunk
+                ))
+        return [vid for vid in video_ids if vid not in known]
+
+    def records(self):
+        """Return (video_id, format, path) of every download whose path is known"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT video_id, format, path FROM downloads WHERE format IS NOT NULL AND path IS NOT NULL"
+            ).fetchall()
+
+    def get(self, video_id):
+        """Return the stored metadata for a video ID, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT video_id, format, size, path, downloaded_at FROM downloads WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("video_id", "format", "size", "path", "downloaded_at"), row))
+
+    def add(self, video_id, format=None, size=None, path=None):
+        """Record a single downloaded video"""
+        self.add_many([(video_id, format, size, path)])
+
+    def add_many(self, records):
+        """Record several (video_id, format, size, path) tuples in one transaction"""
+        now = time.time()
+        rows = [(video_id, format, size, path, now) for video_id, format, size, path in records]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO downloads (video_id, format, size, path, downloaded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def mark_pending(self, video_ids):
+        """Record IDs as pending, leaving items that already have a state alone"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (video_id, state, updated_at) VALUES (?, 'pending', ?)",
+                [(video_id, now) for video_id in video_ids]
+            )
+
+    def set_state(self, video_id, state, error=None, new_attempt=False):
+        """Move an item to a new download state, optionally counting a new attempt"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO items (video_id, state, attempts, error, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(video_id) DO UPDATE SET state = excluded.state, error = excluded.error, "
+                "attempts = attempts + ?, updated_at = excluded.updated_at",
+                (video_id, state, int(new_attempt), error, time.time(), int(new_attempt))
+            )
+
+    def get_state(self, video_id):
+        """Return the download state of an item as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT video_id, state, attempts, error, updated_at FROM items WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("video_id", "state", "attempts", "error", "updated_at"), row))
+
+    def commit(self, video_id, format=None, size=None, path=None):
+        """Record a verified download and mark its item committed in one transaction"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads (video_id, format, size, path, downloaded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (video_id, format, size, path, now)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO items (video_id, state, attempts, error, updated_at) "
+                "VALUES (?, 'committed', COALESCE((SELECT attempts FROM items WHERE video_id = ?), 0), NULL, ?)",
+                (video_id, video_id, now)
+            )
+
+    def get_source(self, url):
+        """Return the last synced listing of a playlist or channel as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, newest_id, newest_date, item_count, entries, synced_at FROM sources WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        source = dict(zip(("url", "newest_id", "newest_date", "item_count", "entries", "synced_at"), row))
+        source["entries"] = json.loads(source["entries"] or "[]")
+        return source
+
+    def save_source(self, url, entries, item_count=None):
+        """Store the listing of a source; the first entry is its high-water mark"""
+        newest = entries[0] if entries else {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (url, newest_id, newest_date, item_count, entries, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, newest.get("id"), newest.get("upload_date"), item_count,
+                 json.dumps(entries), time.time())
+            )
+
+    def get_formats(self, video_id, max_age=None):
+        """Return the cached format list of a video, or None if missing or older than max_age seconds"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT formats, fetched_at FROM format_lists WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return json.loads(row[0])
+
+    def save_formats(self, video_id, formats):
+        """Cache the format list of a video"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO format_lists (video_id, formats, fetched_at) VALUES (?, ?, ?)",
+                (video_id, json.dumps(formats), time.time())
+            )
+
+    def get_format_choice(self, video_id, profile):
+        """Return the format IDs recorded for a video and profile, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT format_id FROM format_choices WHERE video_id = ? AND profile = ?", (video_id, profile)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_format_choice(self, video_id, profile, format_id):
+        """Record the format IDs a video was downloaded in under a profile"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO format_choices (video_id, profile, format_id, chosen_at) VALUES (?, ?, ?, ?)",
+                (video_id, profile, format_id, time.time())
+            )
+
+    def get_setting(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (f"setting:{key}",)).fetchone()
+        return row[0] if row else default
+
+    def set_setting(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f"setting:{key}", value))
+
+    def reserve_file(self, video_id, stem, title=None):
+        """Reserve an output path (relative, without extension) for a video; returns the one it got.
+
+        A video that reserved a path before keeps it. Paths are unique per
+        folder, compared case-insensitively, so a path another video already
+        has is found through the index and "<stem> [<video id>]" is used instead.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT stem FROM files WHERE video_id = ?", (video_id,)).fetchone()
+            if row is not None:
+                return row[0]
+            for candidate in (stem, f"{stem} [{video_id}]"):
+                try:
+                    self._conn.execute(
+                        "INSERT INTO files (video_id, stem, stem_key, title, reserved_at) VALUES (?, ?, ?, ?, ?)",
+                        (video_id, candidate, candidate.casefold(), title, time.time())
+                    )
+                    return candidate
+                except sqlite3.IntegrityError:
+                    continue
+        raise ValueError(f"Output path {stem!r} is taken for {video_id}")
+
+    def get_file(self, video_id):
+        """Return the reserved output path, title and finished file of a video as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT f.video_id, f.stem, f.title, d.path FROM files f "
+                "LEFT JOIN downloads d ON d.video_id = f.video_id WHERE f.video_id = ?",
+                (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("video_id", "stem", "title", "path"), row))
+
+    def index_files(self, folder):
+        """Reserve the paths of downloads recorded before the file index existed.
+
+        Files inside folder are added once, so new downloads never take the
+        name of an existing file.
+        """
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'files_indexed'").fetchone():
+                return 0
+            rows = self._conn.execute("SELECT video_id, path FROM downloads WHERE path IS NOT NULL").fetchall()
+
+        folder = os.path.abspath(folder)
+        reserved = []
+        for video_id, path in rows:
+            relative = os.path.relpath(os.path.abspath(path), folder)
+            if relative.startswith(os.pardir):
+                continue
+            stem = os.path.splitext(relative)[0].replace(os.sep, "/")
+            reserved.append((video_id, stem, stem.casefold(), time.time()))
+
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO files (video_id, stem, stem_key, reserved_at) VALUES (?, ?, ?, ?)", reserved
+            )
+            indexed = self._conn.total_changes - before
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('files_indexed', ?)", (str(indexed),))
+        return indexed
+
+    def missing_files(self, video_ids=None):
+        """Return (video_id, path) of every recorded download whose file is gone, or of those among video_ids.
+
+        Only the recorded paths are looked up, so no folder is walked.
+        """
+        with self._lock:
+            if video_ids is None:
+                rows = self._conn.execute("SELECT video_id, path FROM downloads WHERE path IS NOT NULL").fetchall()
+            else:
+                video_ids = list(video_ids)
+                rows = []
+                for start in range(0, len(video_ids), _QUERY_CHUNK):
+                    chunk = video_ids[start:start + _QUERY_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows += self._conn.execute(
+                        f"SELECT video_id, path FROM downloads WHERE path IS NOT NULL AND video_id IN ({placeholders})",
+                        chunk
+                    ).fetchall()
+        return [(video_id, path) for video_id, path in rows if not os.path.exists(path)]
+
+    def recorded_files(self):
+        """Return (video_id, size, path) of every recorded download whose path is known"""
+        with self._lock:
+            return self._conn.execute("SELECT video_id, size, path FROM downloads WHERE path IS NOT NULL").fetchall()
+
+    def requeue(self, video_ids):
+        """Forget the downloads of these IDs and mark them pending, so the next run downloads them again.
+
+        Their reserved output paths are kept, so the new files take the old names.
+        """
+        now = time.time()
+        video_ids = list(video_ids)
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM downloads WHERE video_id = ?", [(vid,) for vid in video_ids])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO items (video_id, state, attempts, error, updated_at) "
+                "VALUES (?, 'pending', 0, NULL, ?)",
+                [(vid, now) for vid in video_ids]
+            )
+
+    def get_scans(self):
+        """Return the cached file checks as path -> dict of inode, mtime_ns, size, duration, sha256, problem"""
+        fields = ("inode", "mtime_ns", "size", "duration", "sha256", "problem")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, inode, mtime_ns, size, duration, sha256, problem FROM scans"
+            ).fetchall()
+        return {row[0]: dict(zip(fields, row[1:])) for row in rows}
+
+    def save_scans(self, scans):
+        """Cache the checks of files; scans maps path -> dict as returned by get_scans()"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scans (path, inode, mtime_ns, size, duration, sha256, problem, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(path, scan["inode"], scan["mtime_ns"], scan["size"], scan.get("duration"), scan.get("sha256"),
+                  scan.get("problem"), now) for path, scan in scans.items()]
+            )
+
+    def _live_lease(self, video_id, now):
+        """Return (owner, host, pid) of the lease on an item, or None if there is none or it is stale"""
+        # Called with _lock held
+        row = self._conn.execute(
+            "SELECT owner, host, pid, expires_at FROM leases WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        if row is None or row[3] < now:
+            return None
+        owner, host, pid, _ = row
+        # A holder on this machine that is gone crashed without releasing it
+        if host == HOSTNAME and pid != os.getpid() and not _process_alive(pid):
+            return None
+        return owner, host, pid
+
+    def claim(self, video_id):
+        """Take the lease on an item; returns False if another holder has a live lease on it.
+
+        A lease is stale once it expired or its process on this machine
+        has died, and is then taken over.
+        """
+        now = time.time()
+        with self._lock:
+            if video_id in self._held:
+                return False
+            with self._conn:
+                # Taken and checked in one write transaction, so two processes never both get it
+                self._conn.execute("BEGIN IMMEDIATE")
+                if self._live_lease(video_id, now) is not None:
+                    return False
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO leases (video_id, owner, host, pid, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (video_id, self.owner, HOSTNAME, os.getpid(), now + LEASE_TTL_SECONDS)
+                )
+            self._held.add(video_id)
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew_leases, daemon=True)
+                self._renewer.start()
+        return True
+
+    def release(self, video_id):
+        """Give up the lease on an item if this store holds it"""
+        with self._lock:
+            if video_id not in self._held:
+                return
+            self._held.discard(video_id)
+            with self._conn:
+                self._conn.execute("DELETE FROM leases WHERE video_id = ? AND owner = ?", (video_id, self.owner))
+
+    def lease_holder(self, video_id):
+        """Return the host and pid holding a live lease on an item as a dict, or None"""
+        with self._lock:
+            lease = self._live_lease(video_id, time.time())
+        if lease is None:
+            return None
+        return {"host": lease[1], "pid": lease[2]}
+
+    def is_leased(self, video_id):
+        """Whether anyone, this store included, holds a live lease on an item"""
+        return self.lease_holder(video_id) is not None
+
+    def _renew_leases(self):
+        """Extend the leases this store holds until it is closed"""
+        while True:
+            time.sleep(LEASE_RENEW_SECONDS)
+            with self._lock:
+                held = list(self._held)
+                try:
+                    with self._conn:
+                        self._conn.executemany(
+                            "UPDATE leases SET expires_at = ? WHERE video_id = ? AND owner = ?",
+                            [(time.time() + LEASE_TTL_SECONDS, vid, self.owner) for vid in held]
+                        )
+                except sqlite3.ProgrammingError:
+                    # The store was closed
+                    return
+
+    def import_legacy(self, legacy_path):
+        """Import IDs from a plain-text history file if it changed since the last import"""
+        if not os.path.exists(legacy_path):
+            return 0
+
+        stat = os.stat(legacy_path)
+        key = f"legacy:{os.path.abspath(legacy_path)}"
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[0] == stamp:
+            return 0
+
+        with open(legacy_path, 'r') as f:
+            video_ids = [line.strip() for line in f if line.strip()]
+
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO downloads (video_id, downloaded_at) VALUES (?, ?)",
+                [(vid, stat.st_mtime) for vid in video_ids]
+            )
+            imported = self._conn.total_changes - before
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, stamp))
+        return imported
+
+    def close(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+            self._held.clear()
+            self._conn.close()
@@ -0,0 +1,92 @@
+import os
+import re
+
+# How finished files are arranged in an output folder:
+#   flat     every file directly in the folder (the original layout)
+#   channel  one subfolder per channel
+#   date     year/month subfolders by upload date
+#   id       subfolders named after the first two characters of the video ID
+LAYOUTS = ("flat", "channel", "date", "id")
+DEFAULT_LAYOUT = "flat"
+
+# Longest file or folder name taken from a title or channel name
+MAX_NAME_LENGTH = 150
+
+# Characters that are not allowed in file names on at least one platform
+_UNSAFE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+# Names Windows reserves for devices
+_RESERVED = {"CON", "PRN", "AUX", "NUL"} | {f"{name}{i}" for name in ("COM", "LPT") for i in range(1, 10)}
+
+def safe_name(text, fallback):
+    """Turn a title or channel name into a file name valid on Windows, macOS and Linux"""
+    name = " ".join(_UNSAFE.sub("_", text or "").split())[:MAX_NAME_LENGTH].rstrip(" .")
+    if not name:
+        return fallback
+    if name.split(".")[0].upper() in _RESERVED:
+        name = "_" + name
+    return name
+
+def subfolder(layout, video_id, info=None):
+    """Return the subfolder a video's file goes in under a layout ("" for none), with "/" separators"""
+    info = info or {}
+    if layout == "channel":
+        return safe_name(info.get("channel") or info.get("uploader"), "Unknown channel")
+    if layout == "date":
+        date = info.get("upload_date") or ""
+        return f"{date[:4]}/{date[4:6]}" if re.fullmatch(r"\d{8}", date) else "Undated"
+    if layout == "id":
+        # Lower case, so the shards are the same on case-insensitive file systems
+        return safe_name(video_id[:2].lower(), "_")
+    return ""
+
+def output_stem(layout, video_id, info=None):
+    """Planned path of a video's file relative to the output folder, without its extension"""
+    name = safe_name((info or {}).get("title"), video_id)
+    folder = subfolder(layout, video_id, info)
+    return f"{folder}/{name}" if folder else name
+
+def stem_path(folder, stem, ext=None):
+    """Full path of a stem inside an output folder, with an optional extension"""
+    path = os.path.join(folder, *stem.split("/"))
+    return f"{path}.{ext}" if ext else path
+
+def output_template(folder, stem):
+    """yt-dlp --output template that writes a download to a stem in folder"""
+    return stem_path(folder, stem).replace("%", "%%") + ".%(ext)s"
+
+def get_layout(history):
+    """The layout an output folder uses; kept in its history database"""
+    return history.get_setting("layout") or DEFAULT_LAYOUT
+
+def set_layout(history, layout):
+    """Switch an output folder to a layout for this and later runs; existing files stay where they are"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    history.set_setting("layout", layout)
+
+def needs_info(history, video_id, info=None):
+    """Whether the path of a video that has none reserved yet depends on metadata that info lacks.
+
+    Flat playlist listings have no upload dates, and some no channel
+    names, so under the date and channel layouts such a video is
+    resolved before its path is reserved instead of being filed under
+    "Undated" or "Unknown channel" for good.
+    """
+    layout = get_layout(history)
+    if layout not in ("date", "channel") or history.get_file(video_id) is not None:
+        return False
+    info = info or {}
+    if layout == "date":
+        return not re.fullmatch(r"\d{8}", info.get("upload_date") or "")
+    return not (info.get("channel") or info.get("uploader"))
+
+def reserve_output(history, video_id, info=None):
+    """Reserve the output path of a video under its folder's layout; returns the stem it got.
+
+    A video keeps the path it reserved before, so retries and resumed
+    downloads write to the same file. A title another video already has
+    gets the video ID appended instead of overwriting that file.
+    """
+    stem = output_stem(get_layout(history), video_id, info)
+    return history.reserve_file(video_id, stem, (info or {}).get("title"))
@@ -0,0 +1,60 @@
+import time
+
+from . import progress
+from .scheduler import is_cancelled, log
+
+# How often a run waiting for an item another run holds checks whether it was released
+WAIT_POLL_SECONDS = 2
+
+# Returned for an item another run is working on; the caller comes back to it after the others
+CLAIMED = "claimed"
+
+def claim_item(history, video_id):
+    """Claim an item for this run before working on it.
+
+    Returns None once this run holds the item's lease, CLAIMED while
+    another run holds it, or the recorded result if another run has
+    downloaded it since this one listed its source; the history a run
+    filtered its items with does not show what other processes added later.
+    """
+    if not history.claim(video_id):
+        holder = history.lease_holder(video_id)
+        where = f" (process {holder['pid']} on {holder['host']})" if holder else ""
+        log(video_id, f"{video_id} is being downloaded by another run{where}, coming back to it later")
+        return CLAIMED
+    record = history.get(video_id)
+    if record is None:
+        return None
+    history.release(video_id)
+    log(video_id, f"{video_id} was downloaded by another run")
+    progress.emit(video_id, "done")
+    return {"filepath": record["path"]}
+
+def wait_released(history, video_id):
+    """Wait until no run holds an item's lease; returns False if this run was cancelled meanwhile"""
+    while history.is_leased(video_id):
+        if is_cancelled():
+            return False
+        time.sleep(WAIT_POLL_SECONDS)
+    return True
+
+def run_claimed(history, video_ids, run):
+    """Run items, then the ones other runs held once they let go of them.
+
+    run(video_ids) returns the results of those items in order, CLAIMED
+    for an item another run was working on. Those are run again as their
+    leases are released, which finds them in the history, or downloads
+    them if the other run failed or crashed. Returns the results in the
+    order of video_ids; items still held when this run is cancelled get None.
+    """
+    results = dict(zip(video_ids, run(video_ids)))
+    while True:
+        claimed = [video_id for video_id, result in results.items() if result == CLAIMED]
+        if not claimed:
+            break
+        if not wait_released(history, claimed[0]):
+            results.update((video_id, None) for video_id in claimed)
+            break
+        released = [video_id for video_id in claimed if not history.is_leased(video_id)]
+        results.update(zip(released, run(released)))
+    return [results[video_id] for video_id in video_ids]
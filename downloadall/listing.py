@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from .scheduler import log, run_captured
+
+def video_url(video_id):
+    """Return the watch URL for a YouTube video ID"""
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def iter_entries(info):
+    """Yield the video entries of a yt-dlp info dict, flattening nested playlists"""
+    if not info:
+        return
+    if "entries" in info:
+        for entry in info["entries"] or []:
+            yield from iter_entries(entry)
+    else:
+        yield info
+
+def entries_by_id(info):
+    """Map each video ID in a yt-dlp info dict to its entry, in playlist order"""
+    entries = {}
+    for entry in iter_entries(info):
+        video_id = entry.get("id")
+        if video_id and video_id not in entries:
+            entries[video_id] = entry
+    return entries
+
+def info_command(yt_dlp_path, url, full=False, items=None):
+    """Build the yt-dlp command that prints the metadata of a URL as JSON"""
+    command = [yt_dlp_path, "-J"]
+    if not full:
+        command.append("--flat-playlist")
+    if items:
+        command += ["--playlist-items", items]
+    command.append(url)
+    return command
+
+def parse_info(returncode, stdout, stderr):
+    """Turn the output of an info_command() run into the info dict, or None on failure"""
+    if returncode != 0 and not stdout.strip():
+        message = stderr.strip().splitlines()
+        log("list", f"Error fetching video list: {message[-1] if message else returncode}")
+        return None
+
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        log("list", "Error fetching video list: yt-dlp returned invalid JSON")
+        return None
+
+def fetch_info(yt_dlp_path, url, full=False, items=None):
+    """Fetch the metadata of a playlist (or single video) with one yt-dlp call.
+
+    items, if given, is a --playlist-items range such as "1:10" so only part
+    of a long playlist is listed. Returns the info dict, or None on failure.
+    """
+    return parse_info(*run_captured(info_command(yt_dlp_path, url, full, items), "list"))
+
+def entry_url(video_id, info=None):
+    """Return the URL to resolve a playlist entry from"""
+    url = info.get("url") if info and info.get("_type") == "url" else None
+    return url or video_url(video_id)
+
+@contextmanager
+def video_source(video_id, info=None):
+    """Yield the yt-dlp arguments that select a video for download.
+
+    Fully extracted metadata is handed over with --load-info-json so yt-dlp
+    skips the extractor; otherwise the entry's URL (or the watch URL) is used.
+    """
+    if not info or "formats" not in info:
+        yield [entry_url(video_id, info)]
+        return
+
+    fd, info_file = tempfile.mkstemp(prefix=f"{video_id}-", suffix=".info.json")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        yield ["--load-info-json", info_file]
+    finally:
+        os.remove(info_file)
@@ -0,0 +1,153 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from .history import BUSY_TIMEOUT_SECONDS
+from .layout import stem_path
+from .postprocess import MP3_OPTIONS, audio_encoding, run_ffmpeg
+from .scheduler import log
+from .transfer import VERIFIED, verify_download
+
+# Index of every finished file, shared by the video and audio downloaders
+DEFAULT_STORE_DB = os.path.join(os.path.expanduser("~"), ".youtube_downloader", "media_store.db")
+
+# Formats that can be made locally from another stored format: target -> (source, ffmpeg codec options)
+DERIVATIONS = {
+    "mp3": ("mp4", MP3_OPTIONS),
+    "m4a": ("mp4", ["-c:a", "copy"]),
+}
+# Derived formats that carry a cover image when downloaded; they are only derived with one
+COVER_FORMATS = {"mp3"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    video_id TEXT NOT NULL,
+    format TEXT NOT NULL,
+    path TEXT NOT NULL,
+    added_at REAL,
+    PRIMARY KEY (video_id, format)
+);
+"""
+
+class MediaStore:
+    """Index of downloaded files keyed by video ID and format.
+
+    Both downloaders record their finished files here and look an item up
+    before going to the network, so a file that already exists somewhere is
+    hard-linked instead of downloaded again, and audio can be extracted from
+    a stored video.
+    """
+
+    def __init__(self, db_path=DEFAULT_STORE_DB):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def add(self, video_id, format, path):
+        """Record a finished file"""
+        self.add_many([(video_id, format, path)], replace=True)
+
+    def add_many(self, records, replace=False):
+        """Record several (video_id, format, path) tuples; existing entries are kept unless replace is set"""
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"{verb} INTO media (video_id, format, path, added_at) VALUES (?, ?, ?, ?)",
+                [(video_id, format, os.path.abspath(path), now) for video_id, format, path in records]
+            )
+
+    def find(self, video_id, format):
+        """Return the path of a stored file, or None if there is none (or it was deleted)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM media WHERE video_id = ? AND format = ?", (video_id, format)
+            ).fetchone()
+        if row is None:
+            return None
+        if not os.path.exists(row[0]):
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM media WHERE video_id = ? AND format = ?", (video_id, format))
+            return None
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def link_file(source, target):
+    """Hard-link source to target, copying instead where links are not possible"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def derive_file(source, target, codec_options, cover=None):
+    """Extract the audio of a stored file with ffmpeg, embedding the cover image if given; returns True on success"""
+    inputs, options = audio_encoding(source, cover, codec_options)
+    return run_ffmpeg(inputs, options, target) is None
+
+def derivation_source(store, video_id, format):
+    """Return the stored file a format of an item can be derived from, or None"""
+    source_format = DERIVATIONS.get(format, (None, None))[0]
+    return store.find(video_id, source_format) if source_format else None
+
+def _place(store, video_id, format, output_folder, stem=None, cover=None):
+    """Put a stored copy of an item into the output folder, at stem if given; returns its path or None"""
+    path = store.find(video_id, format)
+    if path is not None:
+        if stem:
+            target = stem_path(output_folder, stem, format)
+        else:
+            target = os.path.join(output_folder, os.path.basename(path))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            return target if os.path.samefile(path, target) else None
+        link_file(path, target)
+        log(video_id, f"Linked {format} from {path}")
+        return target
+
+    source = derivation_source(store, video_id, format)
+    if source is None or (format in COVER_FORMATS and cover is None):
+        return None
+
+    if stem:
+        target = stem_path(output_folder, stem, format)
+    else:
+        target = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(source))[0]}.{format}")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        return None
+    log(video_id, f"Extracting {format} from {source}")
+    return target if derive_file(source, target, DERIVATIONS[format][1], cover) else None
+
+def reuse_stored(store, history, video_id, format, output_folder, stem=None, duration=None, cover=None):
+    """Commit an item from a copy already in the store instead of downloading it.
+
+    The copy is placed at the item's reserved output stem, if given, and
+    checked against the item's known duration like a download would be.
+    A copy derived from another format gets the cover image, if given;
+    formats in COVER_FORMATS are not derived without one.
+    Returns the result dict of the committed file, or None if the item has
+    to be downloaded.
+    """
+    path = _place(store, video_id, format, output_folder, stem, cover)
+    if path is None:
+        return None
+
+    result = {"filepath": path, "duration": duration}
+    problem = verify_download(result)
+    if problem is not None:
+        log(video_id, f"Stored copy not usable ({problem}), downloading instead")
+        os.remove(path)
+        return None
+
+    history.set_state(video_id, VERIFIED)
+    history.commit(video_id, format=format, size=os.path.getsize(path), path=path)
+    return result
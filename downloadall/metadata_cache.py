@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
+
+from . import metrics
+from .config import lazy
+from .history import BUSY_TIMEOUT_SECONDS
+from .listing import entry_url
+
+# Extracted metadata of every video resolved on this machine, shared by both downloaders and the GUI
+DEFAULT_CACHE_DB = os.path.join(os.path.expanduser("~"), ".youtube_downloader", "metadata.db")
+
+# Titles, durations and thumbnails rarely change; stream URLs stop working after a few hours
+STATIC_TTL_SECONDS = 7 * 24 * 3600
+STREAM_TTL_SECONDS = 3600
+
+# Stream URLs that carry their own expiry (expire=<unix time>) are dropped this long before it,
+# so a download started from the cache has time to finish
+STREAM_EXPIRY_MARGIN_SECONDS = 1800
+
+# Compressed size the cache may grow to before the least recently used entries are evicted
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Entries kept decoded in memory for repeated lookups in the same process
+MEMORY_ENTRIES = 64
+
+# Fields that stay valid long after the stream URLs expire
+STATIC_FIELDS = ("id", "title", "duration", "thumbnail", "channel", "channel_id", "uploader",
+                 "upload_date", "webpage_url", "extractor_key")
+
+# Fields yt-dlp derives for the chosen format or output file; not part of the video's metadata
+_DERIVED_FIELDS = ("formats_table", "thumbnails_table", "subtitles_table", "automatic_captions_table",
+                   "requested_downloads", "requested_formats", "_filename", "filename", "filepath", "urls",
+                   "epoch", "autonumber", "video_autonumber", "playlist", "playlist_index", "__files_to_move")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    video_id TEXT PRIMARY KEY,
+    static TEXT NOT NULL,
+    info BLOB,
+    fetched_at REAL NOT NULL,
+    streams_expire_at REAL,
+    used_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metadata_used_at ON metadata (used_at);
+"""
+
+def clean_info(info):
+    """Copy of an info dict without the fields yt-dlp derives for one download"""
+    return {key: value for key, value in info.items() if key not in _DERIVED_FIELDS}
+
+def streams_expire_at(info, now):
+    """When the stream URLs of an info dict should no longer be used"""
+    expires = now + STREAM_TTL_SECONDS
+    for f in info.get("formats") or []:
+        expire = parse_qs(urlparse(f.get("url") or "").query).get("expire")
+        if expire and expire[0].isdigit():
+            expires = min(expires, int(expire[0]) - STREAM_EXPIRY_MARGIN_SECONDS)
+    return expires
+
+class MetadataCache:
+    """On-disk cache of extractor results keyed by video ID.
+
+    Each entry keeps the static fields (title, duration, thumbnail, ...)
+    for STATIC_TTL_SECONDS and the full info with its formats until its
+    stream URLs expire. A download that finds fresh formats hands them to
+    yt-dlp instead of resolving the video page again. The least recently
+    used entries are evicted once the compressed entries exceed max_bytes,
+    and recent lookups are answered from memory.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_DB, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()    # video ID -> (static, info, fetched_at, streams_expire_at)
+        self._touched = {}              # video ID -> time of memory hits not yet written to disk
+        self._conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM metadata").fetchone()[0]
+
+    def _remember(self, video_id, entry):
+        # Called with _lock held
+        self._memory[video_id] = entry
+        self._memory.move_to_end(video_id)
+        while len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def _load(self, video_id):
+        """The entry of a video from memory or disk, or None; marks it as recently used"""
+        with self._lock:
+            entry = self._memory.get(video_id)
+            if entry is not None:
+                self._memory.move_to_end(video_id)
+                self._touched[video_id] = time.time()
+                return entry
+            row = self._conn.execute(
+                "SELECT static, info, fetched_at, streams_expire_at FROM metadata WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE metadata SET used_at = ? WHERE video_id = ?", (time.time(), video_id))
+            static, info, fetched_at, expires = row
+            entry = (json.loads(static), json.loads(zlib.decompress(info)) if info else None, fetched_at, expires)
+            self._remember(video_id, entry)
+            return entry
+
+    def get(self, video_id):
+        """Return the full info of a video while its stream URLs are fresh, or None"""
+        entry = self._load(video_id)
+        if entry is None or entry[1] is None or time.time() >= entry[3]:
+            return None
+        return entry[1]
+
+    def get_static(self, video_id):
+        """Return the static fields of a video while they are fresh, or None"""
+        entry = self._load(video_id)
+        if entry is None or time.time() - entry[2] >= STATIC_TTL_SECONDS:
+            return None
+        return entry[0]
+
+    def put(self, video_id, info):
+        """Cache an extracted info dict; one with formats can be downloaded from until its streams expire"""
+        now = time.time()
+        info = clean_info(info)
+        static = {key: info[key] for key in STATIC_FIELDS if info.get(key) is not None}
+        full = info if info.get("formats") else None
+        expires = streams_expire_at(info, now) if full else None
+        static_text = json.dumps(static)
+        blob = zlib.compress(json.dumps(full).encode("utf-8")) if full else None
+        size = len(static_text) + (len(blob) if blob else 0)
+
+        with self._lock:
+            with self._conn:
+                old = self._conn.execute("SELECT size FROM metadata WHERE video_id = ?", (video_id,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO metadata (video_id, static, info, fetched_at, streams_expire_at, "
+                    "used_at, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (video_id, static_text, blob, now, expires, now, size)
+                )
+            self._size += size - (old[0] if old else 0)
+            self._remember(video_id, (static, full, now, expires))
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def drop_streams(self, video_id):
+        """Forget the formats of a video, keeping its static fields; for stream URLs that stopped working"""
+        with self._lock:
+            entry = self._memory.pop(video_id, None)
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE metadata SET info = NULL, streams_expire_at = NULL, size = LENGTH(static) "
+                    "WHERE video_id = ?", (video_id,)
+                )
+            if entry is not None:
+                self._remember(video_id, (entry[0], None, entry[2], None))
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is back to 90% of max_bytes"""
+        # Called with _lock held; other processes may have grown the cache too
+        with self._conn:
+            self._conn.executemany("UPDATE metadata SET used_at = ? WHERE video_id = ?",
+                                   [(used_at, video_id) for video_id, used_at in self._touched.items()])
+        self._touched.clear()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM metadata").fetchone()[0]
+        target = self.max_bytes * 0.9
+        evicted = []
+        for video_id, size in self._conn.execute("SELECT video_id, size FROM metadata ORDER BY used_at").fetchall():
+            if self._size <= target:
+                break
+            evicted.append(video_id)
+            self._size -= size
+        with self._conn:
+            self._conn.executemany("DELETE FROM metadata WHERE video_id = ?", [(vid,) for vid in evicted])
+        for video_id in evicted:
+            self._memory.pop(video_id, None)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# Opened on first use, so importing this module touches no files
+get_cache = lazy(MetadataCache)
+
+def cached_info(video_id, info=None):
+    """Return the best known metadata of a video.
+
+    That is the given info if it has formats, else the cached formats
+    while their stream URLs are fresh, else the given info on top of the
+    cached static fields.
+    """
+    if info and "formats" in info:
+        return info
+    cache = get_cache()
+    full = cache.get(video_id)
+    if full is not None:
+        return full
+    static = cache.get_static(video_id)
+    if static is None:
+        return info
+    # The listing's entry, with the URL to resolve, wins over the cached fields
+    return dict(static, **(info or {}))
+
+def remember_info(video_id, info):
+    """Cache the metadata of a video that was just extracted"""
+    if info:
+        get_cache().put(video_id, info)
+
+def stale_info(video_id, info):
+    """Metadata to retry a video with after its cached or listed stream URLs failed.
+
+    The formats are dropped, so the next attempt resolves the video again.
+    """
+    if not info or "formats" not in info:
+        return info
+    get_cache().drop_streams(video_id)
+    static = {key: info[key] for key in STATIC_FIELDS if info.get(key) is not None}
+    url = info.get("webpage_url") or info.get("original_url")
+    return dict(static, _type="url", url=url) if url else static
+
+def resolve_info(engine, video_id, info):
+    """Extract the full metadata of a video ahead of its download and cache it.
+
+    The download then loads it instead of resolving the page again.
+    Returns info unchanged if the extraction fails.
+    """
+    with metrics.timed(video_id, "extract"):
+        resolved = engine.fetch_info(entry_url(video_id, info), full=True)
+    if not resolved:
+        return info
+    remember_info(video_id, resolved)
+    return resolved
@@ -0,0 +1,198 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .scheduler import echo, is_cancelled
+
+# Stages the time of a run is split into:
+#   listing      fetching the playlist or channel listing
+#   wait         rate limit delays and backoff between attempts
+#   extract      resolving a video's page and formats, up to the first downloaded byte
+#   transfer     downloading the media streams
+#   merge        yt-dlp's own post-processing (merging, fixups, thumbnails)
+#   verify       checking the finished file with ffprobe
+#   postprocess  converting audio to MP3 with its cover
+STAGES = ("listing", "wait", "extract", "transfer", "merge", "verify", "postprocess")
+
+# Item outcomes counted by item_finished()
+OUTCOMES = ("done", "failed", "cancelled")
+
+_lock = threading.Lock()
+_stages = {}    # stage -> (count, seconds)
+_outcomes = dict.fromkeys(OUTCOMES, 0)
+_item_seconds = [0, 0.0]
+_bytes = 0
+_retries = 0
+_items = {}     # video ID -> totals of an item that is still running
+_log_file = None
+
+def open_log(path):
+    """Append a JSON line for every stage, retry and finished item to path"""
+    global _log_file
+    with _lock:
+        _log_file = open(path, 'a', encoding='utf-8')
+
+def _write(record):
+    # Called with _lock held, so records from different jobs never interleave
+    if _log_file is not None:
+        record = {"time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"), **record}
+        _log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        _log_file.flush()
+
+def observe(item, stage, seconds):
+    """Record time spent by an item (or a listed URL) in a stage"""
+    with _lock:
+        count, total = _stages.get(stage, (0, 0.0))
+        _stages[stage] = (count + 1, total + seconds)
+        state = _items.get(item)
+        if state is not None:
+            state["stages"][stage] = state["stages"].get(stage, 0.0) + seconds
+        _write({"event": "stage", "item": item, "stage": stage, "seconds": round(seconds, 6)})
+
+@contextmanager
+def timed(item, stage):
+    """Record the time the enclosed code takes as a stage of item"""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(item, stage, time.monotonic() - start)
+
+class StageClock:
+    """Times the consecutive stages of one download attempt.
+
+    switch() ends the running stage and starts the next one; stop() ends
+    the last one.
+    """
+
+    def __init__(self, item, stage):
+        self.item = item
+        self.stage = stage
+        self.started = time.monotonic()
+
+    def switch(self, stage):
+        if stage == self.stage:
+            return
+        now = time.monotonic()
+        if self.stage is not None:
+            observe(self.item, self.stage, now - self.started)
+        self.stage = stage
+        self.started = now
+
+    def stop(self):
+        self.switch(None)
+
+def item_started(item):
+    with _lock:
+        _items[item] = {"started": time.monotonic(), "bytes": 0, "retries": 0, "stages": {}}
+
+def add_bytes(item, size):
+    """Count the size of a downloaded file"""
+    global _bytes
+    with _lock:
+        _bytes += size
+        state = _items.get(item)
+        if state is not None:
+            state["bytes"] += size
+
+def retry(item, attempt, problem):
+    """Count a failed attempt that will be retried"""
+    global _retries
+    with _lock:
+        _retries += 1
+        state = _items.get(item)
+        if state is not None:
+            state["retries"] += 1
+        _write({"event": "retry", "item": item, "attempt": attempt, "error": problem})
+
+def item_finished(item, ok):
+    """Record how an item ended, with its total time, bytes, retries and time per stage"""
+    outcome = "done" if ok else "cancelled" if is_cancelled() else "failed"
+    with _lock:
+        state = _items.pop(item, None)
+        if state is None:
+            return
+        _outcomes[outcome] += 1
+        seconds = time.monotonic() - state["started"]
+        _item_seconds[0] += 1
+        _item_seconds[1] += seconds
+        _write({
+            "event": "item", "item": item, "outcome": outcome, "seconds": round(seconds, 6),
+            "bytes": state["bytes"], "retries": state["retries"],
+            "stages": {stage: round(value, 6) for stage, value in state["stages"].items()},
+        })
+
+def snapshot():
+    """Return the totals so far as a plain dict"""
+    with _lock:
+        return {
+            "stages": {stage: {"count": count, "seconds": total} for stage, (count, total) in _stages.items()},
+            "outcomes": dict(_outcomes),
+            "item_seconds": {"count": _item_seconds[0], "seconds": _item_seconds[1]},
+            "bytes": _bytes,
+            "retries": _retries,
+            "in_progress": len(_items),
+        }
+
+def render():
+    """Return the totals in the Prometheus text exposition format"""
+    totals = snapshot()
+    lines = [
+        "# HELP ytdl_items_total Items finished, by outcome.",
+        "# TYPE ytdl_items_total counter",
+    ]
+    lines += [f'ytdl_items_total{{outcome="{outcome}"}} {count}' for outcome, count in totals["outcomes"].items()]
+    lines += [
+        "# HELP ytdl_items_in_progress Items started but not finished yet.",
+        "# TYPE ytdl_items_in_progress gauge",
+        f"ytdl_items_in_progress {totals['in_progress']}",
+        "# HELP ytdl_downloaded_bytes_total Size of the downloaded media files.",
+        "# TYPE ytdl_downloaded_bytes_total counter",
+        f"ytdl_downloaded_bytes_total {totals['bytes']}",
+        "# HELP ytdl_retries_total Failed download attempts that were retried.",
+        "# TYPE ytdl_retries_total counter",
+        f"ytdl_retries_total {totals['retries']}",
+        "# HELP ytdl_item_seconds Time from starting an item to finishing it.",
+        "# TYPE ytdl_item_seconds summary",
+        f"ytdl_item_seconds_sum {totals['item_seconds']['seconds']:.6f}",
+        f"ytdl_item_seconds_count {totals['item_seconds']['count']}",
+        "# HELP ytdl_stage_seconds Time spent in each stage of the pipeline.",
+        "# TYPE ytdl_stage_seconds summary",
+    ]
+    for stage in STAGES:
+        stage_totals = totals["stages"].get(stage, {"count": 0, "seconds": 0.0})
+        lines.append(f'ytdl_stage_seconds_sum{{stage="{stage}"}} {stage_totals["seconds"]:.6f}')
+        lines.append(f'ytdl_stage_seconds_count{{stage="{stage}"}} {stage_totals["count"]}')
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port, host="127.0.0.1"):
+    """Serve render() at http://host:port/metrics from a background thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+def start(log_path=None, port=None):
+    """Set up the --metrics-log and --metrics-port outputs of a command-line run"""
+    if log_path:
+        open_log(log_path)
+    if port is not None:
+        server = serve(port)
+        echo(f"Metrics served at http://127.0.0.1:{server.server_address[1]}/metrics")
@@ -0,0 +1,277 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from . import progress
+from .api import DownloadJob, JobResult
+from .engine import SubprocessEngine
+from .formats import DEFAULT_PROFILE
+from .layout import set_layout
+from .leases import CLAIMED, WAIT_POLL_SECONDS
+from .pipeline import Finished
+from .postprocess import DEFAULT_WORKERS
+from .ratelimit import DEFAULT_RATE_CONFIG, make_limiter
+from .scheduler import DEFAULT_JOBS, JobControl, controlled, current_control, echo, log
+from .sync import list_source, queue_new
+from .transfer import FAILED
+
+# Seconds a single yt-dlp or ffmpeg process may run before it is stopped (None: no limit)
+DEFAULT_PROCESS_TIMEOUT = None
+
+# Seconds an item may take once it has its download slot, retries and encoding included (None: no limit)
+DEFAULT_ITEM_TIMEOUT = None
+
+# Most helper threads running the blocking work of items at once, over all jobs; started as needed
+HELPER_THREADS = 64
+
+async def in_thread(function, *args):
+    """Run function(*args) on a helper thread under the current JobControl; returns its result.
+
+    If the awaiting task is cancelled (or times out), the control is
+    cancelled, which ends the processes the function started, and the
+    function is waited for before the cancellation goes on, so it has
+    released its leases by then.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(function, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        current_control().cancel()
+        while not future.done():
+            try:
+                await asyncio.wait([future])
+            except asyncio.CancelledError:
+                pass
+        # Whatever the function ended with, the cancellation is what goes on
+        future.exception()
+        raise
+
+def _release_all(history, video_ids):
+    """Release the leases of items that did not finish"""
+    for video_id in video_ids:
+        history.release(video_id)
+
+class AsyncJob(DownloadJob):
+    """A DownloadJob submitted to an Orchestrator.
+
+    It is already running: wait for result() or register
+    add_done_callback() instead of calling run(). cancel() may be called
+    from any thread; the callbacks are called on the orchestrator's thread.
+    """
+
+    def __init__(self, orchestrator, url, download_type="video", on_output=None, on_event=None, **options):
+        super().__init__(url, download_type, on_output, on_event, **options)
+        self.control.timeout = orchestrator.timeout
+        self.orchestrator = orchestrator
+        self.task = None
+        self.future = None
+
+    def run(self):
+        return self.result()
+
+    def cancel(self):
+        """Stop the job: running processes are ended and waiting items skipped"""
+        self.control.cancel()
+        self.orchestrator.loop.call_soon_threadsafe(self._cancel_task)
+
+    def _cancel_task(self):
+        # A job that has not started yet sees the cancelled flag when it does
+        if self.task is not None:
+            self.task.cancel()
+
+    def result(self, timeout=None):
+        """Wait for the job; returns its api.JobResult"""
+        return self.future.result(timeout)
+
+    def add_done_callback(self, callback):
+        """Call callback(job) once the job is over"""
+        self.future.add_done_callback(lambda future: callback(self))
+
+class Orchestrator:
+    """Runs download jobs as asyncio tasks on one event loop thread.
+
+    The loop only schedules: every job and item waiting for its turn is a
+    task on it, and the work of a running item is done by the same code as
+    download_videos() and download_audio() on a helper thread, so queued
+    jobs and items cost no thread of their own. Each job downloads up to
+    its `jobs` items at once; audio encoding is shared across jobs,
+    `encoders` tracks at a time. A process that runs longer than `timeout`
+    seconds is stopped and its attempt counts as failed; an item that is
+    not finished `item_timeout` seconds after it got its download slot is
+    stopped and counts as failed without further attempts.
+    """
+
+    def __init__(self, encoders=DEFAULT_WORKERS, timeout=DEFAULT_PROCESS_TIMEOUT, item_timeout=DEFAULT_ITEM_TIMEOUT):
+        self.timeout = timeout
+        self.item_timeout = item_timeout
+        self.encoders = asyncio.Semaphore(max(1, encoders))
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=HELPER_THREADS,
+                                                          thread_name_prefix="orchestrator-item"))
+        self.thread = threading.Thread(target=self.loop.run_forever, name="orchestrator", daemon=True)
+        self.thread.start()
+
+    def submit(self, url, download_type="video", on_output=None, on_event=None, **options):
+        """Start downloading everything new at a URL; returns an AsyncJob.
+
+        options are those of download_videos() or download_audio(): jobs,
+        single_pass, limit_rate, rate_config, sync, layout and, for videos,
+        profile and probe. Downloads always use the yt-dlp executable.
+        """
+        job = AsyncJob(self, url, download_type, on_output, on_event, **options)
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job), self.loop)
+        return job
+
+    def close(self):
+        """Cancel the remaining jobs and stop the event loop thread"""
+        async def cancel_all():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(cancel_all(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    async def _run(self, job):
+        job.task = asyncio.current_task()
+        if job.control.cancelled.is_set():
+            return JobResult(listed=True, files={}, failed=[], cancelled=True)
+        with controlled(job.control):
+            try:
+                return await self._download(job)
+            except asyncio.CancelledError:
+                # Cancelled while listing, before any item was queued
+                return JobResult(listed=True, files={}, failed=[], cancelled=True)
+
+    async def _download(self, job):
+        options = job.options
+        if job.download_type == "video":
+            from . import video as backend
+        else:
+            from . import audio_only as backend
+
+        echo(f"Checking for {job.download_type} to download...")
+        engine = await in_thread(SubprocessEngine)
+        history = await in_thread(backend.get_history)
+        if options.get("layout"):
+            await in_thread(set_layout, history, options["layout"])
+        jobs = max(1, options.get("jobs", DEFAULT_JOBS))
+        limiter = await in_thread(make_limiter, job.url, options.get("limit_rate"),
+                                  options.get("rate_config", DEFAULT_RATE_CONFIG), jobs)
+        with metrics.timed(job.url, "listing"):
+            entries = await in_thread(list_source, engine, history, job.url, options.get("single_pass", False),
+                                      options.get("sync", False))
+        if entries is None:
+            echo(f"No videos found for {job.url}")
+            return JobResult(listed=False, files={}, failed=[], cancelled=False)
+
+        new_items = await in_thread(queue_new, history, entries)
+        if not new_items:
+            echo(f"No new {job.download_type} to download")
+            return JobResult(listed=True, files={}, failed=[], cancelled=False)
+        echo(f"Found {len(new_items)} new item(s) to download")
+        progress.emit("queue", "queue", items=new_items)
+
+        slots = asyncio.Semaphore(jobs)
+        if job.download_type == "video":
+            profile = options.get("profile", DEFAULT_PROFILE)
+            probe = options.get("probe", False)
+
+            def item(video_id):
+                return self._video(backend, video_id, entries[video_id], engine, limiter, profile, probe, history,
+                                   slots)
+        else:
+            stages = backend.TrackStages(entries, engine, limiter, jobs)
+            prefetches = asyncio.Semaphore(jobs)
+
+            def item(video_id):
+                return self._track(backend, stages, video_id, history, slots, prefetches)
+
+        tasks = [asyncio.create_task(self._item(job, video_id, history, item)) for video_id in new_items]
+        cancelled = False
+        try:
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            # gather() has cancelled the items; let them end their processes
+            cancelled = True
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+
+        files, failed = {}, []
+        for video_id, outcome in zip(new_items, outcomes):
+            if isinstance(outcome, dict):
+                files[video_id] = outcome["filepath"]
+            else:
+                if isinstance(outcome, asyncio.CancelledError):
+                    metrics.item_finished(video_id, False)
+                elif isinstance(outcome, Exception):
+                    log(video_id, f"Download crashed: {outcome}")
+                failed.append(video_id)
+        # Tracks cancelled between the stages of the audio pipeline still hold their leases
+        await in_thread(_release_all, history, failed)
+        return JobResult(listed=True, files=files, failed=failed, cancelled=cancelled)
+
+    async def _item(self, job, video_id, history, run):
+        """Run an item under a JobControl of its own, so it can be stopped without the rest of the job.
+
+        While another run holds the item, it is come back to once the lease
+        is released; see leases.run_claimed().
+        """
+        with controlled(JobControl(job.control.on_line, job.control.on_event, self.timeout)):
+            while True:
+                result = await run(video_id)
+                if result != CLAIMED:
+                    return result
+                while await in_thread(history.is_leased, video_id):
+                    await asyncio.sleep(WAIT_POLL_SECONDS)
+
+    async def _within_deadline(self, work, history, video_id):
+        """Await the work of an item that has its slot, stopping it after item_timeout seconds.
+
+        An item stopped this way has reported its failure on the way out and
+        is recorded as failed; returns the result of work or None.
+        """
+        try:
+            return await asyncio.wait_for(work, self.item_timeout)
+        except asyncio.TimeoutError:
+            problem = f"timed out after {self.item_timeout:.0f}s"
+            log(video_id, f"Giving up on {video_id}: {problem}")
+            await in_thread(history.set_state, video_id, FAILED, problem)
+            return None
+
+    async def _video(self, video, video_id, info, engine, limiter, profile, probe, history, slots):
+        """Download a video with video.download_video() once it has a download slot"""
+        async with slots:
+            return await self._within_deadline(
+                in_thread(video.download_video, video_id, info, engine, limiter, profile, probe), history, video_id
+            )
+
+    async def _track(self, audio_only, stages, video_id, history, slots, prefetches):
+        """Run a track through the stages of audio_only.download_tracks().
+
+        As in that pipeline, at most `jobs` tracks are prefetched ahead of
+        the download slots, and encoding waits for one of the encoders
+        shared by all jobs.
+        """
+        async with prefetches:
+            prefetched = await in_thread(stages.prefetch, video_id)
+            if isinstance(prefetched, Finished):
+                return prefetched.result
+            await slots.acquire()
+        return await self._within_deadline(self._fetch_track(audio_only, stages, video_id, prefetched, slots),
+                                           history, video_id)
+
+    async def _fetch_track(self, audio_only, stages, video_id, prefetched, slots):
+        try:
+            download = await in_thread(stages.fetch, video_id, prefetched)
+        finally:
+            slots.release()
+        if isinstance(download, Finished):
+            return download.result
+
+        # The download slot is free again while the track waits for an encoder
+        async with self.encoders:
+            return await in_thread(audio_only.finish_track, video_id, download)
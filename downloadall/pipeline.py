@@ -0,0 +1,82 @@
+import queue
+import threading
+import contextvars
+
+from .scheduler import is_cancelled
+
+# Items that may wait in a stage's queue per worker of that stage. A full
+# queue blocks the stage before it, so no stage runs far ahead of the next
+QUEUE_SIZE_PER_WORKER = 1
+
+class Finished:
+    """Returned by a stage to end an item early with result, skipping the stages after it"""
+
+    def __init__(self, result):
+        self.result = result
+
+def run_pipeline(items, stages):
+    """Pass every item through a series of stages, each with its own worker threads.
+
+    stages is a list of (function, workers). The first stage is called as
+    function(item), every later one as function(item, value) with what
+    the stage before returned, and the last stage's return value is the
+    item's result. A stage can return Finished(result) to end an item
+    early. Each stage takes its items from a bounded queue, so while one
+    item is in one stage the next ones are already in the stages before
+    it, but a slow stage holds the others back instead of piling up work.
+
+    Once the run is cancelled, items still waiting end with None. Results
+    are returned in the same order as the items; an exception raised in a
+    stage is raised again once every item has left the pipeline.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    queues = [queue.Queue(maxsize=max(1, workers) * QUEUE_SIZE_PER_WORKER) for _, workers in stages]
+
+    def work(index):
+        function = stages[index][0]
+        while True:
+            task = queues[index].get()
+            if task is None:
+                return
+            position, value = task
+            try:
+                if is_cancelled():
+                    value = Finished(None)
+                else:
+                    value = function(items[position]) if index == 0 else function(items[position], value)
+            except Exception as e:
+                errors.append(e)
+                value = Finished(None)
+            if isinstance(value, Finished):
+                results[position] = value.result
+            elif index + 1 < len(stages):
+                queues[index + 1].put((position, value))
+            else:
+                results[position] = value
+
+    # Every thread runs in a copy of the caller's context, so it reports to the same JobControl
+    threads = []
+    for index, (_, workers) in enumerate(stages):
+        threads.append([threading.Thread(target=contextvars.copy_context().run, args=(work, index), daemon=True)
+                        for _ in range(max(1, workers))])
+        for thread in threads[-1]:
+            thread.start()
+
+    try:
+        for position in range(len(items)):
+            if is_cancelled():
+                break
+            queues[0].put((position, None))
+    finally:
+        # A stage is stopped once the one before it has handed on all its items
+        for index, stage_threads in enumerate(threads):
+            for _ in stage_threads:
+                queues[index].put(None)
+            for thread in stage_threads:
+                thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
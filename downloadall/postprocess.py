@@ -0,0 +1,90 @@
+import os
+import shutil
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .scheduler import run_captured
+
+# ffmpeg processes run at once; encoding is CPU-bound, so one per core
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Same quality as yt-dlp's --audio-format mp3 --audio-quality 0
+MP3_OPTIONS = ["-c:a", "libmp3lame", "-q:a", "0"]
+
+# Stores a JPEG as the front cover of an MP3, like yt-dlp's --embed-thumbnail
+COVER_OPTIONS = [
+    "-c:v", "copy", "-id3v2_version", "3",
+    "-metadata:s:v", "title=Album cover", "-metadata:s:v", "comment=Cover (front)",
+]
+
+def resolve(result):
+    """Wait for a result that may still be post-processing"""
+    return result.result() if isinstance(result, Future) else result
+
+def ffmpeg_command(inputs, options, target):
+    """Build the ffmpeg command for a run; returns (command, temporary output path) or None without ffmpeg.
+
+    The output is written next to the target first, so a failed run never looks finished.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    root, ext = os.path.splitext(target)
+    temp_path = f"{root}.tmp{ext}"
+    command = [ffmpeg, "-y", "-v", "error"]
+    for path in inputs:
+        command += ["-i", path]
+    return command + options + [temp_path], temp_path
+
+def finish_ffmpeg(returncode, stderr, temp_path, target):
+    """Move a successful run's output into place; returns None or a short error message"""
+    if returncode != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        message = stderr.strip().splitlines()
+        return f"ffmpeg failed: {message[-1] if message else returncode}"
+    os.replace(temp_path, target)
+    return None
+
+def run_ffmpeg(inputs, options, target):
+    """Run ffmpeg on the input files, writing target atomically.
+
+    Returns None on success or a short error message.
+    """
+    prepared = ffmpeg_command(inputs, options, target)
+    if prepared is None:
+        return "ffmpeg not found"
+    command, temp_path = prepared
+    returncode, _, stderr = run_captured(command, "ffmpeg")
+    return finish_ffmpeg(returncode, stderr, temp_path, target)
+
+def audio_encoding(source, thumbnail=None, codec_options=MP3_OPTIONS):
+    """ffmpeg inputs and options that transcode an audio stream, embedding the cover image if given"""
+    if thumbnail is None:
+        return [source], ["-map", "0:a", "-map_metadata", "0"] + codec_options
+    return [source, thumbnail], ["-map", "0:a", "-map", "1:0", "-map_metadata", "0"] + codec_options + COVER_OPTIONS
+
+def encode_audio(source, target, thumbnail=None, codec_options=MP3_OPTIONS):
+    """Transcode an audio stream, embedding the cover image in the same ffmpeg pass"""
+    inputs, options = audio_encoding(source, thumbnail, codec_options)
+    return run_ffmpeg(inputs, options, target)
+
+class PostProcessor:
+    """Pool that runs CPU-bound ffmpeg work while downloads carry on.
+
+    Download workers hand finished raw streams to submit() and move straight
+    on to their next download. The encoding runs in separate ffmpeg
+    processes, so the pool threads only start them and wait.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    def submit(self, function, *args):
+        """Queue function(*args); returns a Future of its result"""
+        # Run in the caller's context, so the work reports to the caller's JobControl
+        return self.executor.submit(contextvars.copy_context().run, function, *args)
+
+    def close(self):
+        """Wait for all queued work to finish"""
+        self.executor.shutdown(wait=True)
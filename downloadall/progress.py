@@ -0,0 +1,81 @@
+import json
+from collections import namedtuple
+
+from .scheduler import current_control, log
+
+# Marks machine-readable event lines among the regular job output
+PROGRESS_MARKER = "[progress]"
+
+# yt-dlp prints one of these per progress update instead of its human-readable bar
+PROGRESS_TEMPLATE = "download:" + PROGRESS_MARKER + ' {"event": "progress", "progress": %(progress)j}'
+
+# A parsed event. `event` is one of "queue", "start", "progress", "done" or "error";
+# fields that do not apply to the event are None.
+ProgressEvent = namedtuple("ProgressEvent", [
+    "event", "video_id", "status", "downloaded_bytes", "total_bytes", "speed", "eta", "items"
+])
+
+_enabled = False
+
+def enable():
+    """Turn on progress event lines for this process (used with --progress-json)"""
+    global _enabled
+    _enabled = True
+
+def _handler():
+    """The current run's on_event callback, if it takes events directly"""
+    control = current_control()
+    return control.on_event if control is not None else None
+
+def is_enabled():
+    return _enabled or _handler() is not None
+
+def template_args():
+    """yt-dlp options that print progress as event lines, if events are enabled"""
+    if not is_enabled():
+        return []
+    return ["--newline", "--progress-template", PROGRESS_TEMPLATE]
+
+def emit(video_id, event, **fields):
+    """Report an event for a job to the current run, or print it as an event line if events are enabled"""
+    handler = _handler()
+    if handler is not None:
+        handler(_make_event(video_id, dict(event=event, **fields)))
+    elif _enabled:
+        log(video_id, f"{PROGRESS_MARKER} {json.dumps(dict(event=event, **fields))}")
+
+def emit_progress(video_id, status):
+    """Report a yt-dlp progress hook dict as a progress event, if events are enabled"""
+    if is_enabled():
+        progress = {key: value for key, value in status.items()
+                    if key in ("status", "downloaded_bytes", "total_bytes", "total_bytes_estimate", "speed", "eta")}
+        emit(video_id, "progress", progress=progress)
+
+def _make_event(video_id, payload):
+    progress = payload.get("progress") or {}
+    return ProgressEvent(
+        event=payload.get("event"),
+        video_id=video_id,
+        status=progress.get("status"),
+        downloaded_bytes=progress.get("downloaded_bytes"),
+        total_bytes=progress.get("total_bytes") or progress.get("total_bytes_estimate"),
+        speed=progress.get("speed"),
+        eta=progress.get("eta"),
+        items=payload.get("items"),
+    )
+
+def _parse_payload(video_id, payload):
+    try:
+        return _make_event(video_id, json.loads(payload))
+    except ValueError:
+        return None
+
+def parse_message(video_id, message):
+    """Parse the message of a log line from a job into a ProgressEvent, or return None.
+
+    yt-dlp processes report progress as event lines in their output; this
+    turns them back into events for a run that takes events directly.
+    """
+    if not message.startswith(PROGRESS_MARKER + " "):
+        return None
+    return _parse_payload(video_id, message[len(PROGRESS_MARKER) + 1:])
@@ -0,0 +1,175 @@
+import os
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Default location of per-domain / per-channel limits
+DEFAULT_RATE_CONFIG = os.path.join(os.path.expanduser("~"), ".youtube_downloader", "rate_limits.json")
+
+# Delay before each download starts. It halves after every successful download
+# (down to min_delay) and doubles, to at least THROTTLE_MIN_DELAY, whenever
+# YouTube throttles us.
+DEFAULT_START_DELAY = 2.0
+DEFAULT_MIN_DELAY = 0.0
+DEFAULT_MAX_DELAY = 120.0
+THROTTLE_MIN_DELAY = 5.0
+
+# Output that means the server wants us to slow down
+THROTTLE_MARKERS = (
+    "HTTP Error 429",
+    "Too Many Requests",
+    "confirm you're not a bot",
+    "confirm you’re not a bot",
+    "rate-limited",
+)
+
+_RATE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*$", re.IGNORECASE)
+
+def parse_rate(value):
+    """Parse a rate such as "2M" or "500K" into bytes per second (None for no limit)"""
+    if value in (None, "", 0):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    match = _RATE.match(value)
+    if match is None:
+        raise ValueError(f"Invalid rate: {value!r} (use e.g. 500K, 2M)")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** " KMG".index(unit.upper() or " "))
+
+def is_throttled(line):
+    return any(marker in line for marker in THROTTLE_MARKERS)
+
+class TokenBucket:
+    """Thread-safe token bucket measured in bytes.
+
+    consume() blocks until enough tokens are available, so every caller
+    sharing the bucket together stays under `rate` bytes per second.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        while amount > 0:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                take = min(amount, self.capacity)
+                if self.tokens >= take:
+                    self.tokens -= take
+                    amount -= take
+                    continue
+                wait = (take - self.tokens) / self.rate
+            time.sleep(wait)
+
+class RateLimiter:
+    """Bandwidth budget and adaptive start delay shared by all jobs of a run.
+
+    The in-process engine draws every downloaded byte from the token bucket.
+    Subprocess jobs cannot be metered from outside, and a running yt-dlp
+    cannot be given a new limit, so each one gets a fixed 1/jobs share of
+    the budget as --limit-rate, where jobs is the most that run at once.
+    """
+
+    def __init__(self, limit_rate=None, start_delay=DEFAULT_START_DELAY,
+                 min_delay=DEFAULT_MIN_DELAY, max_delay=DEFAULT_MAX_DELAY, jobs=1):
+        self.limit_rate = parse_rate(limit_rate)
+        self.jobs = max(1, jobs)
+        self.bucket = TokenBucket(self.limit_rate) if self.limit_rate else None
+        self.delay = max(start_delay, min_delay)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def current_delay(self):
+        """Seconds to wait before the next download starts"""
+        with self.lock:
+            return self.delay
+
+    def wait(self):
+        """Sleep for the current inter-download delay"""
+        delay = self.current_delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    @contextmanager
+    def job(self):
+        """Register a running job; yields its share of the budget in bytes/s (or None)"""
+        with self.lock:
+            self.active += 1
+            # Jobs beyond the expected number get smaller shares instead of adding a full one
+            share = self.limit_rate // max(self.jobs, self.active) if self.limit_rate else None
+        try:
+            yield share
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def success(self):
+        with self.lock:
+            self.delay = max(self.min_delay, self.delay / 2)
+
+    def throttled(self):
+        with self.lock:
+            self.delay = min(self.max_delay, max(THROTTLE_MIN_DELAY, self.delay * 2))
+
+def load_rate_config(path=DEFAULT_RATE_CONFIG):
+    """Load per-domain/per-channel limits; returns {} if there is no config file.
+
+    The file maps a domain ("youtube.com") or a URL prefix without the scheme
+    ("www.youtube.com/@SomeChannel") to settings, for example:
+
+        {"youtube.com": {"limit_rate": "4M", "start_delay": 1},
+         "www.youtube.com/@SomeChannel": {"limit_rate": "1M", "min_delay": 3}}
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def settings_for_url(url, config):
+    """Return the settings of the most specific config entry matching a URL"""
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    host = parsed.netloc.lower()
+    # Keys are matched case-insensitively, channel handles included
+    location = host + parsed.path.lower()
+
+    best_key, best = None, {}
+    for key, settings in config.items():
+        key_lower = key.lower()
+        matches = (
+            location.startswith(key_lower)
+            or host == key_lower
+            or host.endswith("." + key_lower)
+        )
+        if matches and (best_key is None or len(key) > len(best_key)):
+            best_key, best = key, settings
+    return best
+
+def make_limiter(url, limit_rate=None, config_path=DEFAULT_RATE_CONFIG, jobs=1):
+    """Create the rate limiter for a source URL whose items are downloaded up to `jobs` at a time.
+
+    An explicit limit_rate overrides the config.
+    """
+    settings = dict(settings_for_url(url, load_rate_config(config_path)))
+    if limit_rate is not None:
+        settings["limit_rate"] = limit_rate
+    return RateLimiter(
+        limit_rate=settings.get("limit_rate"),
+        start_delay=settings.get("start_delay", DEFAULT_START_DELAY),
+        min_delay=settings.get("min_delay", DEFAULT_MIN_DELAY),
+        max_delay=settings.get("max_delay", DEFAULT_MAX_DELAY),
+        jobs=jobs,
+    )
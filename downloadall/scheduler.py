@@ -0,0 +1,261 @@
+import os
+import json
+import signal
+import platform
+import subprocess
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Number of yt-dlp processes to run at once when --jobs is not given
+DEFAULT_JOBS = 1
+
+# Serializes console output so lines from different jobs never interleave mid-line
+_print_lock = threading.Lock()
+
+# "text" prints "[job] message" lines; "json" prints one JSON object per line
+LOG_FORMATS = ("text", "json")
+_log_format = "text"
+
+def set_log_format(log_format):
+    """Switch console output between plain text and JSON lines"""
+    global _log_format
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format: {log_format}")
+    _log_format = log_format
+
+def kill_tree(pid):
+    """Stop a process started in its own session, along with the processes it started"""
+    try:
+        if platform.system() == "Windows":
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(pid)], capture_output=True)
+        else:
+            os.killpg(pid, signal.SIGTERM)
+    except (OSError, ProcessLookupError):
+        pass
+
+def terminate_tree(process):
+    """kill_tree() for a subprocess.Popen that is still running"""
+    if process.poll() is None:
+        kill_tree(process.pid)
+
+class JobControl:
+    """Output routing and cancellation for one download run sharing the process with others.
+
+    Inside controlled(control), log lines go to on_line(prefix, message,
+    fields) and progress events to on_event(event) instead of the console.
+    The control follows the run onto the threads run_jobs() starts, and
+    cancel() ends the yt-dlp and ffmpeg processes the run has started. A
+    process that runs longer than timeout seconds is ended as well, which
+    fails its attempt.
+    """
+
+    def __init__(self, on_line=None, on_event=None, timeout=None):
+        self.on_line = on_line
+        self.on_event = on_event
+        self.timeout = timeout
+        self.cancelled = threading.Event()
+        self._processes = {}
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self.cancelled.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            terminate_tree(process)
+
+    def track(self, process, prefix=None):
+        timer = None
+        if self.timeout is not None:
+            # The timer thread reports to this run, like the thread that started the process
+            timer = threading.Timer(self.timeout, contextvars.copy_context().run, (self._expire, process, prefix))
+            timer.daemon = True
+            timer.start()
+        with self._lock:
+            self._processes[process] = timer
+        if self.cancelled.is_set():
+            terminate_tree(process)
+
+    def untrack(self, process):
+        with self._lock:
+            timer = self._processes.pop(process, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _expire(self, process, prefix):
+        if process.poll() is None:
+            log(prefix, f"Stopping a process that ran longer than {self.timeout:.0f}s")
+            terminate_tree(process)
+
+_control = contextvars.ContextVar("job_control", default=None)
+
+def current_control():
+    """The JobControl of the run on this thread, or None when output goes to the console"""
+    return _control.get()
+
+@contextmanager
+def controlled(control):
+    """Run the enclosed code (and the jobs it starts) under a JobControl"""
+    token = _control.set(control)
+    try:
+        yield control
+    finally:
+        _control.reset(token)
+
+def is_cancelled():
+    control = _control.get()
+    return control is not None and control.cancelled.is_set()
+
+def echo(message):
+    """Print an untagged status message, or hand it to the current run's output"""
+    control = _control.get()
+    if control is not None and control.on_line is not None:
+        control.on_line(None, message, {})
+        return
+    with _print_lock:
+        print(message, flush=True)
+
+def log(prefix, message, **fields):
+    """Print a message tagged with the job it belongs to.
+
+    Extra fields are only included in JSON output. Under a JobControl the
+    message goes to its on_line callback instead.
+    """
+    control = _control.get()
+    if control is not None and control.on_line is not None:
+        control.on_line(prefix, message, fields)
+        return
+    if _log_format == "json":
+        record = {"time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                  "job": prefix, "message": message, **fields}
+        line = json.dumps(record, ensure_ascii=False)
+    else:
+        line = f"[{prefix}] {message}"
+    with _print_lock:
+        print(line, flush=True)
+
+# Fields of the finished file that yt-dlp reports back after a download
+RESULT_TEMPLATE = "after_move:%(.{filepath,duration,filesize,filesize_approx,format_id})j"
+
+# The whole info dict of a video, once its formats have been extracted
+INFO_TEMPLATE = "video:%()j"
+
+def run_command(command, prefix, on_line=None):
+    """Run a command and echo its output, each line tagged with the job prefix.
+
+    on_line, if given, is called with every non-empty output line.
+    """
+    control = _control.get()
+    # A controlled run gets its own session, so cancelling it also ends ffmpeg children
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        start_new_session=control is not None
+    )
+    if control is not None:
+        control.track(process, prefix)
+
+    try:
+        for line in process.stdout:
+            line = line.rstrip()
+            if line:
+                log(prefix, line)
+                if on_line is not None:
+                    on_line(line)
+        return process.wait()
+    finally:
+        if control is not None:
+            control.untrack(process)
+
+def run_captured(command, prefix):
+    """Run a command and collect its output; returns (return code, stdout, stderr).
+
+    Under a JobControl the process is ended when the run is cancelled or
+    the process times out, like those of run_command().
+    """
+    control = _control.get()
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=control is not None
+    )
+    if control is not None:
+        control.track(process, prefix)
+
+    try:
+        stdout, stderr = process.communicate()
+        return process.returncode, stdout, stderr
+    finally:
+        if control is not None:
+            control.untrack(process)
+
+def result_command(command, result_file, info_file=None):
+    """Add the options that make yt-dlp write the finished file's details to result_file.
+
+    With info_file, the video's extracted metadata is written there too.
+    """
+    options = ["--print-to-file", RESULT_TEMPLATE, result_file]
+    if info_file:
+        options += ["--print-to-file", INFO_TEMPLATE, info_file]
+    return command[:1] + options + command[1:]
+
+def read_result(result_file):
+    """Read the details yt-dlp wrote to result_file; returns the result dict or None"""
+    with open(result_file, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    try:
+        return json.loads(lines[-1]) if lines else None
+    except ValueError:
+        return None
+
+def temp_result_file():
+    """Create an empty temporary file for yt-dlp to print to; returns its path"""
+    fd, path = tempfile.mkstemp(prefix="yt-dlp-", suffix=".json")
+    os.close(fd)
+    return path
+
+def run_download(command, prefix, on_line=None, on_info=None):
+    """Run a yt-dlp download command.
+
+    Returns (return code, result) where result is a dict with the final
+    filepath and, when known, its duration and filesize, or None if yt-dlp
+    did not finish a file. on_info, if given, is called with the video's
+    extracted metadata.
+    """
+    result_file = temp_result_file()
+    info_file = temp_result_file() if on_info is not None else None
+    try:
+        # Ask yt-dlp to report where the finished file ended up
+        returncode = run_command(result_command(command, result_file, info_file), prefix, on_line)
+        if info_file:
+            info = read_result(info_file)
+            if info:
+                on_info(info)
+        return returncode, read_result(result_file)
+    finally:
+        for path in (result_file, info_file):
+            if path:
+                os.remove(path)
+
+def run_jobs(items, worker, jobs=DEFAULT_JOBS):
+    """Call worker(item) for every item using at most `jobs` concurrent threads.
+
+    Results are returned in the same order as the items.
+    """
+    jobs = max(1, int(jobs))
+    if jobs == 1:
+        return [worker(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # Each item runs in a copy of the caller's context, so it reports to the same JobControl
+        futures = [executor.submit(contextvars.copy_context().run, worker, item) for item in items]
+        return [future.result() for future in futures]
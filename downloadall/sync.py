@@ -0,0 +1,130 @@
+from urllib.parse import urlparse, parse_qs
+
+from .listing import entries_by_id
+from .scheduler import echo, log
+
+# Sizes of the listing pages fetched while looking for the newest known entry;
+# None fetches the whole source
+SYNC_PAGE_SIZES = (10, 100, 1000, None)
+
+# Entry fields kept in the stored listing
+_LISTING_FIELDS = ("id", "url", "title", "duration", "upload_date", "channel", "uploader")
+
+def is_newest_first(url):
+    """Whether a source lists its newest uploads first.
+
+    Channels and their uploads playlists (IDs starting with "UU") do; regular
+    playlists usually grow at the end instead.
+    """
+    playlist_id = parse_qs(urlparse(url).query).get("list", [None])[0]
+    return playlist_id is None or playlist_id.startswith("UU")
+
+def _listing_entry(entry):
+    """Reduce a flat playlist entry to what is needed to download it later"""
+    slim = {key: entry[key] for key in _LISTING_FIELDS if entry.get(key) is not None}
+    slim["_type"] = "url"
+    return slim
+
+def _fetch(engine, url, items=None):
+    """Return (entries, reported item count) of a listing, or (None, None) on failure"""
+    info = engine.fetch_info(url, items=items)
+    if info is None:
+        return None, None
+    entries = [_listing_entry(entry) for entry in entries_by_id(info).values()]
+    return entries, info.get("playlist_count")
+
+def _fetch_until_known(engine, url, known_ids):
+    """Fetch ever larger pages of a newest-first source until one reaches a known entry.
+
+    Returns (new entries, full listing or None if only the head was fetched, count).
+    """
+    for size in SYNC_PAGE_SIZES:
+        entries, count = _fetch(engine, url, f"1:{size}" if size else None)
+        if entries is None:
+            return None, None, None
+
+        for index, entry in enumerate(entries):
+            if entry["id"] in known_ids:
+                return entries[:index], None, count
+
+        # Reached the end of the source without meeting a known entry
+        if size is None or len(entries) < size:
+            return entries, entries, count
+    return None, None, None
+
+def _fetch_if_count_changed(engine, url, known_ids, known_count):
+    """Re-list an append-at-end playlist only if its item count changed.
+
+    Returns (new entries, full listing or None if unchanged, count).
+    """
+    _, count = _fetch(engine, url, "1:1")
+    if count is not None and count == known_count:
+        return [], None, count
+
+    entries, count = _fetch(engine, url)
+    if entries is None:
+        return None, None, None
+    return [entry for entry in entries if entry["id"] not in known_ids], entries, count
+
+def sync_source(engine, history, url):
+    """List what a playlist or channel gained since its last sync.
+
+    The listing of every source is stored in the history database. Later syncs
+    only fetch the head of newest-first sources until they reach an entry that
+    is already known, and only re-list other playlists when their item count
+    changed, so a poll without changes costs one small request.
+
+    Returns a dict of video ID -> entry holding the new entries followed by
+    earlier entries that are still not downloaded, or None if listing failed.
+    """
+    source = history.get_source(url)
+    if source is None:
+        entries, count = _fetch(engine, url)
+        if entries is None:
+            return None
+        history.save_source(url, entries, count)
+        log("sync", f"First sync of {url}: {len(entries)} item(s)")
+        return {entry["id"]: entry for entry in entries}
+
+    known = source["entries"]
+    known_ids = set(entry["id"] for entry in known)
+    if is_newest_first(url):
+        new_entries, listing, count = _fetch_until_known(engine, url, known_ids)
+    else:
+        new_entries, listing, count = _fetch_if_count_changed(engine, url, known_ids, source["item_count"])
+    if new_entries is None:
+        return None
+
+    if listing is None:
+        new_ids = set(entry["id"] for entry in new_entries)
+        listing = new_entries + [entry for entry in known if entry["id"] not in new_ids]
+    history.save_source(url, listing, count)
+    log("sync", f"{len(new_entries)} new item(s) since the last sync of {url}")
+
+    # Entries listed before but never downloaded (failed or interrupted) are retried
+    entries = {entry["id"]: entry for entry in new_entries}
+    unfinished = history.filter_new(entry["id"] for entry in listing if entry["id"] not in entries)
+    listed = {entry["id"]: entry for entry in listing}
+    for video_id in unfinished:
+        entries[video_id] = listed[video_id]
+    return entries
+
+def list_source(engine, history, url, full=False, sync=False):
+    """List the entries of a URL, or with sync only what changed since its last sync.
+
+    Returns a dict of video ID -> entry, or None if listing failed.
+    """
+    if sync:
+        return sync_source(engine, history, url)
+    return engine.fetch_playlist(url, full=full) or None
+
+def queue_new(history, entries):
+    """Return the IDs of the listed entries that are not downloaded yet, and mark them pending"""
+    # Playlist duplicates are dropped as well
+    new_ids = history.filter_new(entries)
+    history.mark_pending(new_ids)
+    # Skipped as downloaded, but their files were deleted since; verify.py re-queues them
+    missing = history.missing_files(set(entries).difference(new_ids))
+    if missing:
+        echo(f"{len(missing)} downloaded item(s) no longer have their file; run verify.py to download them again")
+    return new_ids
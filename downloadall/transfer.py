@@ -0,0 +1,173 @@
+import os
+import random
+import shutil
+import subprocess
+import time
+
+from .metadata_cache import remember_info, stale_info
+from .ratelimit import RateLimiter, is_throttled
+from .scheduler import is_cancelled, log
+from . import metrics
+from . import progress
+
+# Download states, in the order an item moves through them
+PENDING = "pending"
+DOWNLOADING = "downloading"
+MERGING = "merging"
+VERIFIED = "verified"
+COMMITTED = "committed"
+FAILED = "failed"
+
+# Attempts per item before giving up until the next run
+MAX_ATTEMPTS = 3
+
+# Exponential backoff between attempts: 5 s, 10 s, 20 s ... capped at 2 minutes
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 120
+
+# Allowed difference between the expected and actual duration of a finished file
+DURATION_TOLERANCE_SECONDS = 2.0
+DURATION_TOLERANCE_RATIO = 0.02
+
+# Output lines that show yt-dlp has moved on from downloading to merging/converting
+_POSTPROCESS_PREFIXES = ("[Merger]", "[ExtractAudio]", "[VideoConvertor]", "[EmbedThumbnail]", "[FixupM3u8]")
+
+# Output lines that show yt-dlp has finished extracting and started transferring media
+_TRANSFER_PREFIXES = ("[download]", progress.PROGRESS_MARKER)
+
+# yt-dlp resumes .part files with HTTP range requests when --continue is on
+RESUME_OPTIONS = ["--continue", "--part"]
+
+def retry_delay(attempt):
+    """Seconds to wait before the given (1-based) retry, with a little jitter"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+def probe_duration(path):
+    """Return the media duration of a file in seconds using ffprobe, or None"""
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+        capture_output=True, text=True
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+def verify_download(result):
+    """Check a finished download; returns None if it is complete or a reason if not"""
+    path = result.get("filepath") if result else None
+    if not path or not os.path.exists(path):
+        return "output file is missing"
+    if os.path.exists(path + ".part"):
+        return "output file is still partial"
+
+    size = os.path.getsize(path)
+    if size == 0:
+        return "output file is empty"
+
+    expected = result.get("duration")
+    if expected:
+        actual = probe_duration(path)
+        tolerance = max(DURATION_TOLERANCE_SECONDS, expected * DURATION_TOLERANCE_RATIO)
+        if actual is not None and abs(actual - expected) > tolerance:
+            return f"duration is {actual:.1f}s, expected {expected:.1f}s"
+    return None
+
+def download_item(engine, options, video_id, info, history, format, limiter=None, commit=True, connections=1):
+    """Download, verify and commit one item, retrying failures with backoff.
+
+    The item moves pending -> downloading -> merging -> verified -> committed
+    in the history store. It is only committed once the finished file exists
+    and matches the expected duration, so failed or interrupted downloads are
+    retried (resuming their .part file) here or on the next run. With a
+    limiter, each attempt waits for its adaptive delay and shares the run's
+    bandwidth budget; throttling in the output slows the whole run down.
+    With commit=False the verified download is returned without committing
+    it, for callers that still have to post-process the file. connections
+    is the number of parallel connections the options open per download.
+    Metadata yt-dlp extracts on the way is kept in the metadata cache.
+
+    A cancelled run stops between attempts and leaves the item unfinished,
+    so it resumes on the next run.
+
+    Returns the result dict of the committed download, or None.
+    """
+    limiter = limiter or RateLimiter()
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        with metrics.timed(video_id, "wait"):
+            limiter.wait()
+        if is_cancelled():
+            return None
+        history.set_state(video_id, DOWNLOADING, new_attempt=True)
+        clock = metrics.StageClock(video_id, "extract")
+        with limiter.job() as share:
+            attempt_options = options + RESUME_OPTIONS + engine.rate_limit_options(limiter, share, connections, options)
+            returncode, result = engine.download(attempt_options, video_id, info,
+                                                 line_handler(history, video_id, limiter, clock),
+                                                 lambda extracted: remember_info(video_id, extracted))
+        clock.stop()
+        if is_cancelled():
+            log(video_id, "Cancelled")
+            return None
+
+        if returncode != 0:
+            problem = f"yt-dlp exited with code {returncode}"
+        else:
+            with metrics.timed(video_id, "verify"):
+                problem = verify_download(result)
+        if problem is None:
+            return attempt_succeeded(history, video_id, format, result, limiter, commit)
+        delay = attempt_failed(history, video_id, attempt, problem)
+        if delay is None:
+            return None
+        # The stream URLs may have expired; the next attempt resolves the video again
+        info = stale_info(video_id, info)
+        with metrics.timed(video_id, "wait"):
+            time.sleep(delay)
+    return None
+
+def line_handler(history, video_id, limiter, clock=None):
+    """Return the on_line callback for a download attempt: notes merging and throttling.
+
+    With a metrics.StageClock, the attempt's time is also split into the
+    extract, transfer and merge stages.
+    """
+    def on_line(line):
+        if line.startswith(_POSTPROCESS_PREFIXES):
+            history.set_state(video_id, MERGING)
+            if clock is not None:
+                clock.switch("merge")
+        elif is_throttled(line):
+            limiter.throttled()
+        elif clock is not None and clock.stage == "extract" and line.startswith(_TRANSFER_PREFIXES):
+            clock.switch("transfer")
+    return on_line
+
+def attempt_succeeded(history, video_id, format, result, limiter, commit=True):
+    """Record a verified download, committing it unless commit=False; returns the result"""
+    limiter.success()
+    history.set_state(video_id, VERIFIED)
+    path = result["filepath"]
+    size = os.path.getsize(path)
+    metrics.add_bytes(video_id, size)
+    if commit:
+        history.commit(video_id, format=format, size=size, path=path)
+    return result
+
+def attempt_failed(history, video_id, attempt, problem):
+    """Record a failed attempt; returns the delay before the next one, or None after the last"""
+    history.set_state(video_id, FAILED, error=problem)
+    if attempt >= MAX_ATTEMPTS:
+        log(video_id, f"Giving up after {attempt} attempts: {problem}")
+        return None
+    delay = retry_delay(attempt)
+    log(video_id, f"Attempt {attempt} failed ({problem}), retrying in {delay:.0f}s")
+    metrics.retry(video_id, attempt, problem)
+    progress.emit(video_id, "retry", attempt=attempt)
+    return delay
@@ -0,0 +1,250 @@
+import os
+import sys
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .scheduler import echo, log, run_jobs
+from .transfer import DURATION_TOLERANCE_RATIO, DURATION_TOLERANCE_SECONDS, probe_duration
+
+# How thoroughly each recorded file is checked:
+#   missing  it exists; only the recorded paths are looked up, so the folder is not walked
+#   size     it exists, is not partial and is not smaller than when it was downloaded
+#   probe    as size, and ffprobe can still read its duration
+#   hash     as size, and a SHA-256 of its content matches the one from the last scan
+CHECKS = ("missing", "size", "probe", "hash")
+DEFAULT_CHECK = "size"
+
+MODES = ("video", "audio")
+
+# Listing folders and reading files waits on the disk, not the CPU
+DEFAULT_SCAN_JOBS = min(32, (os.cpu_count() or 1) * 4)
+
+# Files are hashed in pieces of this size, so memory use stays flat for any file
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Leftovers of unfinished downloads, not counted as untracked files
+_PARTIAL_SUFFIXES = (".part", ".ytdl", ".tmp")
+
+def _scan_dir(path):
+    """List one folder; returns ({file path: (inode, mtime_ns, size)}, [subfolder paths])"""
+    found = {}
+    subfolders = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # Skips the history databases and the audio staging folder
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    found[entry.path] = (entry.inode(), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        pass
+    return found, subfolders
+
+def scan_folder(folder, jobs=DEFAULT_SCAN_JOBS):
+    """Walk an output folder with os.scandir, listing several subfolders at once.
+
+    Returns {absolute path: (inode, mtime_ns, size)} of every file in it.
+    """
+    files = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        pending = {executor.submit(_scan_dir, os.path.abspath(folder))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, subfolders = future.result()
+                files.update(found)
+                pending.update(executor.submit(_scan_dir, path) for path in subfolders)
+    return files
+
+def hash_file(path):
+    """Return the SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _stat_key(path, files):
+    """(inode, mtime_ns, size) of a file from the scan, or from os.stat() if it lies outside the folder"""
+    key = files.get(path)
+    if key is not None:
+        return key
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def check_size(path, key, recorded_size, files):
+    """The cheap checks every scan does; returns None or the problem"""
+    if key is None:
+        return "file is missing"
+    if path + ".part" in files or os.path.exists(path + ".part"):
+        return "file is still partial"
+    size = key[2]
+    if size == 0:
+        return "file is empty"
+    if recorded_size and size < recorded_size:
+        return f"file is truncated ({size} of {recorded_size} bytes)"
+    return None
+
+def deep_check(path, key, check, previous):
+    """Probe or hash one file; returns its scan record for the cache.
+
+    previous is the file's last record, if any. A duration shorter than
+    the last one means the file was cut short; a hash that differs while
+    the inode, mtime and size did not means its content was damaged.
+    """
+    unchanged = previous is not None and (previous["inode"], previous["mtime_ns"], previous["size"]) == key
+    record = {"inode": key[0], "mtime_ns": key[1], "size": key[2], "duration": None, "sha256": None, "problem": None}
+    if unchanged:
+        record["duration"] = previous["duration"]
+        record["sha256"] = previous["sha256"]
+
+    if check == "probe":
+        duration = probe_duration(path)
+        last = previous["duration"] if previous else None
+        if duration is None:
+            record["problem"] = "ffprobe cannot read the file"
+        elif last and last - duration > max(DURATION_TOLERANCE_SECONDS, last * DURATION_TOLERANCE_RATIO):
+            record["problem"] = f"duration is {duration:.1f}s, was {last:.1f}s"
+        record["duration"] = duration
+    elif check == "hash":
+        try:
+            digest = hash_file(path)
+        except OSError as e:
+            record["problem"] = f"file cannot be read: {e.strerror}"
+        else:
+            if unchanged and previous["sha256"] and previous["sha256"] != digest:
+                record["problem"] = "content changed although its size and mtime did not"
+            record["sha256"] = digest
+    return record
+
+def _is_cached(record, key, check):
+    """Whether a cached record still describes the file and holds the result of the check"""
+    if record is None or (record["inode"], record["mtime_ns"], record["size"]) != key:
+        return False
+    if check == "probe":
+        return record["duration"] is not None or record["problem"] is not None
+    return record["sha256"] is not None or record["problem"] is not None
+
+def verify_library(history, folder, check=DEFAULT_CHECK, jobs=DEFAULT_SCAN_JOBS, recheck=False):
+    """Compare the history of an output folder with the files in it.
+
+    The folder is walked once in parallel. Every recorded download is
+    checked for being missing, partial, empty or truncated, and with
+    check="probe" or "hash" its content is checked too. Probe and hash
+    results are cached in the history by (inode, mtime, size), so files
+    that did not change are not read again unless recheck is set.
+
+    Returns a dict with "problems", a list of (video_id, path, problem),
+    "untracked", the files no download is recorded for, and the counts
+    "recorded", "checked" and "cached". check="missing" only looks for
+    deleted files, without walking the folder, so nothing is untracked.
+    """
+    if check == "missing":
+        problems = [(video_id, os.path.abspath(path), "file is missing")
+                    for video_id, path in history.missing_files()]
+        return {"problems": problems, "untracked": [], "recorded": len(history.recorded_files()),
+                "checked": 0, "cached": 0}
+
+    files = scan_folder(folder, jobs)
+    cache = history.get_scans() if check != "size" else {}
+    problems = []
+    recorded = set()
+    to_check = []
+    cached = 0
+
+    for video_id, recorded_size, path in history.recorded_files():
+        path = os.path.abspath(path)
+        recorded.add(path)
+        key = _stat_key(path, files)
+        problem = check_size(path, key, recorded_size, files)
+        if problem is not None:
+            problems.append((video_id, path, problem))
+        elif check != "size":
+            record = cache.get(path)
+            if not recheck and _is_cached(record, key, check):
+                cached += 1
+                if record["problem"]:
+                    problems.append((video_id, path, record["problem"]))
+            else:
+                to_check.append((video_id, path, key))
+
+    records = run_jobs(to_check, lambda item: deep_check(item[1], item[2], check, cache.get(item[1])), jobs)
+    if records:
+        history.save_scans({path: record for (_, path, _), record in zip(to_check, records)})
+    problems += [(video_id, path, record["problem"])
+                 for (video_id, path, _), record in zip(to_check, records) if record["problem"]]
+
+    untracked = sorted(path for path in files if path not in recorded and not path.endswith(_PARTIAL_SUFFIXES))
+    return {"problems": problems, "untracked": untracked, "recorded": len(recorded),
+            "checked": len(to_check), "cached": cached}
+
+def requeue(history, problems):
+    """Remove damaged files and forget their downloads, so the next run of their URL fetches them again"""
+    for video_id, path, problem in problems:
+        if os.path.exists(path):
+            os.remove(path)
+    history.requeue(video_id for video_id, path, problem in problems)
+
+def load_library(mode):
+    """Import the downloader module for a mode; returns (history, output folder)"""
+    if mode == "audio":
+        from . import audio_only
+        return audio_only.get_history(), audio_only.OUTPUT_FOLDER
+    from . import video
+    return video.get_history(), video.OUTPUT_FOLDER
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Check downloaded files against the download history and re-queue damaged ones"
+    )
+    parser.add_argument("--mode", choices=MODES, action="append",
+                        help="library to check; may be repeated (default: video and audio)")
+    parser.add_argument("--check", choices=CHECKS, default=DEFAULT_CHECK,
+                        help="missing: deleted files only, without walking the folder; size: missing, "
+                             "partial and truncated files only; probe: also read each file with ffprobe; "
+                             "hash: also compare a SHA-256 of each file with the last scan "
+                             f"(default: {DEFAULT_CHECK})")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_SCAN_JOBS,
+                        help=f"folders to list and files to check at once (default: {DEFAULT_SCAN_JOBS})")
+    parser.add_argument("--recheck", action="store_true",
+                        help="probe or hash every file again, even if it has not changed since the last scan")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report problems; do not remove damaged files or re-queue their downloads")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.check == "probe" and not shutil.which("ffprobe"):
+        print("Error: ffprobe not found. Install FFmpeg to use --check probe")
+        return 1
+
+    damaged = 0
+    for mode in args.mode or MODES:
+        history, folder = load_library(mode)
+        echo(f"Checking {mode} downloads in {folder}")
+        report = verify_library(history, folder, args.check, args.jobs, args.recheck)
+        for video_id, path, problem in report["problems"]:
+            log(video_id, f"{path}: {problem}")
+        echo(f"{report['recorded']} recorded file(s), {len(report['problems'])} problem(s), "
+             f"{len(report['untracked'])} untracked file(s)")
+        if args.check in ("probe", "hash"):
+            echo(f"{report['checked']} file(s) {'probed' if args.check == 'probe' else 'hashed'}, "
+                 f"{report['cached']} unchanged since the last scan")
+        if report["problems"] and not args.dry_run:
+            requeue(history, report["problems"])
+            echo(f"Re-queued {len(report['problems'])} item(s); they are downloaded again "
+                 f"the next time their video or playlist is run")
+        damaged += len(report["problems"])
+    return 1 if damaged else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,126 +1,238 @@
 import os
-import subprocess
-import shutil
-import platform
-import hashlib
-
-# Determine user's desktop path based on the operating system
-def get_desktop_path():
-    if platform.system() == "Windows":
-        return os.path.join(os.path.expanduser("~"), "Desktop")
-    elif platform.system() == "Darwin":  # macOS
-        return os.path.join(os.path.expanduser("~"), "Desktop")
-    else:  # Linux and other Unix-like systems
-        return os.path.join(os.path.expanduser("~"), "Desktop")
+import sys
+import argparse
+
+from . import metrics
+from . import progress
+from .config import ToolNotFound, find_aria2c, get_desktop_path, lazy
+from .engine import DEFAULT_ENGINE, ENGINES, SubprocessEngine, make_engine
+from .formats import DEFAULT_PROFILE, connection_options, load_profiles, needs_probe, select_format
+from .history import HistoryStore
+from .layout import LAYOUTS, needs_info, output_template, reserve_output, set_layout
+from .leases import claim_item, run_claimed
+from .media_store import MediaStore, reuse_stored
+from .metadata_cache import cached_info, resolve_info
+from .ratelimit import DEFAULT_RATE_CONFIG, make_limiter
+from .scheduler import DEFAULT_JOBS, echo, log, run_jobs
+from .sync import list_source, queue_new
+from .transfer import download_item
 
 # Setup paths
 DESKTOP_PATH = get_desktop_path()
 OUTPUT_FOLDER = os.path.join(DESKTOP_PATH, "YouTube Videos")
 DOWNLOAD_HISTORY_FILE = os.path.join(OUTPUT_FOLDER, ".download_history.txt")
+HISTORY_DB_FILE = os.path.join(OUTPUT_FOLDER, ".download_history.db")
 
-# Detect yt-dlp path or use a manually defined path
-YT_DLP_PATH = shutil.which("yt-dlp")
-if not YT_DLP_PATH:
-    # Try common installation paths
-    possible_paths = [
-        r"C:\Users\bhara\Desktop\yt-dlp.exe",
-        os.path.join(os.path.expanduser("~"), "yt-dlp"),
-        os.path.join(os.path.expanduser("~"), "yt-dlp.exe"),
-        "./yt-dlp",
-        "./yt-dlp.exe"
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            YT_DLP_PATH = path
-            break
-    
-    if not YT_DLP_PATH:
-        print("Error: yt-dlp not found. Install it using: pip install yt-dlp")
-        exit(1)
+def open_history():
+    """Create the output folder and open the download history, importing the legacy text file if present"""
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    history = HistoryStore(HISTORY_DB_FILE, legacy_path=DOWNLOAD_HISTORY_FILE)
+    history.index_files(OUTPUT_FOLDER)
+    return history
 
-# Ensure output directory exists
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+def open_store():
+    """Open the media store both downloaders reuse files from, adding this history's files"""
+    store = MediaStore()
+    store.add_many(get_history().records())
+    return store
 
-# Create download history file if it doesn't exist
-if not os.path.exists(DOWNLOAD_HISTORY_FILE):
-    with open(DOWNLOAD_HISTORY_FILE, 'w') as f:
-        pass
+# Opened on first use, so importing this module touches no files
+get_history = lazy(open_history)
+get_store = lazy(open_store)
+
+# Built-in quality profiles plus any defined in ~/.youtube_downloader/profiles.json
+get_profiles = lazy(load_profiles)
 
 def get_downloaded_video_ids():
-    """Read the history file to get previously downloaded video IDs"""
-    if not os.path.exists(DOWNLOAD_HISTORY_FILE):
-        return set()
-    
-    with open(DOWNLOAD_HISTORY_FILE, 'r') as f:
-        return set(line.strip() for line in f if line.strip())
+    """Return the set of previously downloaded video IDs"""
+    return get_history().ids()
 
-def add_video_to_history(video_id):
+def add_video_to_history(video_id, path=None):
     """Add a video ID to the download history"""
-    with open(DOWNLOAD_HISTORY_FILE, 'a') as f:
-        f.write(f"{video_id}\n")
+    size = os.path.getsize(path) if path and os.path.exists(path) else None
+    get_history().add(video_id, format="mp4", size=size, path=path)
+
+def fetch_video(video_id, info, engine, limiter, profile, probe):
+    """Download a video in the format its quality profile selects"""
+    history = get_history()
+    # Probed metadata is handed to the download, so the page is still only resolved once
+    if probe and needs_probe(video_id, info, history, profile):
+        info = resolve_info(engine, video_id, info)
+
+    options = video_options(video_id, info, profile)
+    result = download_item(engine, options, video_id, info, history, "mp4", limiter,
+                           connections=profile_connections(profile))
+    remember_format(video_id, profile, result)
+    return result
+
+def video_options(video_id, info, profile):
+    """yt-dlp options that download a video in the format and over the connections its quality profile sets"""
+    return [
+        "-f", select_format(video_id, info, get_history(), profile, get_profiles()),
+        "--merge-output-format", "mp4",
+        "--output", output_template(OUTPUT_FOLDER, reserve_output(get_history(), video_id, info)),
+    ] + connection_options(get_profiles()[profile], find_aria2c())
+
+def profile_connections(profile):
+    """Number of parallel connections a download with this profile opens"""
+    return get_profiles()[profile].get("connections") or 1
+
+def remember_format(video_id, profile, result):
+    if result and result.get("format_id"):
+        # Re-downloads with this profile will pick exactly the same streams
+        get_history().save_format_choice(video_id, profile, result["format_id"])
+
+def video_finished(video_id, result):
+    """Record a finished video in the media store, release it and report how it went; returns the result"""
+    get_history().release(video_id)
+    if result:
+        get_store().add(video_id, "mp4", result["filepath"])
+        log(video_id, f"Video {video_id} downloaded and added to history")
+        progress.emit(video_id, "done")
+    else:
+        log(video_id, f"Error downloading video {video_id}")
+        progress.emit(video_id, "error")
+    metrics.item_finished(video_id, bool(result))
+    return result
 
-def download_videos(url):
-    """Download videos from URL (works with single videos or playlists)"""
+def download_video(video_id, info=None, engine=None, limiter=None, profile=DEFAULT_PROFILE, probe=False):
+    """Download a single video by ID and record it in the history.
+
+    Returns the result or None, or leases.CLAIMED while another run is
+    downloading the same video.
+    """
+    history = get_history()
+    claimed = claim_item(history, video_id)
+    if claimed is not None:
+        return claimed
+    try:
+        log(video_id, f"Downloading video ID: {video_id}")
+        progress.emit(video_id, "start")
+        metrics.item_started(video_id)
+
+        # Reuse metadata from the listing pass or the metadata cache, so the
+        # video page is not resolved again while its formats are fresh
+        engine = engine or SubprocessEngine()
+        info = cached_info(video_id, info)
+        if needs_info(history, video_id, info):
+            info = resolve_info(engine, video_id, info)
+
+        # Reuse a copy already in the media store before downloading;
+        # only verified files are added to the history
+        stem = reserve_output(history, video_id, info)
+        result = reuse_stored(get_store(), history, video_id, "mp4", OUTPUT_FOLDER, stem, (info or {}).get("duration"))
+        if result is None:
+            result = fetch_video(video_id, info, engine, limiter, profile, probe)
+        return video_finished(video_id, result)
+    finally:
+        # Also when something above raised, so other runs are not kept waiting on the video
+        history.release(video_id)
+
+def download_videos(url, jobs=DEFAULT_JOBS, single_pass=False, engine=DEFAULT_ENGINE,
+                    limit_rate=None, rate_config=DEFAULT_RATE_CONFIG, sync=False,
+                    profile=DEFAULT_PROFILE, probe=False, layout=None):
+    """Download videos from URL (works with single videos or playlists).
+
+    layout, if given, switches the output folder to that layout.py layout
+    for this and later runs.
+
+    Returns {video ID: result or None} for the videos that were not
+    downloaded before, or None if the URL could not be listed.
+    """
     # First, get video IDs without downloading
-    print("Checking for videos to download...")
-    info_command = [
-        YT_DLP_PATH,
-        "--flat-playlist",
-        "--get-id",
-        url
-    ]
-    
-    result = subprocess.run(info_command, capture_output=True, text=True)
-    video_ids = result.stdout.strip().split('\n')
-    video_ids = [vid for vid in video_ids if vid.strip()]  # Filter out empty lines
-    
-    # Get already downloaded videos
-    downloaded_ids = get_downloaded_video_ids()
+    echo("Checking for videos to download...")
+    engine = make_engine(engine)
+    limiter = make_limiter(url, limit_rate, rate_config, jobs)
+    history = get_history()
+    if layout:
+        set_layout(history, layout)
+    with metrics.timed(url, "listing"):
+        entries = list_source(engine, history, url, full=single_pass, sync=sync)
+    if entries is None:
+        echo(f"No videos found for {url}")
+        engine.close()
+        return None
     
     # Filter out videos that have already been downloaded
-    new_videos = [vid for vid in video_ids if vid not in downloaded_ids]
+    new_videos = queue_new(history, entries)
     
     if not new_videos:
-        print("Already video downloaded, so dont download!")
-        return
+        echo("Already video downloaded, so dont download!")
+        engine.close()
+        return {}
     
-    print(f"Found {len(new_videos)} new video(s) to download")
+    echo(f"Found {len(new_videos)} new video(s) to download")
     
-    # Download new videos
-    for video_id in new_videos:
-        video_url = f"https://www.youtube.com/watch?v={video_id}"
-        print(f"Downloading video ID: {video_id}")
-        
-        command = [
-            YT_DLP_PATH,
-            "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-            "--merge-output-format", "mp4",
-            "--output", os.path.join(OUTPUT_FOLDER, "%(title)s.%(ext)s"),
-            "--sleep-interval", "3",
-            "--limit-rate", "2M",
-            video_url
-        ]
-        
-        subprocess.run(command)
-        
-        # Add to download history
-        add_video_to_history(video_id)
-        print(f"Video {video_id} downloaded and added to history")
+    # Download new videos, up to `jobs` at a time; videos another run on the
+    # same folder is downloading are left to it and checked on at the end
+    progress.emit("queue", "queue", items=new_videos)
+    try:
+        results = run_claimed(history, new_videos, lambda video_ids: run_jobs(
+            video_ids,
+            lambda video_id: download_video(video_id, entries[video_id], engine, limiter, profile, probe),
+            jobs
+        ))
+    finally:
+        engine.close()
+    return dict(zip(new_videos, results))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="YouTube Video Downloader")
+    parser.add_argument("url", nargs="?", help="YouTube URL (video or playlist); prompted for if omitted")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS,
+                        help=f"number of videos to download at once (default: {DEFAULT_JOBS})")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="extract all metadata in one yt-dlp call and reuse it for each download")
+    parser.add_argument("--engine", choices=ENGINES, default=DEFAULT_ENGINE,
+                        help="run yt-dlp as a subprocess per video or in-process with one reused instance")
+    parser.add_argument("--profile", choices=sorted(get_profiles()), default=DEFAULT_PROFILE,
+                        help=f"quality profile that decides the format of each video (default: {DEFAULT_PROFILE})")
+    parser.add_argument("--probe-formats", action="store_true",
+                        help="probe each video's formats before downloading it when they are not cached yet")
+    parser.add_argument("--layout", choices=LAYOUTS,
+                        help="arrange the folder flat, by channel, by year/month or in ID-prefix subfolders; "
+                             "remembered for later runs (default: flat)")
+    parser.add_argument("--sync", action="store_true",
+                        help="remember the listing of the URL and on later runs only fetch new uploads")
+    parser.add_argument("--limit-rate", metavar="RATE",
+                        help="total bandwidth budget shared by all jobs, e.g. 2M (default: no limit)")
+    parser.add_argument("--rate-config", metavar="FILE", default=DEFAULT_RATE_CONFIG,
+                        help=f"per-domain/per-channel rate limit settings (default: {DEFAULT_RATE_CONFIG})")
+    parser.add_argument("--progress-json", action="store_true",
+                        help="print machine-readable progress event lines for a front end reading the output")
+    parser.add_argument("--metrics-log", metavar="FILE",
+                        help="append per-item stage timings, bytes and retries to FILE as JSON lines")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics at http://127.0.0.1:PORT/metrics while downloading")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.progress_json:
+        progress.enable()
+    try:
+        metrics.start(args.metrics_log, args.metrics_port)
+    except OSError as e:
+        print(f"Error starting metrics: {e}")
+        sys.exit(1)
+    
     print("YouTube Video Downloader")
     print("=" * 50)
     print(f"Videos will be saved to: {OUTPUT_FOLDER}")
     
-    url = input("Enter YouTube URL (video or playlist): ")
+    url = args.url or input("Enter YouTube URL (video or playlist): ")
     
     if not url.strip():
         print("No URL provided. Exiting.")
         return
     
     print("\nStarting download process...")
-    download_videos(url)
+    try:
+        download_videos(url, args.jobs, args.single_pass, args.engine, args.limit_rate, args.rate_config, args.sync,
+                        args.profile, args.probe_formats, args.layout)
+    except ToolNotFound as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     print("\nDownload process completed!")
 
 if __name__ == "__main__":
@@ -1,9 +1,5 @@
 import sys
-import os
 from PySide6.QtWidgets import QApplication
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QIcon
-from main_window import MainWindow
 
 def main():
     """Main application entry point"""
@@ -20,7 +16,8 @@ def main():
     # High DPI pixmaps are enabled by default in PySide6; the following line is not necessary and can be removed.
     # app.setAttribute(Qt.ApplicationAttribute.AA_UseHighDpiPixmaps, True)
     
-    # Create and show main window
+    # Create and show main window; its modules load only now that the application exists
+    from main_window import MainWindow
     window = MainWindow()
     window.show()
     
@@ -0,0 +1,10 @@
+import os
+from PySide6.QtCore import QStandardPaths
+
+def get_data_dir():
+    """Return the folder for the app's logs and saved state, creating it if needed"""
+    data_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppLocalDataLocation)
+    if not data_dir:
+        data_dir = os.path.join(os.path.expanduser("~"), ".youtube_downloader")
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
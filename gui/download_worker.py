@@ -1,76 +1,143 @@
-import sys
-import os
-import subprocess
-from PyQt6.QtCore import QThread, pyqtSignal
+import threading
+import time
+from concurrent.futures import CancelledError
+from PySide6.QtCore import QObject, Signal as pyqtSignal
 
-class DownloadWorker(QThread):
+from downloadall.config import lazy
+from downloadall.orchestrator import Orchestrator
+
+# A yt-dlp or ffmpeg process running longer than this is stopped and its attempt retried, in seconds
+PROCESS_TIMEOUT = 60 * 60
+
+# An item not finished this long after it started, retries included, is given up on, in seconds
+ITEM_TIMEOUT = 4 * 60 * 60
+
+# One event loop thread runs the downloads of every queued job
+get_orchestrator = lazy(lambda: Orchestrator(timeout=PROCESS_TIMEOUT, item_timeout=ITEM_TIMEOUT))
+
+# Minimum time between progress updates sent to the UI, in seconds
+PROGRESS_INTERVAL = 0.1
+
+class ProgressTracker:
+    """Folds backend progress events into per-item and overall progress"""
+    
+    def __init__(self):
+        self.items = []
+        self.finished = set()
+        self.fractions = {}
+        self.current = None
+        self.speed = None
+        self.eta = None
+        
+    def update(self, event):
+        """Apply an event; returns True if it changes which items are running or done"""
+        if event.event == "queue":
+            self.items = list(event.items or [])
+            return True
+        if event.event == "start":
+            self.current = event.video_id
+            self.fractions[event.video_id] = 0.0
+            return True
+        if event.event in ("done", "error"):
+            self.finished.add(event.video_id)
+            self.fractions[event.video_id] = 1.0
+            return True
+        if event.event == "progress":
+            self.current = event.video_id
+            if event.total_bytes and event.downloaded_bytes is not None:
+                self.fractions[event.video_id] = min(1.0, event.downloaded_bytes / event.total_bytes)
+            self.speed = event.speed
+            self.eta = event.eta
+        return False
+        
+    def snapshot(self):
+        """Return the current state as a plain dict for the UI thread"""
+        total = len(self.items)
+        overall = sum(self.fractions.get(vid, 0.0) for vid in self.items) / total if total else None
+        return {
+            "total": total,
+            "finished": len(self.finished),
+            "index": self.items.index(self.current) + 1 if self.current in self.items else None,
+            "video_id": self.current,
+            "item_fraction": self.fractions.get(self.current),
+            "overall_fraction": overall,
+            "speed": self.speed,
+            "eta": self.eta,
+        }
+
+class DownloadWorker(QObject):
+    """Runs one download job on the shared orchestrator and reports it through signals"""
+    
     output_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(object)
     finished_signal = pyqtSignal(bool, str)
     error_signal = pyqtSignal(str)
+    # Emitted last, once nothing of the job is running any more
+    finished = pyqtSignal()
     
     def __init__(self, url, download_type):
         super().__init__()
         self.url = url
         self.download_type = download_type
+        self.stopped = False
+        self.job = None
+        self.tracker = ProgressTracker()
+        self.tracker_lock = threading.Lock()
+        self.last_progress = 0.0
         
-    def run(self):
-        """Run the download process"""
-        try:
-            # Determine which backend script to run
-            if self.download_type == "video":
-                script_path = os.path.join("downloadall", "video.py")
-                success_message = "Video download completed successfully!"
-            else:  # audio
-                script_path = os.path.join("downloadall", "audio_only.py")
-                success_message = "Audio download completed successfully!"
-            
-            # Check if script exists
-            if not os.path.exists(script_path):
-                self.error_signal.emit(f"Backend script not found: {script_path}")
-                return
-                
-            self.output_signal.emit(f"Starting {self.download_type} download...")
-            self.output_signal.emit(f"URL: {self.url}")
-            self.output_signal.emit("-" * 50)
-            
-            # Create process to run the backend script
-            process = subprocess.Popen(
-                [sys.executable, script_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
-            )
-            
-            # Send URL to the script, if stdin is available
-            if process.stdin:
-                process.stdin.write(self.url + '\n')
-                process.stdin.flush()
-                process.stdin.close()
-            else:
-                self.error_signal.emit("Failed to open stdin for the subprocess.")
-                return
+    def start(self):
+        """Submit the download job"""
+        self.output_signal.emit(f"Starting {self.download_type} download...")
+        self.output_signal.emit(f"URL: {self.url}")
+        self.output_signal.emit("-" * 50)
+        self.job = get_orchestrator().submit(self.url, self.download_type,
+                                             on_output=self.output_signal.emit, on_event=self.on_event)
+        self.job.add_done_callback(self.on_done)
+        
+    def stop(self):
+        """Stop the download, including the yt-dlp processes it started"""
+        self.stopped = True
+        if self.job is not None:
+            self.job.cancel()
             
-            # Read output line by line
-            if process.stdout is not None:
-                while True:
-                    output = process.stdout.readline()
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        self.output_signal.emit(output.strip())
-            else:
-                self.error_signal.emit("Failed to open stdout for the subprocess.")
+    def wait(self):
+        """Block until the job is over"""
+        if self.job is not None:
+            try:
+                self.job.result()
+            except (Exception, CancelledError):
+                pass
+        
+    def on_event(self, event):
+        """Fold a backend progress event into coalesced progress updates"""
+        # Events arrive from the orchestrator thread and its helper threads
+        with self.tracker_lock:
+            changed = self.tracker.update(event)
+            now = time.monotonic()
+            if not changed and now - self.last_progress < PROGRESS_INTERVAL:
                 return
+            self.last_progress = now
+            state = self.tracker.snapshot()
+        self.progress_signal.emit(state)
             
-            # Wait for process to complete
-            return_code = process.wait()
+    def on_done(self, job):
+        """Report how the job ended"""
+        try:
+            result = job.result()
             
-            if return_code == 0:
-                self.finished_signal.emit(True, success_message)
+            if self.stopped or result.cancelled:
+                self.finished_signal.emit(False, "Download stopped")
+            elif not result.listed:
+                self.finished_signal.emit(False, "No videos found at this URL")
+            elif result.failed:
+                self.finished_signal.emit(False, f"{len(result.failed)} item(s) failed to download")
+            elif self.download_type == "video":
+                self.finished_signal.emit(True, "Video download completed successfully!")
             else:
-                self.finished_signal.emit(False, f"Download failed with return code: {return_code}")
+                self.finished_signal.emit(True, "Audio download completed successfully!")
                 
+        except CancelledError:
+            self.finished_signal.emit(False, "Download stopped")
         except Exception as e:
-            self.error_signal.emit(str(e))
\ No newline at end of file
+            self.error_signal.emit(str(e))
+        self.finished.emit()
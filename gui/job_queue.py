@@ -0,0 +1,247 @@
+import os
+import json
+from PySide6.QtCore import QObject, Signal as pyqtSignal
+from app_data import get_data_dir
+
+# Number of downloads run at the same time unless the user changes it
+DEFAULT_MAX_WORKERS = 2
+
+# Job states. Running jobs are saved as queued so they restart after a relaunch.
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+def get_queue_file_path():
+    """Return the path of the saved download queue"""
+    return os.path.join(get_data_dir(), "queue.json")
+
+class Job:
+    """A single URL waiting in, or handled by, the download queue"""
+
+    def __init__(self, job_id, url, download_type, status=QUEUED, message=""):
+        self.job_id = job_id
+        self.url = url
+        self.download_type = download_type
+        self.status = status
+        self.message = message
+        self.progress = None
+        self.worker = None
+
+    def to_dict(self):
+        status = QUEUED if self.status == RUNNING else self.status
+        return {
+            "job_id": self.job_id,
+            "url": self.url,
+            "download_type": self.download_type,
+            "status": status,
+            "message": self.message,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        status = data.get("status", QUEUED)
+        return cls(data["job_id"], data["url"], data["download_type"],
+                   QUEUED if status == RUNNING else status, data.get("message", ""))
+
+class JobQueue(QObject):
+    """Ordered download queue that runs up to max_workers DownloadWorkers at once.
+
+    The queue is saved to disk after every change, so pending jobs (and jobs
+    interrupted by closing the app) are picked up again on the next start.
+    Pausing stops the job's processes; resuming restarts it, and the backend
+    skips items already in its history while yt-dlp continues .part files.
+    """
+
+    changed = pyqtSignal()
+    job_output = pyqtSignal(object, str)
+    job_progress = pyqtSignal(object, object)
+    job_finished = pyqtSignal(object, bool, str)
+    idle = pyqtSignal()
+
+    def __init__(self, path=None, parent=None):
+        super().__init__(parent)
+        self.path = path or get_queue_file_path()
+        self.jobs = []
+        self.max_workers = DEFAULT_MAX_WORKERS
+        self.next_id = 1
+        self.worker_jobs = {}
+        self.stopping = False
+
+    def load(self):
+        """Load the saved queue, if any"""
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        self.jobs = [Job.from_dict(item) for item in data.get("jobs", [])]
+        self.max_workers = data.get("max_workers", DEFAULT_MAX_WORKERS)
+        self.next_id = max([job.job_id for job in self.jobs] + [0]) + 1
+        self.changed.emit()
+
+    def save(self):
+        """Write the queue to disk atomically"""
+        data = {
+            "max_workers": self.max_workers,
+            "jobs": [job.to_dict() for job in self.jobs],
+        }
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def get(self, job_id):
+        for job in self.jobs:
+            if job.job_id == job_id:
+                return job
+        return None
+
+    def running_jobs(self):
+        return [job for job in self.jobs if job.status == RUNNING]
+
+    def add(self, url, download_type):
+        """Queue a URL and start it if a worker slot is free"""
+        job = Job(self.next_id, url, download_type)
+        self.next_id += 1
+        self.jobs.append(job)
+        self._changed()
+        return job
+
+    def set_max_workers(self, max_workers):
+        self.max_workers = max(1, max_workers)
+        self._changed()
+
+    def pause(self, job):
+        """Stop a queued or running job without forgetting it"""
+        if job.status == RUNNING:
+            job.status = PAUSED
+            job.worker.stop()
+        elif job.status == QUEUED:
+            job.status = PAUSED
+        self._changed()
+
+    def resume(self, job):
+        """Put a paused, failed or cancelled job back in the queue"""
+        if job.status in (PAUSED, FAILED, CANCELLED):
+            job.status = QUEUED
+            job.message = ""
+            job.progress = None
+            self._changed()
+
+    def cancel(self, job):
+        """Stop a job for good"""
+        if job.status == RUNNING:
+            job.status = CANCELLED
+            job.worker.stop()
+        elif job.status not in FINISHED_STATES:
+            job.status = CANCELLED
+        self._changed()
+
+    def remove(self, job):
+        """Drop a job from the queue, stopping it first if needed"""
+        if job.status == RUNNING:
+            job.status = CANCELLED
+            job.worker.stop()
+        self.jobs.remove(job)
+        self._changed()
+
+    def move(self, job, offset):
+        """Move a job up (negative offset) or down in the queue order"""
+        index = self.jobs.index(job)
+        new_index = max(0, min(len(self.jobs) - 1, index + offset))
+        if new_index != index:
+            self.jobs.insert(new_index, self.jobs.pop(index))
+            self._changed()
+
+    def shutdown(self):
+        """Stop all running jobs so they resume on the next start"""
+        self.stopping = True
+        workers = [job.worker for job in self.running_jobs()]
+        for job in self.running_jobs():
+            job.status = QUEUED
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.wait()
+        self.save()
+
+    def _changed(self):
+        self.save()
+        self.schedule()
+        self.changed.emit()
+
+    def schedule(self):
+        """Start queued jobs in order while worker slots are free"""
+        if self.stopping:
+            return
+        free_slots = self.max_workers - len(self.running_jobs())
+        for job in self.jobs:
+            if free_slots <= 0:
+                break
+            if job.status == QUEUED:
+                self._start(job)
+                free_slots -= 1
+
+    def _start(self, job):
+        # Imported with the first job, so the window shows before the backend modules load
+        from download_worker import DownloadWorker
+
+        job.status = RUNNING
+        job.message = ""
+        worker = job.worker = DownloadWorker(job.url, job.download_type)
+        self.worker_jobs[worker] = job
+        # Bound slots (not lambdas) so the signals are delivered on the GUI thread
+        worker.output_signal.connect(self._on_output)
+        worker.progress_signal.connect(self._on_progress)
+        worker.finished_signal.connect(self._on_finished)
+        worker.error_signal.connect(self._on_error)
+        worker.finished.connect(self._on_thread_finished)
+        worker.start()
+
+    def _sender_job(self):
+        return self.worker_jobs.get(self.sender())
+
+    def _on_output(self, text):
+        job = self._sender_job()
+        if job is not None:
+            self.job_output.emit(job, text)
+
+    def _on_progress(self, state):
+        job = self._sender_job()
+        if job is not None:
+            job.progress = state
+            self.job_progress.emit(job, state)
+
+    def _on_error(self, message):
+        self._on_finished(False, f"Error: {message}")
+
+    def _on_thread_finished(self):
+        # Only let go of the worker once its job has really ended
+        worker = self.sender()
+        self.worker_jobs.pop(worker, None)
+        worker.deleteLater()
+
+    def _on_finished(self, success, message):
+        job = self._sender_job()
+        if job is None or job.worker is None:
+            return
+
+        job.worker = None
+        # Paused and cancelled jobs keep the state the user chose
+        if job.status == RUNNING:
+            job.status = DONE if success else FAILED
+            job.message = message
+            self.job_finished.emit(job, success, message)
+
+        self._changed()
+        if not self.running_jobs() and not any(job.status == QUEUED for job in self.jobs):
+            self.idle.emit()
@@ -0,0 +1,83 @@
+import os
+import logging
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from PySide6.QtWidgets import QPlainTextEdit
+from PySide6.QtCore import QTimer
+from app_data import get_data_dir
+
+# Most lines kept in the output pane; older lines are dropped from view
+LOG_MAX_LINES = 2000
+
+# How often pending lines are pushed into the widget, in milliseconds
+LOG_FLUSH_INTERVAL_MS = 100
+
+# Size and number of rotated log files kept on disk
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+def get_log_file_path():
+    """Return the path of the GUI log file"""
+    return os.path.join(get_data_dir(), "download.log")
+
+def create_file_logger(path):
+    """Create a logger that writes plain lines to a rotating log file"""
+    logger = logging.getLogger("youtube_downloader.output")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes=LOG_FILE_MAX_BYTES,
+                                      backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+class LogView(QPlainTextEdit):
+    """Read-only log pane that keeps a bounded number of lines.
+
+    Lines are collected in a ring buffer and appended to the widget in one
+    batch per timer tick, while every line is also streamed to a rotating log
+    file so the full output survives without being held in memory.
+    """
+
+    def __init__(self, max_lines=LOG_MAX_LINES, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+        self.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+
+        self.pending = deque(maxlen=max_lines)
+        self.log_file_path = get_log_file_path()
+        self.file_logger = create_file_logger(self.log_file_path)
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def append_line(self, text):
+        """Queue a line for display and write it to the log file"""
+        self.pending.append(text)
+        self.file_logger.info(text)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        """Append all pending lines to the widget at once"""
+        if not self.pending:
+            return
+
+        scroll_bar = self.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 4
+
+        self.appendPlainText("\n".join(self.pending))
+        self.pending.clear()
+
+        # Only follow the output if the user has not scrolled up to read something
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def clear(self):
+        """Clear the pane and any lines not yet shown"""
+        self.pending.clear()
+        super().clear()
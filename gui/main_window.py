@@ -1,31 +1,52 @@
-import sys
 import os
-from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                            QHBoxLayout, QLabel, QLineEdit, QPushButton, 
-                            QTextEdit, QTabWidget, QFrame, QProgressBar,
-                            QMessageBox, QFileDialog)
-from PySide6.QtCore import Qt, QThread, Signal as pyqtSignal, QTimer
-from PySide6.QtGui import QFont, QIcon, QPalette, QColor
-# Make sure download_worker.py exists in the same directory as this file.
-# If it's in a subfolder (e.g., 'workers'), use: from workers.download_worker import DownloadWorker
-from download_worker import DownloadWorker
+from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout,
+                            QHBoxLayout, QLabel, QLineEdit, QPushButton,
+                            QTabWidget, QFrame, QProgressBar,
+                            QMessageBox, QTableWidget,
+                            QTableWidgetItem, QHeaderView, QAbstractItemView,
+                            QSpinBox)
+from PySide6.QtCore import Qt, QTimer
+from job_queue import JobQueue, RUNNING
+from log_view import LogView
 import platform
 
+# Resolution of the progress bars
+PROGRESS_STEPS = 1000
+
+# Columns of the download queue table
+QUEUE_COLUMNS = ["#", "Type", "URL", "Status", "Progress"]
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("YouTube Downloader")
-        self.setGeometry(100, 100, 800, 600)
-        self.setMinimumSize(700, 500)
+        self.setGeometry(100, 100, 900, 760)
+        self.setMinimumSize(750, 600)
         
         # Set application style
         self.setStyleSheet(self.get_stylesheet())
         
+        # Persistent download queue
+        self.job_queue = JobQueue(parent=self)
+        
         # Initialize UI
         self.init_ui()
         
-        # Download worker thread
-        self.download_worker = None
+        self.job_queue.changed.connect(self.refresh_queue_table)
+        self.job_queue.job_output.connect(self.job_output)
+        self.job_queue.job_progress.connect(self.job_progress)
+        self.job_queue.job_finished.connect(self.download_finished)
+        self.job_queue.idle.connect(self.hide_progress)
+        
+        # Restored once the event loop runs, so the window is painted first
+        QTimer.singleShot(0, self.restore_session)
+        
+    def restore_session(self):
+        """Pick up jobs left over from the last session"""
+        self.job_queue.load()
+        self.parallel_spin.setValue(self.job_queue.max_workers)
+        self.job_queue.schedule()
+        self.refresh_queue_table()
         
     def init_ui(self):
         """Initialize the user interface"""
@@ -57,19 +78,77 @@ class MainWindow(QMainWindow):
         
         main_layout.addWidget(self.tab_widget)
         
-        # Progress bar
+        # Download queue
+        main_layout.addWidget(self.create_queue_section())
+        
+        # Progress bars: overall playlist progress and the item currently downloading
+        self.progress_label = QLabel()
+        self.progress_label.setObjectName("progressLabel")
+        self.progress_label.setVisible(False)
+        main_layout.addWidget(self.progress_label)
+        
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
         self.progress_bar.setObjectName("progressBar")
         main_layout.addWidget(self.progress_bar)
         
+        self.item_progress_bar = QProgressBar()
+        self.item_progress_bar.setVisible(False)
+        self.item_progress_bar.setObjectName("progressBar")
+        self.item_progress_bar.setTextVisible(False)
+        main_layout.addWidget(self.item_progress_bar)
+        
         # Status/Output area
-        self.output_text = QTextEdit()
+        self.output_text = LogView()
         self.output_text.setObjectName("outputText")
         self.output_text.setMaximumHeight(200)
         self.output_text.setPlaceholderText("Download status and messages will appear here...")
         main_layout.addWidget(self.output_text)
         
+    def create_queue_section(self):
+        """Create the download queue table and its controls"""
+        frame = QFrame()
+        layout = QVBoxLayout(frame)
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.queue_table = QTableWidget(0, len(QUEUE_COLUMNS))
+        self.queue_table.setObjectName("queueTable")
+        self.queue_table.setHorizontalHeaderLabels(QUEUE_COLUMNS)
+        self.queue_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.queue_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.queue_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.queue_table.verticalHeader().setVisible(False)
+        header = self.queue_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+        self.queue_table.setMaximumHeight(180)
+        layout.addWidget(self.queue_table)
+        
+        button_layout = QHBoxLayout()
+        for text, slot in (("⏸ Pause", self.pause_selected_job),
+                           ("▶ Resume", self.resume_selected_job),
+                           ("✖ Cancel", self.cancel_selected_job),
+                           ("▲ Up", lambda: self.move_selected_job(-1)),
+                           ("▼ Down", lambda: self.move_selected_job(1)),
+                           ("🗑 Remove", self.remove_selected_job)):
+            button = QPushButton(text)
+            button.setObjectName("queueButton")
+            button.clicked.connect(slot)
+            button_layout.addWidget(button)
+        button_layout.addStretch()
+        
+        parallel_label = QLabel("Parallel downloads:")
+        parallel_label.setObjectName("infoLabel")
+        self.parallel_spin = QSpinBox()
+        self.parallel_spin.setRange(1, 8)
+        self.parallel_spin.setValue(self.job_queue.max_workers)
+        self.parallel_spin.valueChanged.connect(self.job_queue.set_max_workers)
+        button_layout.addWidget(parallel_label)
+        button_layout.addWidget(self.parallel_spin)
+        
+        layout.addLayout(button_layout)
+        return frame
+        
     def create_video_tab(self):
         """Create the video download tab"""
         tab = QWidget()
@@ -183,55 +262,156 @@ class MainWindow(QMainWindow):
         self.start_download(url, "audio")
         
     def start_download(self, url, download_type):
-        """Start the download process in a separate thread"""
-        if self.download_worker and self.download_worker.isRunning():
-            QMessageBox.information(self, "Info", "A download is already in progress. Please wait...")
-            return
-            
-        # Clear output and show progress
-        self.output_text.clear()
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)  # Indeterminate progress
-        
-        # Disable download buttons
-        self.video_download_btn.setEnabled(False)
-        self.audio_download_btn.setEnabled(False)
-        
-        # Create and start worker thread
-        self.download_worker = DownloadWorker(url, download_type)
-        self.download_worker.output_signal.connect(self.update_output)
-        self.download_worker.finished_signal.connect(self.download_finished)
-        self.download_worker.error_signal.connect(self.download_error)
-        self.download_worker.start()
+        """Add a download to the queue; it starts as soon as a worker slot is free"""
+        job = self.job_queue.add(url, download_type)
+        self.update_output(f"Queued #{job.job_id} ({download_type}): {url}")
         
+        if job.status == RUNNING:
+            self.progress_bar.setVisible(True)
+            self.progress_bar.setRange(0, 0)  # Indeterminate until the backend reports the queue
+            
     def update_output(self, text):
         """Update the output text area"""
-        self.output_text.append(text)
-        scroll_bar = self.output_text.verticalScrollBar()
-        if scroll_bar is not None:
-            scroll_bar.setValue(scroll_bar.maximum())
+        self.output_text.append_line(text)
+        
+    def job_output(self, job, text):
+        """Show a line of output from a queued job"""
+        self.update_output(f"#{job.job_id} {text}")
+        
+    def job_progress(self, job, state):
+        """Update a job's table row, and the progress bars if it is the focused job"""
+        row = self.queue_row(job)
+        if row is not None:
+            self.queue_table.setItem(row, 4, QTableWidgetItem(self.format_job_progress(state)))
+        if job is self.focused_job():
+            self.update_progress(state)
+            
+    def focused_job(self):
+        """Return the job the progress bars follow: the selected one if running, else the first running"""
+        selected = self.selected_job()
+        if selected is not None and selected.status == RUNNING:
+            return selected
+        running = self.job_queue.running_jobs()
+        return running[0] if running else None
+        
+    def update_progress(self, state):
+        """Update the progress bars from a backend progress snapshot"""
+        if not state["total"]:
+            return
+            
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, PROGRESS_STEPS)
+        self.progress_bar.setValue(int((state["overall_fraction"] or 0) * PROGRESS_STEPS))
+        self.progress_bar.setFormat(f"{state['finished']} of {state['total']} done")
         
-    def download_finished(self, success, message):
-        """Handle download completion"""
+        if state["video_id"] is None:
+            return
+            
+        self.item_progress_bar.setVisible(True)
+        if state["item_fraction"] is None:
+            self.item_progress_bar.setRange(0, 0)
+        else:
+            self.item_progress_bar.setRange(0, PROGRESS_STEPS)
+            self.item_progress_bar.setValue(int(state["item_fraction"] * PROGRESS_STEPS))
+            
+        details = [f"Item {state['index'] or '?'}/{state['total']}: {state['video_id']}"]
+        if state["item_fraction"] is not None:
+            details.append(f"{state['item_fraction'] * 100:.0f}%")
+        if state["speed"]:
+            details.append(f"{self.format_size(state['speed'])}/s")
+        if state["eta"] is not None:
+            details.append(f"ETA {int(state['eta']) // 60}:{int(state['eta']) % 60:02d}")
+        self.progress_label.setText("  ·  ".join(details))
+        self.progress_label.setVisible(True)
+        
+    def format_job_progress(self, state):
+        """Summarize a progress snapshot for the queue table"""
+        if not state or not state["total"]:
+            return ""
+        return f"{state['finished']}/{state['total']} items, {(state['overall_fraction'] or 0) * 100:.0f}%"
+        
+    def refresh_queue_table(self):
+        """Rebuild the queue table from the job list, keeping the selection"""
+        selected = self.selected_job()
+        self.queue_table.setRowCount(len(self.job_queue.jobs))
+        for row, job in enumerate(self.job_queue.jobs):
+            values = [f"{job.job_id}", job.download_type, job.url,
+                      job.message or job.status, self.format_job_progress(job.progress)]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setData(Qt.ItemDataRole.UserRole, job.job_id)
+                self.queue_table.setItem(row, column, item)
+            if job is selected:
+                self.queue_table.selectRow(row)
+                
+    def queue_row(self, job):
+        """Return the table row showing a job, or None"""
+        for row in range(self.queue_table.rowCount()):
+            item = self.queue_table.item(row, 0)
+            if item is not None and item.data(Qt.ItemDataRole.UserRole) == job.job_id:
+                return row
+        return None
+        
+    def selected_job(self):
+        """Return the job selected in the queue table, or None"""
+        rows = self.queue_table.selectionModel().selectedRows()
+        if not rows:
+            return None
+        item = self.queue_table.item(rows[0].row(), 0)
+        return self.job_queue.get(item.data(Qt.ItemDataRole.UserRole)) if item else None
+        
+    def pause_selected_job(self):
+        job = self.selected_job()
+        if job is not None:
+            self.job_queue.pause(job)
+            
+    def resume_selected_job(self):
+        job = self.selected_job()
+        if job is not None:
+            self.job_queue.resume(job)
+            
+    def cancel_selected_job(self):
+        job = self.selected_job()
+        if job is not None:
+            self.job_queue.cancel(job)
+            
+    def move_selected_job(self, offset):
+        job = self.selected_job()
+        if job is not None:
+            self.job_queue.move(job, offset)
+            
+    def remove_selected_job(self):
+        job = self.selected_job()
+        if job is not None:
+            self.job_queue.remove(job)
+            
+    def format_size(self, size):
+        """Format a byte count for display"""
+        for unit in ("B", "KiB", "MiB", "GiB"):
+            if size < 1024 or unit == "GiB":
+                return f"{size:.1f} {unit}"
+            size /= 1024
+        
+    def hide_progress(self):
+        """Hide all progress widgets"""
         self.progress_bar.setVisible(False)
-        self.video_download_btn.setEnabled(True)
-        self.audio_download_btn.setEnabled(True)
+        self.item_progress_bar.setVisible(False)
+        self.progress_label.setVisible(False)
         
+    def download_finished(self, job, success, message):
+        """Handle completion of a queued job"""
         if success:
-            self.update_output(f"✅ {message}")
-            QMessageBox.information(self, "Success", message)
+            self.update_output(f"✅ #{job.job_id} {message}")
         else:
-            self.update_output(f"❌ {message}")
-            QMessageBox.warning(self, "Download Failed", message)
+            self.update_output(f"❌ #{job.job_id} {message}")
             
-    def download_error(self, error_message):
-        """Handle download errors"""
-        self.progress_bar.setVisible(False)
-        self.video_download_btn.setEnabled(True)
-        self.audio_download_btn.setEnabled(True)
-        
-        self.update_output(f"❌ Error: {error_message}")
-        QMessageBox.critical(self, "Error", f"An error occurred:\n{error_message}")
+        if not self.job_queue.running_jobs():
+            self.hide_progress()
+            
+    def closeEvent(self, event):
+        """Stop running jobs so they resume on the next start"""
+        self.job_queue.shutdown()
+        super().closeEvent(event)
         
     def open_videos_folder(self):
         """Open the videos download folder"""
@@ -383,6 +563,29 @@ class MainWindow(QMainWindow):
             background-color: #21618c;
         }
         
+        #progressLabel {
+            color: #2c3e50;
+            font-size: 12px;
+        }
+        
+        #queueButton {
+            background-color: #ecf0f1;
+            color: #2c3e50;
+            border: 1px solid #bdc3c7;
+            padding: 6px 12px;
+            border-radius: 6px;
+        }
+        
+        #queueButton:hover {
+            background-color: #bdc3c7;
+        }
+        
+        #queueTable {
+            background-color: white;
+            border: 1px solid #ddd;
+            border-radius: 8px;
+        }
+        
         #infoLabel {
             color: #7f8c8d;
             font-size: 12px;
@@ -7,7 +7,7 @@ Run this file to start the desktop application
 import sys
 import os
 
-# Add the gui directory to Python path
+# Add the gui directory to Python path; the downloadall package is found next to this file
 gui_path = os.path.join(os.path.dirname(__file__), 'gui')
 sys.path.insert(0, gui_path)
 
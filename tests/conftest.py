@@ -0,0 +1,62 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+DATA_DIR = os.path.join(TESTS_DIR, "data")
+PLAYLIST_FILE = os.path.join(DATA_DIR, "playlist.json")
+
+# The tests import the backends as the downloadall package, as the GUI does
+sys.path.insert(0, REPO_DIR)
+
+from downloadall.history import HistoryStore
+
+class FakeYtDlp:
+    """The fake yt-dlp executable of a test and the launches it recorded"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "yt-dlp")
+        self.log = os.path.join(directory, "launches.jsonl")
+        with open(os.path.join(TESTS_DIR, "fake_yt_dlp.py"), 'r', encoding='utf-8') as f:
+            source = f.read()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(f"#!{sys.executable}\n{source}")
+        os.chmod(self.path, os.stat(self.path).st_mode | stat.S_IEXEC)
+
+    def env(self, home):
+        """Environment for a downloader process that uses this fake and keeps its files under home"""
+        return dict(os.environ, HOME=home, USERPROFILE=home, YT_DLP_PATH=self.path,
+                    FAKE_YT_DLP_DATA=PLAYLIST_FILE, FAKE_YT_DLP_LOG=self.log)
+
+    def launches(self):
+        """The arguments of every launch so far, in order"""
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+@pytest.fixture
+def fake_yt_dlp(tmp_path, monkeypatch):
+    """A fake yt-dlp that answers from data/playlist.json; also set up for engines created in the test"""
+    if os.name == "nt":
+        pytest.skip("the fake yt-dlp is a script with a shebang line")
+    fake = FakeYtDlp(str(tmp_path))
+    monkeypatch.setenv("FAKE_YT_DLP_DATA", PLAYLIST_FILE)
+    monkeypatch.setenv("FAKE_YT_DLP_LOG", fake.log)
+    return fake
+
+@pytest.fixture
+def playlist():
+    """The canned playlist the fake yt-dlp serves"""
+    with open(PLAYLIST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
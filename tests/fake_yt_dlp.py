@@ -0,0 +1,92 @@
+"""
+Stand-in for the yt-dlp executable that answers from canned JSON.
+
+Understands just enough of the command line the downloaders build:
+
+    -J [--flat-playlist] <playlist URL>
+        prints the playlist in $FAKE_YT_DLP_DATA; with --flat-playlist its
+        entries are cut down to what YouTube lists: ID, title and URL
+    -J <watch URL>
+        prints the full entry of that video
+    [options] (--load-info-json FILE | <watch URL>)
+        writes a small file to --output and the finished file's details to
+        every --print-to-file target; with $FAKE_YT_DLP_SECONDS set, each
+        download takes that long
+
+Every launch appends its arguments as a JSON line to $FAKE_YT_DLP_LOG.
+"""
+
+import json
+import os
+import sys
+import time
+
+def option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+def load_playlist():
+    with open(os.environ["FAKE_YT_DLP_DATA"], 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def flat_entry(entry):
+    return {"_type": "url", "ie_key": "Youtube", "id": entry["id"], "title": entry["title"],
+            "url": entry["webpage_url"]}
+
+def find_entry(url):
+    for entry in load_playlist()["entries"]:
+        if entry["webpage_url"] == url:
+            return entry
+    return None
+
+def print_info(args):
+    url = args[-1]
+    playlist = load_playlist()
+    if url == playlist["webpage_url"]:
+        if "--flat-playlist" in args:
+            playlist = dict(playlist, entries=[flat_entry(entry) for entry in playlist["entries"]])
+        print(json.dumps(playlist))
+        return 0
+    entry = find_entry(url)
+    if entry is None:
+        print(f"ERROR: Unsupported URL: {url}", file=sys.stderr)
+        return 1
+    print(json.dumps(entry))
+    return 0
+
+def download(args):
+    if "--load-info-json" in args:
+        with open(option(args, "--load-info-json"), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+    else:
+        info = find_entry(args[-1])
+        if info is None:
+            print(f"ERROR: Unsupported URL: {args[-1]}", file=sys.stderr)
+            return 1
+
+    template = option(args, "--output", "%(title)s.%(ext)s")
+    path = (template.replace("%(title)s", info["title"]).replace("%(id)s", info["id"])
+            .replace("%(ext)s", info["ext"]).replace("%%", "%"))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(info["id"].encode("ascii") * 64)
+    print(f"[download] Destination: {path}", flush=True)
+    time.sleep(float(os.environ.get("FAKE_YT_DLP_SECONDS", 0)))
+
+    for index, arg in enumerate(args):
+        if arg != "--print-to-file":
+            continue
+        record = info if args[index + 1].startswith("video:") else {"filepath": path, "format_id": "18"}
+        with open(args[index + 2], 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+    return 0
+
+def main():
+    args = sys.argv[1:]
+    with open(os.environ["FAKE_YT_DLP_LOG"], 'a', encoding='utf-8') as f:
+        f.write(json.dumps(args) + "\n")
+    if "-J" in args:
+        return print_info(args)
+    return download(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from downloadall.engine import YoutubeDLEngine
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def media_url(tmp_path):
+    """Base URL of a local server with a video-only and an audio-only stream"""
+    media = tmp_path / "media"
+    media.mkdir()
+    (media / "video.mp4").write_bytes(b"v" * 20000)
+    (media / "audio.m4a").write_bytes(b"a" * 5000)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(media)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def engine():
+    engine = YoutubeDLEngine()
+    yield engine
+    engine.close()
+
+def full_info(base_url, video_id):
+    return {"id": video_id, "title": f"Clip {video_id}", "extractor": "generic", "extractor_key": "Generic",
+            "webpage_url": f"{base_url}/watch/{video_id}", "duration": 10, "formats": [
+                {"format_id": "137", "url": f"{base_url}/video.mp4", "ext": "mp4", "vcodec": "avc1", "acodec": "none",
+                 "filesize": 20000},
+                {"format_id": "140", "url": f"{base_url}/audio.m4a", "ext": "m4a", "vcodec": "none", "acodec": "mp4a",
+                 "filesize": 5000},
+            ]}
+
+def test_a_merged_download_records_the_merged_format(engine, media_url, tmp_path):
+    # Without FFmpeg the parts are kept apart, but yt-dlp still moves the download as 137+140
+    options = ["--quiet", "--no-progress", "-f", "137+140", "--output", str(tmp_path / "clip.%(ext)s")]
+    returncode, result = engine.download(options, "a", full_info(media_url, "a"))
+
+    assert returncode == 0
+    assert result == {"filepath": str(tmp_path / "clip.mp4"), "format_id": "137+140", "duration": 10,
+                      "filesize_approx": 25000}
+
+def test_downloads_to_their_own_paths_share_one_instance(engine, media_url, tmp_path):
+    for video_id in ("a", "b", "c"):
+        options = ["--quiet", "--no-progress", "-f", "137", "--output", str(tmp_path / video_id / "clip.%(ext)s")]
+        returncode, result = engine.download(options, video_id, full_info(media_url, video_id))
+        assert returncode == 0
+        assert result["filepath"] == str(tmp_path / video_id / "clip.mp4")
+        assert (tmp_path / video_id / "clip.mp4").exists()
+
+    assert len(engine._instances) == 1
@@ -0,0 +1,78 @@
+from downloadall.history import HistoryStore
+from downloadall.transfer import COMMITTED, DOWNLOADING, FAILED, MERGING, PENDING, VERIFIED
+
+def test_items_move_through_the_download_states(history):
+    history.mark_pending(["a"])
+    assert history.get_state("a")["state"] == PENDING
+
+    history.set_state("a", DOWNLOADING, new_attempt=True)
+    history.set_state("a", MERGING)
+    history.set_state("a", VERIFIED)
+    history.commit("a", format="mp4", size=3, path="/videos/a.mp4")
+
+    state = history.get_state("a")
+    assert (state["state"], state["attempts"], state["error"]) == (COMMITTED, 1, None)
+    assert history.get("a")["path"] == "/videos/a.mp4"
+    assert "a" in history
+
+def test_failed_attempts_are_counted_and_keep_their_error(history):
+    history.mark_pending(["a"])
+    for _ in range(2):
+        history.set_state("a", DOWNLOADING, new_attempt=True)
+        history.set_state("a", FAILED, error="yt-dlp exited with code 1")
+
+    state = history.get_state("a")
+    assert (state["state"], state["attempts"], state["error"]) == (FAILED, 2, "yt-dlp exited with code 1")
+    assert "a" not in history
+
+def test_mark_pending_leaves_items_with_a_state_alone(history):
+    history.set_state("a", FAILED, error="timed out")
+    history.mark_pending(["a", "b"])
+
+    assert history.get_state("a")["state"] == FAILED
+    assert history.get_state("b")["state"] == PENDING
+
+def test_filter_new_keeps_the_order_of_unknown_ids(history):
+    history.add_many([("b", "mp4", 1, None), ("d", "mp4", 1, None)])
+
+    assert history.filter_new(["e", "d", "c", "b", "a"]) == ["e", "c", "a"]
+    assert history.filter_new(f"id{i}" for i in range(1200)) == [f"id{i}" for i in range(1200)]
+
+def test_requeue_forgets_downloads_and_marks_them_pending(history):
+    history.set_state("a", DOWNLOADING, new_attempt=True)
+    history.commit("a", format="mp4", size=3, path="/videos/a.mp4")
+
+    history.requeue(["a"])
+
+    assert "a" not in history
+    state = history.get_state("a")
+    assert (state["state"], state["attempts"]) == (PENDING, 0)
+
+def test_reserved_paths_do_not_collide(history):
+    assert history.reserve_file("a", "Intro", "Intro") == "Intro"
+    # Compared case-insensitively, as on Windows and macOS
+    assert history.reserve_file("b", "intro", "intro") == "intro [b]"
+    # A video keeps the path it reserved first
+    assert history.reserve_file("a", "Renamed", "Renamed") == "Intro"
+    assert history.get_file("b") == {"video_id": "b", "stem": "intro [b]", "title": "intro", "path": None}
+
+def test_missing_files_only_looks_up_recorded_paths(history, tmp_path):
+    present = tmp_path / "present.mp4"
+    present.write_bytes(b"x")
+    history.add_many([("a", "mp4", 1, str(present)), ("b", "mp4", 1, str(tmp_path / "gone.mp4")),
+                      ("c", "mp4", 1, None)])
+
+    assert history.missing_files() == [("b", str(tmp_path / "gone.mp4"))]
+    assert history.missing_files(["a", "c"]) == []
+
+def test_legacy_history_is_imported_once_per_change(tmp_path):
+    legacy = tmp_path / "history.txt"
+    legacy.write_text("a\nb\n")
+    store = HistoryStore(str(tmp_path / "history.db"), str(legacy))
+    try:
+        assert store.ids() == {"a", "b"}
+        assert store.import_legacy(str(legacy)) == 0
+        legacy.write_text("a\nb\nc\n")
+        assert store.import_legacy(str(legacy)) == 1
+    finally:
+        store.close()
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from downloadall.layout import (get_layout, needs_info, output_stem, output_template, reserve_output, safe_name,
+                                set_layout, stem_path, subfolder)
+
+INFO = {"title": "A/B: the sequel?", "channel": "Some Channel", "upload_date": "20240115"}
+
+@pytest.mark.parametrize("text, expected", [
+    ("A/B: the sequel?", "A_B_ the sequel_"),
+    ("  spaced   out  ", "spaced out"),
+    ("trailing dots...", "trailing dots"),
+    ("CON", "_CON"),
+    ("com1.txt", "_com1.txt"),
+    ("", "fallback"),
+    (None, "fallback"),
+    ("...", "fallback"),
+])
+def test_safe_name(text, expected):
+    assert safe_name(text, "fallback") == expected
+
+def test_safe_name_is_cut_to_the_longest_name():
+    assert len(safe_name("x" * 500, "fallback")) == 150
+
+@pytest.mark.parametrize("layout, expected", [
+    ("flat", ""),
+    ("channel", "Some Channel"),
+    ("date", "2024/01"),
+    ("id", "ab"),
+])
+def test_subfolder(layout, expected):
+    assert subfolder(layout, "AbCdEfGhIjK", INFO) == expected
+
+def test_subfolder_without_metadata():
+    assert subfolder("channel", "AbCdEfGhIjK") == "Unknown channel"
+    assert subfolder("date", "AbCdEfGhIjK", {"upload_date": "2024"}) == "Undated"
+    assert subfolder("channel", "AbCdEfGhIjK", {"uploader": "Uploader"}) == "Uploader"
+
+def test_output_paths():
+    assert output_stem("date", "AbCdEfGhIjK", INFO) == "2024/01/A_B_ the sequel_"
+    assert output_stem("flat", "AbCdEfGhIjK") == "AbCdEfGhIjK"
+    assert stem_path("/out", "2024/01/clip", "mp4") == os.path.join("/out", "2024", "01", "clip.mp4")
+    # yt-dlp would read a % in a title as part of the template
+    assert output_template("/out", "100% clip") == os.path.join("/out", "100%% clip") + ".%(ext)s"
+
+def test_layout_is_remembered_per_folder(history):
+    assert get_layout(history) == "flat"
+    set_layout(history, "id")
+    assert get_layout(history) == "id"
+    with pytest.raises(ValueError):
+        set_layout(history, "by-colour")
+
+def test_reserve_output_keeps_titles_apart(history):
+    set_layout(history, "channel")
+    assert reserve_output(history, "a", INFO) == "Some Channel/A_B_ the sequel_"
+    assert reserve_output(history, "b", INFO) == "Some Channel/A_B_ the sequel_ [b]"
+    # The layout changing later does not move a reserved path
+    set_layout(history, "flat")
+    assert reserve_output(history, "a", INFO) == "Some Channel/A_B_ the sequel_"
+
+def test_needs_info_only_for_metadata_the_layout_uses(history):
+    flat_entry = {"title": "Clip"}
+    assert not needs_info(history, "a", flat_entry)
+
+    set_layout(history, "date")
+    assert needs_info(history, "a", flat_entry)
+    assert not needs_info(history, "a", INFO)
+
+    set_layout(history, "channel")
+    assert needs_info(history, "a", flat_entry)
+    assert not needs_info(history, "a", {"uploader": "Uploader"})
+
+    set_layout(history, "id")
+    assert not needs_info(history, "a", flat_entry)
+
+def test_needs_info_not_once_a_path_is_reserved(history):
+    set_layout(history, "date")
+    reserve_output(history, "a", INFO)
+    assert not needs_info(history, "a", {"title": "Clip"})
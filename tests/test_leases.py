@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from downloadall.history import HistoryStore
+from downloadall.leases import CLAIMED, claim_item, run_claimed
+
+@pytest.fixture
+def other(history):
+    """A second store on the same database, like another run on the same output folder"""
+    store = HistoryStore(history.db_path)
+    yield store
+    store.close()
+
+def set_lease(history, video_id, **fields):
+    """Change the lease on an item behind the stores' backs"""
+    conn = sqlite3.connect(history.db_path)
+    with conn:
+        for name, value in fields.items():
+            conn.execute(f"UPDATE leases SET {name} = ? WHERE video_id = ?", (value, video_id))
+    conn.close()
+
+def test_a_claimed_item_cannot_be_claimed_again_until_released(history, other):
+    assert history.claim("a")
+    assert not other.claim("a")
+    assert not history.claim("a")
+    assert other.is_leased("a")
+
+    history.release("a")
+
+    assert not other.is_leased("a")
+    assert other.claim("a")
+
+def test_release_only_gives_up_leases_the_store_holds(history, other):
+    assert history.claim("a")
+    other.release("a")
+    assert other.is_leased("a")
+
+def test_expired_leases_are_taken_over(history, other):
+    assert history.claim("a")
+    set_lease(history, "a", expires_at=0)
+
+    assert other.claim("a")
+    # The run that lost the lease cannot release it from under its new holder
+    history.release("a")
+    assert other.is_leased("a")
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows leases only lapse with their TTL")
+def test_leases_of_dead_processes_are_taken_over(history, other):
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    assert history.claim("a")
+    set_lease(history, "a", pid=process.pid)
+
+    assert other.lease_holder("a") is None
+    assert other.claim("a")
+
+def test_closing_a_store_releases_its_leases(other):
+    store = HistoryStore(other.db_path)
+    assert store.claim("a")
+    store.close()
+    assert other.claim("a")
+
+def test_claim_item_hands_back_what_another_run_downloaded(history, other):
+    other.commit("a", format="mp4", size=3, path="/videos/a.mp4")
+
+    assert claim_item(history, "a") == {"filepath": "/videos/a.mp4"}
+    # The lease is not kept for an item that needs no work
+    assert not history.is_leased("a")
+
+def test_claim_item_reports_items_another_run_holds(history, other):
+    assert other.claim("a")
+    assert claim_item(history, "a") == CLAIMED
+    assert claim_item(history, "b") is None
+
+def test_run_claimed_comes_back_to_items_once_they_are_released(history, other, monkeypatch):
+    monkeypatch.setattr("downloadall.leases.WAIT_POLL_SECONDS", 0.01)
+    assert other.claim("b")
+    calls = []
+
+    def run(video_ids):
+        calls.append(list(video_ids))
+        results = []
+        for video_id in video_ids:
+            claimed = claim_item(history, video_id)
+            if claimed is None:
+                history.release(video_id)
+                claimed = f"downloaded {video_id}"
+            results.append(claimed)
+        # The other run finishes its item while this one works on the rest
+        if other.is_leased("b"):
+            other.commit("b", format="mp4", size=3, path="/videos/b.mp4")
+            other.release("b")
+        return results
+
+    assert run_claimed(history, ["a", "b", "c"], run) == [
+        "downloaded a", {"filepath": "/videos/b.mp4"}, "downloaded c"
+    ]
+    assert calls == [["a", "b", "c"], ["b"]]
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from downloadall import media_store, transfer
+from downloadall.media_store import MediaStore, reuse_stored
+
+@pytest.fixture
+def store(tmp_path):
+    """A media store holding a 10 second MP4 of video a"""
+    store = MediaStore(str(tmp_path / "media_store.db"))
+    stored = tmp_path / "library" / "a.mp4"
+    stored.parent.mkdir()
+    stored.write_bytes(b"x" * 100)
+    store.add("a", "mp4", str(stored))
+    yield store
+    store.close()
+
+def test_a_stored_copy_is_linked_and_committed(store, history, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "probe_duration", lambda path: 10.0)
+    result = reuse_stored(store, history, "a", "mp4", str(tmp_path / "videos"), duration=10)
+
+    assert result == {"filepath": str(tmp_path / "videos" / "a.mp4"), "duration": 10}
+    assert os.path.samefile(result["filepath"], tmp_path / "library" / "a.mp4")
+    assert history.filter_new(["a"]) == []
+
+def test_a_truncated_stored_copy_is_downloaded_instead(store, history, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "probe_duration", lambda path: 4.0)
+    assert reuse_stored(store, history, "a", "mp4", str(tmp_path / "videos"), duration=10) is None
+
+    assert not os.path.exists(tmp_path / "videos" / "a.mp4")
+    assert history.filter_new(["a"]) == ["a"]
+
+def test_an_mp3_is_only_extracted_from_a_stored_video_with_a_cover(store, history, tmp_path, monkeypatch):
+    runs = []
+
+    def run_ffmpeg(inputs, options, target):
+        runs.append((inputs, options))
+        with open(target, 'wb') as f:
+            f.write(b"y" * 10)
+
+    monkeypatch.setattr(media_store, "run_ffmpeg", run_ffmpeg)
+    assert reuse_stored(store, history, "a", "mp3", str(tmp_path / "audio")) is None
+    assert runs == []
+
+    cover = str(tmp_path / "a.jpg")
+    result = reuse_stored(store, history, "a", "mp3", str(tmp_path / "audio"), cover=cover)
+    assert result["filepath"] == str(tmp_path / "audio" / "a.mp3")
+    inputs, options = runs[0]
+    assert inputs == [str(tmp_path / "library" / "a.mp4"), cover]
+    assert options[:4] == ["-map", "0:a", "-map", "1:0"] and "Cover (front)" in " ".join(options)
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from downloadall import metadata_cache
+from downloadall.metadata_cache import MetadataCache, streams_expire_at
+
+def full_info(video_id, url="https://media.invalid/clip.mp4"):
+    return {"id": video_id, "title": f"Clip {video_id}", "duration": 10, "webpage_url": f"https://watch/{video_id}",
+            "formats": [{"format_id": "18", "url": url}], "requested_downloads": [{"filepath": "/tmp/x"}]}
+
+@pytest.fixture
+def cache(tmp_path):
+    store = MetadataCache(str(tmp_path / "metadata.db"))
+    yield store
+    store.close()
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time.time() for the cache that only moves when a test moves it"""
+    now = [time.time()]
+    monkeypatch.setattr(metadata_cache.time, "time", lambda: now[0])
+    return now
+
+def test_full_info_is_kept_without_the_fields_of_one_download(cache):
+    cache.put("a", full_info("a"))
+    info = cache.get("a")
+    assert info["formats"] == [{"format_id": "18", "url": "https://media.invalid/clip.mp4"}]
+    assert "requested_downloads" not in info
+
+def test_formats_expire_before_the_static_fields(cache, clock):
+    cache.put("a", full_info("a"))
+
+    clock[0] += metadata_cache.STREAM_TTL_SECONDS
+    assert cache.get("a") is None
+    assert cache.get_static("a")["title"] == "Clip a"
+
+    clock[0] += metadata_cache.STATIC_TTL_SECONDS
+    assert cache.get_static("a") is None
+
+def test_stream_urls_with_an_expiry_are_dropped_ahead_of_it():
+    now = 1_000_000
+    url = f"https://media.invalid/clip.mp4?expire={now + 2000}&sig=x"
+    margin = metadata_cache.STREAM_EXPIRY_MARGIN_SECONDS
+    assert streams_expire_at({"formats": [{"url": url}]}, now) == now + 2000 - margin
+    assert streams_expire_at({"formats": [{"url": "https://media.invalid/clip.mp4"}]}, now) == (
+        now + metadata_cache.STREAM_TTL_SECONDS
+    )
+
+def test_drop_streams_keeps_the_static_fields(cache):
+    cache.put("a", full_info("a"))
+    cache.drop_streams("a")
+    assert cache.get("a") is None
+    assert cache.get_static("a")["duration"] == 10
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = MetadataCache(str(tmp_path / "metadata.db"))
+    try:
+        cache.put("a", full_info("a"))
+        # Room for two entries and a bit; a third one evicts down to 90% of it
+        cache.max_bytes = cache._size * 2.5
+        clock[0] += 1
+        cache.put("b", full_info("b"))
+        clock[0] += 1
+        assert cache.get("a") is not None
+        clock[0] += 1
+        cache.put("c", full_info("c"))
+    finally:
+        cache.close()
+
+    # A fresh process sees what is on disk: b was used least recently
+    reopened = MetadataCache(str(tmp_path / "metadata.db"))
+    try:
+        assert reopened.get("a") is not None
+        assert reopened.get_static("b") is None
+        assert reopened.get("c") is not None
+    finally:
+        reopened.close()
+
+def test_cached_info_prefers_fresh_formats_then_static_fields(tmp_path, monkeypatch):
+    cache = MetadataCache(str(tmp_path / "metadata.db"))
+    monkeypatch.setattr(metadata_cache, "get_cache", lambda: cache)
+    try:
+        entry = {"_type": "url", "id": "a", "url": "https://watch/a"}
+        assert metadata_cache.cached_info("a", entry) == entry
+
+        metadata_cache.remember_info("a", full_info("a"))
+        assert "formats" in metadata_cache.cached_info("a", entry)
+
+        stale = metadata_cache.stale_info("a", metadata_cache.cached_info("a", entry))
+        assert stale == {"id": "a", "title": "Clip a", "duration": 10, "webpage_url": "https://watch/a",
+                         "_type": "url", "url": "https://watch/a"}
+        # The listing's entry wins over the cached fields
+        assert metadata_cache.cached_info("a", entry) == dict(stale, **entry)
+    finally:
+        cache.close()
@@ -0,0 +1,75 @@
+import json
+import os
+import time
+
+import pytest
+
+from downloadall import metadata_cache, video
+from downloadall.media_store import MediaStore
+from downloadall.metadata_cache import MetadataCache
+from downloadall.orchestrator import Orchestrator
+from downloadall.transfer import FAILED
+
+PLAYLIST_URL = "https://www.youtube.com/playlist?list=PLfake"
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch, fake_yt_dlp, history):
+    """The video backend writing to tmp_path with the fake yt-dlp; returns the options for its jobs"""
+    store = MediaStore(str(tmp_path / "media_store.db"))
+    cache = MetadataCache(str(tmp_path / "metadata.db"))
+    monkeypatch.setattr(video, "OUTPUT_FOLDER", str(tmp_path / "videos"))
+    monkeypatch.setattr(video, "get_history", lambda: history)
+    monkeypatch.setattr(video, "get_store", lambda: store)
+    monkeypatch.setattr(metadata_cache, "get_cache", lambda: cache)
+    monkeypatch.setattr("downloadall.engine.require_yt_dlp", lambda: fake_yt_dlp.path)
+    rate_config = tmp_path / "rate_limits.json"
+    rate_config.write_text(json.dumps({"youtube.com": {"start_delay": 0}}))
+    yield {"rate_config": str(rate_config)}
+    store.close()
+    cache.close()
+
+@pytest.fixture
+def orchestrator():
+    orchestrator = Orchestrator(item_timeout=1)
+    yield orchestrator
+    orchestrator.close()
+
+def test_a_video_job_downloads_what_is_new(backend, orchestrator, fake_yt_dlp, history):
+    result = orchestrator.submit(PLAYLIST_URL, "video", single_pass=True, jobs=2, **backend).result(30)
+    assert not result.failed and len(result.files) == 3
+    assert len([args for args in fake_yt_dlp.launches() if "--load-info-json" in args]) == 3
+
+    os.remove(result.files["aaaaaaaaaa1"])
+    lines = []
+    again = orchestrator.submit(PLAYLIST_URL, "video", on_output=lines.append, **backend).result(30)
+    assert again.files == {} and again.failed == []
+    assert "1 downloaded item(s) no longer have their file; run verify.py to download them again" in lines
+
+def test_an_item_past_its_deadline_is_failed_and_released(backend, orchestrator, history, monkeypatch):
+    monkeypatch.setenv("FAKE_YT_DLP_SECONDS", "30")
+    start = time.monotonic()
+    result = orchestrator.submit(PLAYLIST_URL, "video", jobs=3, **backend).result(30)
+
+    assert time.monotonic() - start < 20
+    assert sorted(result.failed) == ["aaaaaaaaaa1", "bbbbbbbbbb2", "cccccccccc3"]
+    for video_id in result.failed:
+        state = history.get_state(video_id)
+        assert (state["state"], state["error"]) == (FAILED, "timed out after 1s")
+        assert not history.is_leased(video_id)
+
+def test_cancelling_a_job_ends_its_downloads_and_releases_them(backend, fake_yt_dlp, history, monkeypatch):
+    monkeypatch.setenv("FAKE_YT_DLP_SECONDS", "30")
+    orchestrator = Orchestrator()
+    try:
+        job = orchestrator.submit(PLAYLIST_URL, "video", jobs=3, **backend)
+        deadline = time.monotonic() + 20
+        while len(fake_yt_dlp.launches()) < 4 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        job.cancel()
+        result = job.result(10)
+    finally:
+        orchestrator.close()
+
+    assert result.cancelled and sorted(result.failed) == ["aaaaaaaaaa1", "bbbbbbbbbb2", "cccccccccc3"]
+    assert not any(history.is_leased(video_id) for video_id in result.failed)
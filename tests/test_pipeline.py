@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from downloadall.pipeline import Finished, run_pipeline
+from downloadall.scheduler import JobControl, controlled
+
+def test_items_pass_through_every_stage_in_order():
+    stages = [(lambda item: item * 2, 2), (lambda item, value: value + 1, 3), (lambda item, value: (item, value), 1)]
+    assert run_pipeline(range(10), stages) == [(i, i * 2 + 1) for i in range(10)]
+
+def test_finished_skips_the_later_stages():
+    later = []
+
+    def first(item):
+        return Finished("early") if item % 2 else item
+
+    def second(item, value):
+        later.append(item)
+        return "late"
+
+    assert run_pipeline(range(4), [(first, 1), (second, 1)]) == ["late", "early", "late", "early"]
+    assert sorted(later) == [0, 2]
+
+def test_an_error_ends_its_item_and_is_raised_after_the_others():
+    done = []
+
+    def stage(item):
+        if item == 1:
+            raise RuntimeError("boom")
+        done.append(item)
+        return item
+
+    with pytest.raises(RuntimeError, match="boom"):
+        run_pipeline(range(4), [(stage, 2)])
+    assert sorted(done) == [0, 2, 3]
+
+def test_a_slow_stage_holds_the_ones_before_it_back():
+    release = threading.Event()
+    started = []
+
+    def first(item):
+        started.append(item)
+        return item
+
+    def second(item, value):
+        release.wait()
+        return value
+
+    thread = threading.Thread(target=run_pipeline, args=(range(20), [(first, 1), (second, 1)]))
+    thread.start()
+    try:
+        thread.join(0.3)
+        # One item in each stage, one waiting in each queue and one held by the first stage
+        assert len(started) <= 4
+    finally:
+        release.set()
+        thread.join()
+    assert len(started) == 20
+
+def test_items_left_when_the_run_is_cancelled_end_with_none():
+    control = JobControl()
+
+    def stage(item):
+        if item == 2:
+            control.cancel()
+        return item
+
+    with controlled(control):
+        results = run_pipeline(range(6), [(stage, 1)])
+    assert results[:3] == [0, 1, 2]
+    assert results[3:] == [None, None, None]
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from downloadall.ratelimit import RateLimiter, make_limiter, parse_rate, settings_for_url
+
+@pytest.mark.parametrize("value, expected", [
+    ("500K", 500 * 1024), ("2M", 2 * 1024 ** 2), ("1.5MiB", int(1.5 * 1024 ** 2)), ("100", 100),
+    (4096, 4096), (None, None), ("", None),
+])
+def test_parse_rate(value, expected):
+    assert parse_rate(value) == expected
+
+def test_parse_rate_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+def test_each_expected_job_gets_an_equal_share():
+    limiter = RateLimiter("4M", jobs=4)
+    with limiter.job() as share:
+        # A job that starts first does not take the budget of the ones after it
+        assert share == 1024 ** 2
+
+def test_jobs_beyond_the_expected_number_get_smaller_shares():
+    limiter = RateLimiter("6M", jobs=2)
+    with limiter.job() as first, limiter.job() as second, limiter.job() as third:
+        assert first == second == 3 * 1024 ** 2
+        assert third == 2 * 1024 ** 2
+    assert limiter.active == 0
+
+def test_no_budget_means_no_share():
+    with RateLimiter(jobs=4).job() as share:
+        assert share is None
+
+def test_delay_halves_on_success_and_backs_off_when_throttled():
+    limiter = RateLimiter(start_delay=2.0, min_delay=0.5, max_delay=20.0)
+    limiter.success()
+    assert limiter.current_delay() == 1.0
+    limiter.success()
+    limiter.success()
+    assert limiter.current_delay() == 0.5
+    limiter.throttled()
+    assert limiter.current_delay() == 5.0
+    for _ in range(5):
+        limiter.throttled()
+    assert limiter.current_delay() == 20.0
+
+def test_the_most_specific_config_entry_wins():
+    config = {"youtube.com": {"limit_rate": "4M"}, "www.youtube.com/@Slow": {"limit_rate": "1M"}}
+    assert settings_for_url("https://www.youtube.com/@Slow/videos", config) == {"limit_rate": "1M"}
+    assert settings_for_url("https://www.youtube.com/@Other", config) == {"limit_rate": "4M"}
+    assert settings_for_url("https://vimeo.com/1", config) == {}
+
+def test_make_limiter_reads_the_config_and_an_explicit_rate_overrides_it(tmp_path):
+    config = tmp_path / "rate_limits.json"
+    config.write_text(json.dumps({"youtube.com": {"limit_rate": "4M", "start_delay": 0}}))
+    url = "https://www.youtube.com/playlist?list=PL"
+
+    limiter = make_limiter(url, config_path=str(config), jobs=2)
+    assert (limiter.limit_rate, limiter.current_delay(), limiter.jobs) == (4 * 1024 ** 2, 0, 2)
+    assert make_limiter(url, "1M", str(config)).limit_rate == 1024 ** 2
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import REPO_DIR
+
+from downloadall.engine import SubprocessEngine
+
+PLAYLIST_URL = "https://www.youtube.com/playlist?list=PLfake"
+
+def run_video(fake_yt_dlp, home, *args):
+    """Run the video downloader CLI against the fake yt-dlp; returns its output"""
+    config_dir = os.path.join(home, ".youtube_downloader")
+    os.makedirs(config_dir, exist_ok=True)
+    # No polite delays between the downloads of a test
+    with open(os.path.join(config_dir, "rate_limits.json"), 'w', encoding='utf-8') as f:
+        json.dump({"youtube.com": {"start_delay": 0}}, f)
+    process = subprocess.run([sys.executable, "-m", "downloadall.video", PLAYLIST_URL, *args], cwd=REPO_DIR,
+                             env=fake_yt_dlp.env(home), capture_output=True, text=True, timeout=120)
+    assert process.returncode == 0, process.stdout + process.stderr
+    return process.stdout
+
+def test_full_listing_has_every_entry_with_formats(fake_yt_dlp, playlist):
+    entries = SubprocessEngine(fake_yt_dlp.path).fetch_playlist(PLAYLIST_URL, full=True)
+
+    assert list(entries) == [entry["id"] for entry in playlist["entries"]]
+    assert all("formats" in entry for entry in entries.values())
+    assert fake_yt_dlp.launches() == [["-J", PLAYLIST_URL]]
+
+def test_flat_listing_has_no_formats(fake_yt_dlp):
+    entries = SubprocessEngine(fake_yt_dlp.path).fetch_playlist(PLAYLIST_URL)
+
+    assert entries["aaaaaaaaaa1"]["url"] == "https://www.youtube.com/watch?v=aaaaaaaaaa1"
+    assert not any("formats" in entry for entry in entries.values())
+    assert fake_yt_dlp.launches() == [["-J", "--flat-playlist", PLAYLIST_URL]]
+
+def test_single_pass_lists_once_and_loads_each_video_from_the_listing(fake_yt_dlp, tmp_path):
+    home = str(tmp_path / "home")
+    run_video(fake_yt_dlp, home, "--single-pass", "--jobs", "2")
+
+    launches = fake_yt_dlp.launches()
+    listings = [args for args in launches if "-J" in args]
+    downloads = [args for args in launches if "-J" not in args]
+    assert listings == [["-J", PLAYLIST_URL]]
+    assert len(downloads) == 3
+    # Nothing is resolved again: every download loads the metadata from the listing
+    assert all("--load-info-json" in args for args in downloads)
+
+    folder = os.path.join(home, "Desktop", "YouTube Videos")
+    assert sorted(name for name in os.listdir(folder) if not name.startswith(".")) == [
+        "First clip.mp4", "Second clip [cccccccccc3].mp4", "Second clip.mp4"
+    ]
+
+def test_flat_listing_resolves_each_video_in_its_download(fake_yt_dlp, tmp_path):
+    home = str(tmp_path / "home")
+    run_video(fake_yt_dlp, home)
+
+    downloads = [args for args in fake_yt_dlp.launches() if "-J" not in args]
+    assert len(downloads) == 3
+    assert not any("--load-info-json" in args for args in downloads)
+    assert sorted(args[-1] for args in downloads) == [
+        f"https://www.youtube.com/watch?v={video_id}" for video_id in ("aaaaaaaaaa1", "bbbbbbbbbb2", "cccccccccc3")
+    ]
+
+def test_downloaded_videos_are_skipped_on_the_next_run(fake_yt_dlp, tmp_path):
+    home = str(tmp_path / "home")
+    run_video(fake_yt_dlp, home, "--single-pass")
+    first = len(fake_yt_dlp.launches())
+
+    output = run_video(fake_yt_dlp, home, "--single-pass")
+
+    assert fake_yt_dlp.launches()[first:] == [["-J", PLAYLIST_URL]]
+    assert "Already video downloaded" in output
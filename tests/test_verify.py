@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from downloadall.verify import requeue, scan_folder, verify_library
+
+@pytest.fixture
+def library(tmp_path, history):
+    """An output folder with one healthy, one truncated, one empty and one missing file, and an untracked one"""
+    folder = tmp_path / "videos"
+    (folder / "2024").mkdir(parents=True)
+    files = {"good": b"x" * 100, "short": b"x" * 50, "empty": b""}
+    records = []
+    for video_id, data in files.items():
+        path = folder / "2024" / f"{video_id}.mp4"
+        path.write_bytes(data)
+        records.append((video_id, "mp4", 100, str(path)))
+    records.append(("gone", "mp4", 100, str(folder / "gone.mp4")))
+    history.add_many(records)
+    (folder / "stray.mp4").write_bytes(b"x")
+    (folder / ".history.db").write_bytes(b"")
+    return str(folder)
+
+def problems_of(report):
+    return {video_id: problem for video_id, _, problem in report["problems"]}
+
+def test_scan_folder_finds_nested_files_and_skips_hidden_ones(library):
+    files = scan_folder(library, jobs=2)
+    assert sorted(os.path.relpath(path, library) for path in files) == [
+        os.path.join("2024", "empty.mp4"), os.path.join("2024", "good.mp4"), os.path.join("2024", "short.mp4"),
+        "stray.mp4",
+    ]
+
+def test_size_check_reports_damaged_files_and_untracked_ones(history, library):
+    report = verify_library(history, library, "size", jobs=2)
+
+    assert problems_of(report) == {
+        "short": "file is truncated (50 of 100 bytes)",
+        "empty": "file is empty",
+        "gone": "file is missing",
+    }
+    assert report["untracked"] == [os.path.join(library, "stray.mp4")]
+    assert report["recorded"] == 4
+
+def test_partial_files_are_reported(history, library):
+    open(os.path.join(library, "2024", "good.mp4.part"), 'wb').close()
+    assert problems_of(verify_library(history, library, "size"))["good"] == "file is still partial"
+
+def test_missing_check_does_not_walk_the_folder(history, library):
+    report = verify_library(history, library, "missing")
+    assert problems_of(report) == {"gone": "file is missing"}
+    assert report["untracked"] == []
+
+def test_hash_check_is_cached_until_a_file_changes(history, library):
+    first = verify_library(history, library, "hash", jobs=2)
+    assert first["checked"] == 1 and first["cached"] == 0
+
+    second = verify_library(history, library, "hash", jobs=2)
+    assert second["checked"] == 0 and second["cached"] == 1
+
+    with open(os.path.join(library, "2024", "good.mp4"), 'ab') as f:
+        f.write(b"more")
+    third = verify_library(history, library, "hash", jobs=2)
+    assert third["checked"] == 1
+    assert "good" not in problems_of(third)
+
+def test_requeue_removes_damaged_files_and_forgets_their_downloads(history, library):
+    report = verify_library(history, library, "size")
+    requeue(history, report["problems"])
+
+    assert not os.path.exists(os.path.join(library, "2024", "short.mp4"))
+    assert history.filter_new(["good", "short", "empty", "gone"]) == ["short", "empty", "gone"]
+    assert history.get_state("short")["state"] == "pending"